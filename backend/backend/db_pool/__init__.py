@@ -0,0 +1,167 @@
+"""
+Pooled database connections, one pool per server process and database alias.
+
+Django's own persistent connections (CONN_MAX_AGE) are kept per thread, which suits a
+WSGI server with a fixed set of threads but not ASGI, where a request's database work
+can land on any thread and each connection is closed at the end of its request. These
+backends make that close() cheap instead: the raw connection goes back to a pool and
+the next connect() in any thread takes it out again, so requests skip the TCP
+handshake and login. Configured in settings.DATABASES (see settings.py):
+
+    'ENGINE': 'backend.db_pool.mysql',       # or backend.db_pool.sqlite3 (tests, benchmarks)
+    'CONN_MAX_AGE': 0,                       # every request hands its connection back
+    'CONN_HEALTH_CHECKS': True,              # ping a pooled connection before reusing it
+    'POOL': {'SIZE': 10, 'TIMEOUT': 10, 'RECYCLE': 3600},
+
+SIZE connections at most are open per process; a connect() beyond that waits up to
+TIMEOUT seconds for one to come back. Connections older than RECYCLE seconds are closed
+instead of reused (below MySQL's wait_timeout). A connection that is handed back inside
+a transaction, after an error or with autocommit changed is closed, not pooled.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+DEFAULT_POOL = {'SIZE': 10, 'TIMEOUT': 10.0, 'RECYCLE': 3600.0}
+
+
+class PoolTimeout(OperationalError):
+    """Every pooled connection stayed in use for the whole TIMEOUT."""
+
+
+class ConnectionPool:
+    def __init__(self, size, timeout, recycle):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.idle = deque()  # (raw connection, opened at), most recently returned last
+        self.opened_at = {}  # id(raw connection) -> monotonic time it was opened
+        self.connecting = 0  # slots taken by connects in progress (made outside the lock)
+        self.connects = 0  # new connections made, for benchmarks
+        self._cond = threading.Condition()
+
+    @property
+    def open(self):
+        return len(self.opened_at) + self.connecting
+
+    def acquire(self, connect, ping=None):
+        """A pooled connection (checked with `ping` if given), or a new one from `connect()`."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self.idle and self.open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"no database connection free after {self.timeout}s ({self.size} in use)")
+                    self._cond.wait(remaining)
+                if self.idle:
+                    raw = self.idle.pop()
+                else:
+                    raw = None
+                    self.connecting += 1
+            if raw is None:
+                return self._connect(connect)
+            if time.monotonic() - self.opened_at[id(raw)] >= self.recycle or not self._alive(raw, ping):
+                self._discard(raw)
+                continue
+            return raw
+
+    def _connect(self, connect):
+        try:
+            raw = connect()
+        except BaseException:
+            with self._cond:
+                self.connecting -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.connecting -= 1
+            self.opened_at[id(raw)] = time.monotonic()
+            self.connects += 1
+        return raw
+
+    @staticmethod
+    def _alive(raw, ping):
+        if ping is None:
+            return True
+        try:
+            ping(raw)
+        except Exception:
+            return False
+        return True
+
+    def release(self, raw, reusable=True):
+        with self._cond:
+            opened = self.opened_at.get(id(raw))
+        if opened is None:
+            raw.close()  # not ours (a pool from before a fork)
+            return
+        if not reusable or time.monotonic() - opened >= self.recycle:
+            self._discard(raw)
+            return
+        with self._cond:
+            self.idle.append(raw)
+            self._cond.notify()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass  # already broken, which may be why it is going
+        with self._cond:
+            self.opened_at.pop(id(raw), None)
+            self._cond.notify()
+
+    def close_idle(self):
+        """Close every connection not in use (e.g. at shutdown)."""
+        with self._cond:
+            idle, self.idle = list(self.idle), deque()
+        for raw in idle:
+            self._discard(raw)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """The pool of `alias` in this process (forked workers don't share their parent's)."""
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = {**DEFAULT_POOL, **settings_dict.get('POOL', {})}
+            pool = _pools[key] = ConnectionPool(
+                int(options['SIZE']), float(options['TIMEOUT']), float(options['RECYCLE']),
+            )
+        return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """Put before a backend's DatabaseWrapper: connections come from and go back to the alias's pool."""
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def ping_connection(self, raw):
+        """Raise if a pooled connection no longer works; backends override this."""
+
+    def get_new_connection(self, conn_params):
+        ping = self.ping_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        return self.pool.acquire(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params), ping)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # only a connection in the state connect() leaves it in may serve another request
+        reusable = (
+            not self.in_atomic_block
+            and not self.errors_occurred
+            and self.autocommit == self.settings_dict['AUTOCOMMIT']
+        )
+        with self.wrap_database_errors:
+            self.pool.release(self.connection, reusable)
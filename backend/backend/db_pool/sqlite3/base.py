@@ -0,0 +1,10 @@
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+from backend.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, SQLiteDatabaseWrapper):
+    """The pooled backend over SQLite, a stand-in for MySQL in tests and benchmarks."""
+
+    def ping_connection(self, raw):
+        raw.execute('SELECT 1')
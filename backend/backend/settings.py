@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myapp.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'myapp.db_routing.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -63,7 +65,7 @@ import os
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'myapp.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'myapp/templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,6 +82,31 @@ TEMPLATES = [
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'myapp/static')]
 
+# Request instrumentation (myapp/instrumentation.py): per-view histograms of SQL queries, SQL time,
+# template time and latency, served in the Prometheus format at /metrics to METRICS_ALLOWED_IPS.
+# VIEW_BUDGETS caps views by URL name (queries, sql_ms, template_ms, total_ms); ViewBudgetTests
+# fails when a budgeted view goes over, and in production the request is logged and counted.
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+VIEW_BUDGETS = {
+    # session + user, then the page's own queries; see ViewBudgetTests
+    'panel_dashboard': {'queries': 6},
+    'dashboard_it': {'queries': 5},
+    'dashboard_warden': {'queries': 5},
+    'dashboard_rector': {'queries': 5},
+    'dashboard_admin': {'queries': 4},
+    'dashboard_maintenance': {'queries': 4},
+    'panel_queries': {'queries': 3},
+    'dashboard_it_queries': {'queries': 3},
+    'dashboard_warden_queries': {'queries': 3},
+    'dashboard_rector_queries': {'queries': 3},
+    'dashboard_admin_queries': {'queries': 3},
+    'dashboard_maintenance_queries': {'queries': 3},
+    'panel_analytics_resolution': {'queries': 3},
+    'panel_analytics_backlog': {'queries': 3},
+    'student_dashboard': {'queries': 3},
+    'student_my_queries': {'queries': 3},
+}
+
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
@@ -87,9 +114,17 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Connection reuse, from the environment:
+#   DB_POOL_SIZE=n    keep up to n MySQL connections per server process and hand them to requests in turn
+#                     (backend/db_pool); works under WSGI threads and ASGI alike. DB_POOL_TIMEOUT is how long a
+#                     request waits for a free one, DB_POOL_RECYCLE the age (s) at which one is replaced.
+#   DB_CONN_MAX_AGE=s without a pool: keep each thread's connection for s seconds (WSGI only; 0 = one per request)
+#   DB_CONN_HEALTH_CHECKS=1 check a reused connection before the request uses it
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '0'))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'backend.db_pool.mysql' if DB_POOL_SIZE else 'django.db.backends.mysql',
         'NAME': 'university_complaints',
         'USER': 'root',
         'PASSWORD': '654321',
@@ -98,10 +133,34 @@ DATABASES = {
         'OPTIONS': {
             'charset': 'utf8mb4',
         },
+        # with a pool every request hands its connection back; persistent connections are the pool's job
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'RECYCLE': float(os.getenv('DB_POOL_RECYCLE', '3600')),
+        },
     }
 }
 
 
+# Read replicas (myapp/db_routing.py): DB_REPLICA_HOSTS=host[:port],... adds aliases replica1, replica2, ...
+# with the primary's credentials. GET requests to the views matching REPLICA_READ_VIEWS read this app's
+# models from one of them, except for REPLICA_STICKY_SECONDS after the browser's own write.
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+for _i, _host in enumerate(DB_REPLICA_HOSTS, start=1):
+    _name, _, _port = _host.partition(':')
+    DATABASES[f'replica{_i}'] = {
+        **DATABASES['default'], 'HOST': _name, 'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias.startswith('replica')]
+DATABASE_ROUTERS = ['myapp.db_routing.ReplicaRouter']
+REPLICA_READ_VIEWS = ['dashboard_*', '*_dashboard', '*_queries', 'panel_analytics_*']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -143,3 +202,43 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Complaint listings use keyset pagination (myapp/pagination.py); ?page_size= is capped at the max
+COMPLAINTS_PAGE_SIZE = int(os.getenv('COMPLAINTS_PAGE_SIZE', '25'))
+COMPLAINTS_MAX_PAGE_SIZE = 200
+# rows fetched per query by the streaming CSV/XLSX exports (myapp/complaint_io.py)
+COMPLAINTS_EXPORT_CHUNK_SIZE = int(os.getenv('COMPLAINTS_EXPORT_CHUNK_SIZE', '2000'))
+
+# Group names are kept in the session (myapp/roles.py) for at most this many seconds; a group change is seen
+# at once by the worker that made it and by every other worker once their copies expire
+ROLES_SESSION_TTL = int(os.getenv('ROLES_SESSION_TTL', '60'))
+
+# AI triage (myapp/triage.py): the worker also queues complaints inserted outside the web form, looking back
+# this many days by created_at; older ones are left to `manage.py backfill_ai_triage`
+TRIAGE_ENQUEUE_WINDOW_DAYS = int(os.getenv('TRIAGE_ENQUEUE_WINDOW_DAYS', '7'))
+
+# Student identity lookups (myapp/students.py): per-process LRU in front of the Django cache
+STUDENT_CACHE_TTL = 900
+STUDENT_MISSING_CACHE_TTL = 60
+STUDENT_LOCAL_CACHE_TTL = 60
+STUDENT_LOCAL_CACHE_SIZE = 1024
+
+# Near-duplicate detection at submission (myapp/duplicates.py): estimated Jaccard similarity from which a
+# new complaint is linked to an earlier one; the per-process index covers the last DUPLICATE_WINDOW_DAYS
+# (at most DUPLICATE_INDEX_MAX_ENTRIES clusters) and is persisted to DUPLICATE_INDEX_PATH ('' keeps it in memory);
+# each check also rereads the last DUPLICATE_LATE_COMMIT_SECONDS for rows committed out of id order
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', '0.5'))
+DUPLICATE_WINDOW_DAYS = 14
+DUPLICATE_LATE_COMMIT_SECONDS = 300
+DUPLICATE_INDEX_MAX_ENTRIES = 50000
+DUPLICATE_INDEX_SAVE_EVERY = 200
+DUPLICATE_INDEX_PATH = os.getenv('DUPLICATE_INDEX_PATH', str(BASE_DIR / 'var' / 'duplicate-index.bin'))
+
+# Live dashboards over WebSockets (myapp/live.py): each server process polls for new complaints and
+# counter changes every LIVE_POLL_INTERVAL seconds while dashboards are connected; a dashboard more than
+# LIVE_QUEUE_SIZE messages behind is told to reload, and one reconnecting gets at most LIVE_REPLAY_LIMIT missed rows;
+# complaints that commit up to LIVE_LATE_COMMIT_SECONDS after a higher id was pushed are still pushed
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '1.0'))
+LIVE_LATE_COMMIT_SECONDS = 30
+LIVE_QUEUE_SIZE = int(os.getenv('LIVE_QUEUE_SIZE', '100'))
+LIVE_REPLAY_LIMIT = int(os.getenv('LIVE_REPLAY_LIMIT', '50'))
@@ -0,0 +1,221 @@
+# ==============================================
+# Batch classification for the complaint agent (backfills)
+# ==============================================
+from __future__ import annotations
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from openai import APIConnectionError, InternalServerError, OpenAIError, RateLimitError
+
+# only short complaints are packed together; long ones get a request of their own
+PACK_MAX_CHARS = 800
+MAX_RETRIES = 6
+
+logger = logging.getLogger(__name__)
+
+_PACK_INSTRUCTIONS = (
+    "You will receive SEVERAL student complaints as a JSON array of {\"id\": ..., \"text\": ...}. "
+    "Treat each one independently. Return a single JSON object {\"results\": [...]} with exactly one "
+    "entry per complaint; each entry is the schema object above plus an \"id\" key copied from the input."
+)
+
+
+@dataclass
+class BatchUsage:
+    """Request and token counters accumulated across a batch run (thread-safe)."""
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    rate_limited: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_response(self, resp: Any) -> None:
+        usage = getattr(resp, "usage", None)
+        with self._lock:
+            self.requests += 1
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+
+    def add_rate_limit(self) -> None:
+        with self._lock:
+            self.rate_limited += 1
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class _Pacer:
+    """Spaces requests to stay under `rpm`, and holds everyone back after a 429."""
+
+    def __init__(self, rpm: Optional[float]):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def back_off(self, seconds: float) -> None:
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+def _retry_after(err: OpenAIError, attempt: int) -> float:
+    response = getattr(err, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        return min(60.0, 2 ** attempt) * random.uniform(0.8, 1.2)
+
+
+def _create(messages: List[Dict[str, str]], *, model: str, max_tokens: int, pacer: _Pacer, usage: BatchUsage) -> dict[str, Any]:
+    from myapp.ai.complaint_agent import get_client
+
+    client = get_client()
+    for attempt in range(MAX_RETRIES):
+        pacer.wait()
+        try:
+            resp = client.chat.completions.create(
+                model=model,
+                temperature=0,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
+                messages=messages,
+                timeout=60,
+            )
+        except (RateLimitError, APIConnectionError, InternalServerError) as err:
+            if isinstance(err, RateLimitError):
+                usage.add_rate_limit()
+            if attempt == MAX_RETRIES - 1:
+                raise
+            pacer.back_off(_retry_after(err, attempt))
+            continue
+        usage.add_response(resp)
+        return json.loads(resp.choices[0].message.content)
+    raise RuntimeError("unreachable")
+
+
+def _classify_one(text: str, **kw: Any) -> dict[str, Any]:
+    from myapp.ai.complaint_agent import RESPONSE_SCHEMA, SYSTEM_PROMPT
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"{RESPONSE_SCHEMA}\n\nStudent complaint:\n{text}"},
+    ]
+    try:
+        return _create(messages, **kw)
+    except OpenAIError as api_err:
+        return {"error": f"OpenAI API error: {str(api_err)}", "raw": ""}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}", "raw": ""}
+
+
+def _classify_pack(items: List[Tuple[int, str]], *, max_tokens: int, **kw: Any) -> List[Tuple[int, dict[str, Any]]]:
+    if len(items) == 1:
+        i, text = items[0]
+        return [(i, _classify_one(text, max_tokens=max_tokens, **kw))]
+
+    from myapp.ai.complaint_agent import RESPONSE_SCHEMA, SYSTEM_PROMPT
+
+    payload = json.dumps([{"id": i, "text": text} for i, text in items], ensure_ascii=False)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"{RESPONSE_SCHEMA}\n\n{_PACK_INSTRUCTIONS}\n\nStudent complaints:\n{payload}"},
+    ]
+    try:
+        parsed = _create(messages, max_tokens=max_tokens * len(items), **kw)
+    except (ValueError, TypeError) as parse_err:  # not JSON, or no content at all
+        logger.info("packed reply for %d complaints is not valid JSON (%s); asking one by one", len(items), parse_err)
+        parsed = {}
+    except Exception as err:
+        # rate limits and server errors were already retried with backoff in _create; asking
+        # for every complaint separately would multiply the requests while the API is struggling
+        logger.warning("packed request for %d complaints failed: %s", len(items), err)
+        prefix = "OpenAI API error" if isinstance(err, OpenAIError) else "Unexpected error"
+        return [(i, {"error": f"{prefix}: {str(err)}", "raw": ""}) for i, _ in items]
+
+    by_id: Dict[int, dict[str, Any]] = {}
+    entries = parsed.get("results") if isinstance(parsed, dict) else None
+    for entry in entries if isinstance(entries, list) else []:
+        if isinstance(entry, dict):
+            try:
+                by_id[int(entry.pop("id"))] = entry
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    out = []
+    for i, text in items:
+        result = by_id.get(i)
+        if not isinstance(result, dict) or "routing" not in result:
+            # the model dropped or mangled this entry: packing wasn't safe here
+            logger.info("packed reply has no usable entry for item %d; asking for it alone", i)
+            result = _classify_one(text, max_tokens=max_tokens, **kw)
+        out.append((i, result))
+    return out
+
+
+def _packs(texts: Sequence[str], pack_size: int) -> List[List[Tuple[int, str]]]:
+    packs: List[List[Tuple[int, str]]] = []
+    current: List[Tuple[int, str]] = []
+    for i, text in enumerate(texts):
+        if len(text) > PACK_MAX_CHARS or pack_size <= 1:
+            packs.append([(i, text)])
+            continue
+        current.append((i, text))
+        if len(current) >= pack_size:
+            packs.append(current)
+            current = []
+    if current:
+        packs.append(current)
+    return packs
+
+
+def ai_agent_batch(
+    texts: Sequence[str],
+    *,
+    model: str = "gpt-4o-mini",
+    max_tokens: int = 1000,
+    pack_size: int = 5,
+    concurrency: int = 4,
+    rpm: Optional[float] = None,
+    usage: Optional[BatchUsage] = None,
+    on_result: Optional[Callable[[int, dict[str, Any]], None]] = None,
+) -> List[dict[str, Any]]:
+    """
+    Classify many complaints. Returns one ai_agent-style dict per input, in input order.
+
+    Short complaints are packed `pack_size` to a request; packs run on `concurrency`
+    threads paced to `rpm` requests/minute, backing off on rate limits, connection and
+    server errors. A pack whose reply can't be parsed, or lacks some entries, is asked
+    again one complaint at a time; a pack that still fails after the retries gets an
+    error result for each of its complaints.
+    `on_result(index, result)` is called from the calling thread as results arrive.
+    """
+    usage = usage if usage is not None else BatchUsage()
+    pacer = _Pacer(rpm)
+    results: List[dict[str, Any]] = [{} for _ in texts]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ai-batch") as pool:
+        futures = [
+            pool.submit(_classify_pack, pack, model=model, max_tokens=max_tokens, pacer=pacer, usage=usage)
+            for pack in _packs(texts, pack_size)
+        ]
+        for future in as_completed(futures):
+            for i, result in future.result():
+                results[i] = result
+                if on_result is not None:
+                    on_result(i, result)
+    return results
@@ -2,16 +2,16 @@
 # JSON-structured Technical Complaint AI Agent
 # ==============================================
 from __future__ import annotations
+import asyncio
+import collections
 import os
 import json
 import sys
-from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError
-from typing import Any, List, Dict
+import threading
+from typing import Any, AsyncIterator, List, Dict
 import re
 import time
-from openai import APIConnectionError, RateLimitError, APIStatusError
-import httpx
+import weakref
 LLM_TIMEOUT_S = int(os.getenv("LLM_TIMEOUT", "25"))  # 25s hard limit
 
 # For Windows consoles with Arabic/Unicode text
@@ -51,11 +51,64 @@ _INLINE_CMD_PATTERNS = [
 def _lines(s: str) -> List[str]:
     return [ln.rstrip("\r") for ln in (s or "").splitlines()]
 
+# Every inline pattern starts with a literal keyword; a pattern whose keyword isn't in the text
+# can't match, so its findall is skipped. Checking `kw in lowered` is one cheap C scan per keyword,
+# while each case-insensitive findall is a slow character-by-character regex pass.
+_INLINE_CMD_KEYWORDS = [re.match(r"\((\w+)", p.pattern).group(1) for p in _INLINE_CMD_PATTERNS]
+# the only non-ASCII characters re.IGNORECASE equates with ASCII letters
+_IGNORECASE_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+# rough cost of one Python-level match attempt, in characters of regex scanning
+_HIT_COST_CHARS = 32
+# "does any inline pattern match somewhere in s" as a single search
+_INLINE_CMD_ANY_RE = re.compile("|".join(f"(?:{p.pattern})" for p in _INLINE_CMD_PATTERNS), re.IGNORECASE)
+
+
+def _matches_at_keyword(patt: re.Pattern, code_raw: str, lowered: str, kw: str) -> List[str]:
+    """patt.findall(code_raw), trying only the offsets where kw occurs (lowered must align with code_raw)."""
+    found: List[str] = []
+    pos = lowered.find(kw)
+    while pos != -1:
+        m = patt.match(code_raw, pos)
+        if m:
+            found.append(m.group(1))
+            pos = lowered.find(kw, m.end())  # findall doesn't overlap its own matches
+        else:
+            pos = lowered.find(kw, pos + 1)
+    return found
+
+
+def _inline_pattern_matches(code_raw: str) -> List[List[str]]:
+    """Per pattern, exactly what patt.findall(code_raw) returns."""
+    aligned = code_raw.isascii()  # .lower() keeps offsets, so keyword hits index code_raw directly
+    lowered = (code_raw if aligned else code_raw.translate(_IGNORECASE_FOLD)).lower()
+    found: List[List[str]] = []
+    for kw, patt in zip(_INLINE_CMD_KEYWORDS, _INLINE_CMD_PATTERNS):
+        hits = lowered.count(kw)
+        if not hits:
+            found.append([])
+        elif aligned and hits * _HIT_COST_CHARS < len(code_raw):
+            # a few keyword hits in a long text: matching at each beats a full case-insensitive scan
+            found.append(_matches_at_keyword(patt, code_raw, lowered, kw))
+        else:
+            found.append(patt.findall(code_raw))
+    return found
+
+
 def _extract_commands_list(code_raw: str) -> List[str]:
     """Extract only real commands from a mixed code/prose block."""
     if not code_raw:
         return []
     candidates: List[str] = []
+    line_is_cmd: Dict[str, bool] = {}
+
+    def _strip_prompt(s: str) -> str:
+        return s[1:].strip() if s.startswith("$") else s
+
+    def _is_cmd_line(s: str) -> bool:
+        hit = line_is_cmd.get(s)
+        if hit is None:
+            hit = line_is_cmd[s] = bool(_CMD_LINE_RE.match(s))
+        return hit
 
     # triple blocks
     for block in _TRIPLE_BLOCK_RE.findall(code_raw):
@@ -63,41 +116,28 @@ def _extract_commands_list(code_raw: str) -> List[str]:
             s = ln.strip()
             if not s:
                 continue
-            if s.startswith("$"):
-                s = s[1:].strip()
-            if _CMD_LINE_RE.match(s):
+            s = _strip_prompt(s)
+            if _is_cmd_line(s):
                 candidates.append(s)
 
     # inline backticks
     for inline in _INLINE_BT_RE.findall(code_raw):
-        s = inline.strip()
-        if s.startswith("$"):
-            s = s[1:].strip()
-        if _CMD_LINE_RE.match(s) or any(p.search(s) for p in _INLINE_CMD_PATTERNS):
+        s = _strip_prompt(inline.strip())
+        if _CMD_LINE_RE.match(s) or _INLINE_CMD_ANY_RE.search(s):
             candidates.append(s)
 
-    # patterns anywhere
-    for patt in _INLINE_CMD_PATTERNS:
-        for m in patt.findall(code_raw):
-            s = m.strip()
-            if s.startswith("$"):
-                s = s[1:].strip()
-            candidates.append(s)
+    # patterns anywhere, grouped by pattern as before
+    for matches in _inline_pattern_matches(code_raw):
+        candidates.extend(_strip_prompt(m.strip()) for m in matches)
 
     # whole-line commands
     for ln in _lines(code_raw):
-        s = ln.strip()
-        if s.startswith("$"):
-            s = s[1:].strip()
-        if _CMD_LINE_RE.match(s):
+        s = _strip_prompt(ln.strip())
+        if _is_cmd_line(s):
             candidates.append(s)
 
-    # dedup
-    seen = set(); dedup: List[str] = []
-    for c in candidates:
-        if c not in seen:
-            seen.add(c); dedup.append(c)
-    return dedup
+    # dedup, keeping first occurrence
+    return list(dict.fromkeys(candidates))
 
 _STOPWORDS = {
     "the","to","and","of","in","on","for","a","an","with","be","is","are","it","that","this","your","you",
@@ -107,35 +147,85 @@ _STOPWORDS = {
 def _tokens(s: str) -> List[str]:
     return [t for t in re.findall(r"[a-z0-9_]+", (s or "").lower()) if t not in _STOPWORDS]
 
-def _best_step_idx_for_cmd(cmd: str, steps_texts: List[str]) -> int | None:
-    """Attach command to the most similar step; return None if low confidence."""
-    ctoks = set(_tokens(cmd))
-    if not ctoks:
-        return None
-    best_i, best_score = None, 0.0
-    for i, step in enumerate(steps_texts):
-        stoks = set(_tokens(step))
-        if not stoks:
-            continue
-        inter = len(ctoks & stoks)
-        score = inter / max(1, min(len(ctoks), len(stoks)))
-        if ("version" in ctoks and "version" in stoks) or ("install" in ctoks and "install" in stoks):
-            score += 0.25
-        if score > best_score:
-            best_i, best_score = i, score
-    return best_i if (best_i is not None and best_score >= 0.25) else None
+class _StepIndex:
+    """
+    Step texts tokenised once into an inverted index (token -> step ids), so attaching a
+    command only scores the steps that share a token with it.
+    """
+
+    def __init__(self, steps_texts: List[str]):
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        for i, step in enumerate(steps_texts):
+            stoks = set(_tokens(step))
+            self.sizes.append(len(stoks))
+            for tok in stoks:
+                self.postings.setdefault(tok, []).append(i)
+        self._bonus_steps = {tok: set(self.postings.get(tok, ())) for tok in ("version", "install")}
+
+    def best_step(self, cmd: str) -> int | None:
+        """Attach command to the most similar step; return None if low confidence."""
+        ctoks = set(_tokens(cmd))
+        if not ctoks:
+            return None
+        shared: Dict[int, int] = {}
+        for tok in ctoks:
+            for i in self.postings.get(tok, ()):
+                shared[i] = shared.get(i, 0) + 1
+        bonus = set()
+        for tok, steps in self._bonus_steps.items():
+            if tok in ctoks:
+                bonus |= steps
+        best_i, best_score = None, 0.0
+        for i in sorted(shared):  # step order, so ties go to the earlier step
+            score = shared[i] / max(1, min(len(ctoks), self.sizes[i]))
+            if i in bonus:
+                score += 0.25
+            if score > best_score:
+                best_i, best_score = i, score
+        return best_i if (best_i is not None and best_score >= 0.25) else None
 
 
 # ==============================================
-# 1) Load API key from .env
+# 1) Lazily-built, shared OpenAI client
 # ==============================================
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY not found in .env")
+# Nothing here runs at import time: manage.py commands, tests and worker boots that
+# never call the model don't pay for importing openai/httpx or need an API key.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+
+_client_lock = threading.Lock()
+_client = None
+
+
+def _api_key() -> str:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not found in .env")
+    return api_key
+
+
+def _http_limits():
+    import httpx
+
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE)
+
+
+def get_client():
+    """The process-wide OpenAI client, created on first use over one pooled keep-alive httpx transport."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+
+                _client = OpenAI(api_key=_api_key(), http_client=httpx.Client(limits=_http_limits(), timeout=LLM_TIMEOUT_S))
+    return _client
 
-client = OpenAI(api_key=api_key)
-print("OpenAI Key loaded:", True)
 
 # ==============================================
 # 2) JSON schema (as text) + strict system rules
@@ -207,25 +297,32 @@ Rules:
 # ==============================================
 # 3) Agent function
 # ==============================================
+def chat_request(student_complaint: str, *, model: str, temperature: float, max_tokens: int) -> dict[str, Any]:
+    """Keyword arguments for chat.completions.create, shared by the sync, async and streaming agents."""
+    return dict(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        # Forces the model to emit a single JSON object (no prose)
+        response_format={"type": "json_object"},
+        messages= [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{RESPONSE_SCHEMA}\n\nStudent complaint:\n{student_complaint}"},
+            ],
+        # request lower latency
+        timeout=30,
+    )
+
+
 def ai_agent(student_complaint: str, *,model: str = "gpt-4o-mini", temperature: float = 0.0, max_tokens: int = 1000) -> dict[str, Any]:
     """
     Takes a student's complaint and returns a structured JSON dict.
     """
     
+    from openai import OpenAIError
+
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            temperature=0,             
-            max_tokens=max_tokens,
-            # Forces the model to emit a single JSON object (no prose)
-            response_format={"type": "json_object"},
-            messages= [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"{RESPONSE_SCHEMA}\n\nStudent complaint:\n{student_complaint}"},
-                ],
-            # request lower latency
-            timeout=30,
-        )
+        resp = get_client().chat.completions.create(**chat_request(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens))
         raw = resp.choices[0].message.content
         parsed = json.loads(raw)
         return parsed
@@ -236,8 +333,139 @@ def ai_agent(student_complaint: str, *,model: str = "gpt-4o-mini", temperature:
         return {"error": f"Unexpected error: {str(e)}", "raw": ""}
 
 
+# ==============================================
+# 3b) Async agent (ASGI)
+# ==============================================
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "50"))   # outstanding LLM calls per server process
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))  # wait for a free slot before giving up
+
+
+class LLMLimiter:
+    """
+    At most `limit` LLM calls in flight across every event loop and thread of the process.
+    An asyncio.Semaphore belongs to one loop, and under WSGI every async view runs on its own,
+    so slots are counted under a threading lock and handed to waiters on whichever loop they wait on.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._held = 0
+        self._lock = threading.Lock()
+        self._waiters: "collections.deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]]" = collections.deque()
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting up to `timeout` seconds; False if none came free."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._held < self.limit and not self._waiters:
+                self._held += 1
+                return True
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except BaseException as exc:  # timed out or cancelled
+            with self._lock:
+                handed_over = waiter not in self._waiters
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            if handed_over:
+                self.release()  # release() gave us the slot as we stopped waiting: pass it on
+            if isinstance(exc, asyncio.TimeoutError):
+                return False
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(_wake, future)
+                    return  # the slot goes straight to the waiter, _held is unchanged
+                except RuntimeError:
+                    continue  # its loop is closed
+            self._held -= 1
+
+    @property
+    def in_use(self) -> int:
+        return self._held
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+llm_limiter = LLMLimiter(LLM_MAX_CONCURRENCY)
+
+# AsyncOpenAI (its httpx pool) is tied to the loop it is first used on; under ASGI that is
+# the one server loop, under WSGI every async view gets its own, which then shuts down.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[Any, Any]]" = weakref.WeakKeyDictionary()
+
+
+async def _closed_with_loop(client: Any) -> AsyncIterator[Any]:
+    # a suspended async generator is closed by loop.shutdown_asyncgens(), which asyncio.run
+    # (and so asgiref's async_to_sync) awaits before closing the loop
+    try:
+        yield client
+    finally:
+        await client.close()
+
+
+async def async_client() -> Any:
+    """The AsyncOpenAI client of the running loop, created on first use and closed with the loop."""
+    loop = asyncio.get_running_loop()
+    state = _async_clients.get(loop)
+    if state is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        http_client = httpx.AsyncClient(limits=_http_limits(), timeout=LLM_TIMEOUT_S)
+        owner = _closed_with_loop(AsyncOpenAI(api_key=_api_key(), http_client=http_client))
+        state = _async_clients[loop] = (await owner.__anext__(), owner)
+    return state[0]
+
+
+async def ai_agent_async(student_complaint: str, *, model: str = "gpt-4o-mini", temperature: float = 0.0, max_tokens: int = 1000) -> dict[str, Any]:
+    """
+    Non-blocking ai_agent: same result shape, at most LLM_MAX_CONCURRENCY calls in flight.
+    Cancellation (e.g. the client disconnected) propagates and aborts the HTTP request.
+    """
+    from openai import OpenAIError
+
+    if not await llm_limiter.acquire(LLM_QUEUE_TIMEOUT_S):
+        return {"error": "AI assistant is busy, please retry shortly.", "raw": "", "busy": True}
+    try:
+        client = await async_client()
+        resp = await client.chat.completions.create(**chat_request(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens))
+        raw = resp.choices[0].message.content
+        return json.loads(raw)
+    except OpenAIError as api_err:
+        return {"error": f"OpenAI API error: {str(api_err)}", "raw": ""}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}", "raw": ""}
+    finally:
+        llm_limiter.release()
+
+
 # ---- 4) Main Shaping in UI
 
+# ---- merge commands inline for UI
+def merge_step(step: Dict[str, Any]) -> str:
+    """One step as UI text, with its commands inlined (also used for streamed steps)."""
+    text = (step.get("text") or "").strip()
+    cmds = [c.strip() for c in (step.get("commands") or []) if c and c.strip()]
+    if not cmds:
+        return text
+    joined = "; ".join(f"`{c}`" for c in cmds)
+    if text.lower().startswith("run the following commands/code"):
+        # render as a separate final code block later (UI already supports CODE_PREFIX)
+        return "Run the following commands/code:\n" + "\n".join(cmds)
+    if text.endswith("."):
+        return text[:-1] + f" by running {joined}."
+    return text + f" by running {joined}."
+
 
 def for_frontend(agent_result: dict[str, Any]) -> dict[str, Any]:
     """
@@ -264,9 +492,9 @@ def for_frontend(agent_result: dict[str, Any]) -> dict[str, Any]:
     if code_raw:
         cmds = _extract_commands_list(code_raw)
         if cmds:
-            steps_texts = [ (s.get("text") or "") for s in steps_in ]
+            step_index = _StepIndex([ (s.get("text") or "") for s in steps_in ])
             for cmd in cmds:
-                idx = _best_step_idx_for_cmd(cmd, steps_texts)
+                idx = step_index.best_step(cmd)
                 if idx is not None:
                     steps_in[idx].setdefault("commands", [])
                     # avoid duplicates
@@ -276,21 +504,7 @@ def for_frontend(agent_result: dict[str, Any]) -> dict[str, Any]:
                     # if nothing matches, append as an extra step at the end
                     steps_in.append({"text": "Run the following commands/code:", "commands": [cmd]})
 
-    # ---- merge commands inline for UI
-    def _merge_step(step: Dict[str, Any]) -> str:
-        text = (step.get("text") or "").strip()
-        cmds = [c.strip() for c in (step.get("commands") or []) if c and c.strip()]
-        if not cmds:
-            return text
-        joined = "; ".join(f"`{c}`" for c in cmds)
-        if text.lower().startswith("run the following commands/code"):
-            # render as a separate final code block later (UI already supports CODE_PREFIX)
-            return "Run the following commands/code:\n" + "\n".join(cmds)
-        if text.endswith("."):
-            return text[:-1] + f" by running {joined}."
-        return text + f" by running {joined}."
-
-    steps_out: List[str] = [_merge_step(s) for s in steps_in if (s.get("text") or "").strip()]
+    steps_out: List[str] = [merge_step(s) for s in steps_in if (s.get("text") or "").strip()]
 
     ui = {
         "status": "ok",
@@ -0,0 +1,164 @@
+# ==============================================
+# Minimal local stand-in for the OpenAI chat API (load tests / offline runs)
+# ==============================================
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+DEFAULT_REPLY: dict[str, Any] = {
+    "routing": {"is_technical": True, "category": "dev_env_tooling", "confidence": 0.9},
+    "summary": "Your Python environment is missing the package.",
+    "steps_to_apply": [
+        {"text": "Activate your virtual environment.", "commands": []},
+        {"text": "Install the missing package.", "commands": ["pip install requests"]},
+        {"text": "Check the installed version.", "commands": ["python -m pip show requests"]},
+    ],
+    "verification_checklist": ["import requests works in a Python shell"],
+    "requests_for_more_info": [],
+    "solution": {"code_language": None, "code": ""},
+}
+
+
+def _completion(content: str, model: str, prompt: str = "") -> dict[str, Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        # rough 4-chars-per-token estimate so token accounting has something to add up
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4},
+    }
+
+
+def _chunk(delta: dict[str, Any], model: str, finish_reason: str | None = None) -> dict[str, Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+class FakeOpenAIServer:
+    """
+    Answers POST .../chat/completions with a fixed JSON reply after `delay` seconds.
+    With "stream": true the reply is sent as SSE chunks of `chunk_chars` characters,
+    `token_delay` seconds apart, like the real API's streamed deltas.
+    """
+
+    def __init__(self, *, delay: float = 1.0, reply: dict[str, Any] | None = None,
+                 chunk_chars: int = 12, token_delay: float = 0.02):
+        self.delay = delay
+        self.reply = reply or DEFAULT_REPLY
+        self.chunk_chars = chunk_chars
+        self.token_delay = token_delay
+        self.requests = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:  # keep-alive: serve requests until the client closes
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                headers = {k.strip().lower(): v.strip() for k, _, v in (ln.partition(":") for ln in lines[1:] if ln)}
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                self.requests += 1
+                await self._respond(lines[0], json.loads(body or b"{}"), writer)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request_line: str, payload: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        if "/chat/completions" not in request_line:
+            self._write(writer, 404, b'{"error": {"message": "not found"}}')
+            return
+        await asyncio.sleep(self.delay)
+        prompt = "".join(m.get("content") or "" for m in payload.get("messages") or [])
+        if payload.get("stream"):
+            await self._stream(self._content(prompt), payload.get("model", "fake"), writer)
+            return
+        body = json.dumps(_completion(self._content(prompt), payload.get("model", "fake"), prompt)).encode("utf-8")
+        self._write(writer, 200, body)
+        await writer.drain()
+
+    async def _stream(self, content: str, model: str, writer: asyncio.StreamWriter) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n"
+        )
+        events = [_chunk({"role": "assistant", "content": ""}, model)]
+        events += [_chunk({"content": content[i:i + self.chunk_chars]}, model) for i in range(0, len(content), self.chunk_chars)]
+        events.append(_chunk({}, model, finish_reason="stop"))
+        for n, event in enumerate(events):
+            if n > 1:
+                await asyncio.sleep(self.token_delay)
+            self._write_chunk(writer, f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            await writer.drain()
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+    def _content(self, prompt: str) -> str:
+        # packed requests from myapp.ai.batch end with a JSON array of {"id", "text"}
+        _, marker, tail = prompt.rpartition("Student complaints:\n")
+        if marker:
+            try:
+                items = json.loads(tail)
+                return json.dumps({"results": [dict(self.reply, id=item["id"]) for item in items]})
+            except (ValueError, TypeError, KeyError):
+                pass
+        return json.dumps(self.reply)
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str = "application/json") -> None:
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + body
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.base_events.Server:
+        return await asyncio.start_server(self._handle, host, port, backlog=1024)
+
+
+@contextmanager
+def running_fake_openai(**kwargs: Any) -> Iterator[tuple[str, FakeOpenAIServer]]:
+    """Run a FakeOpenAIServer on a background thread; yields (base_url, server)."""
+    fake = FakeOpenAIServer(**kwargs)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    holder: dict[str, Any] = {}
+
+    def _run() -> None:
+        asyncio.set_event_loop(loop)
+        holder["server"] = loop.run_until_complete(fake.start())
+        started.set()
+        loop.run_forever()
+        loop.close()
+
+    async def _shutdown() -> None:
+        holder["server"].close()
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in pending:  # idle keep-alive connections
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        loop.stop()
+
+    thread = threading.Thread(target=_run, name="fake-openai", daemon=True)
+    thread.start()
+    started.wait()
+    port = holder["server"].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1", fake
+    finally:
+        asyncio.run_coroutine_threadsafe(_shutdown(), loop)
+        thread.join(timeout=5)
@@ -0,0 +1,251 @@
+# ==============================================
+# Local pre-classifier: answer obvious non-technical complaints without the LLM
+# ==============================================
+from __future__ import annotations
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable, List, Sequence, Tuple
+
+from myapp.ai.response_cache import normalize_complaint
+
+# TF-IDF (word unigrams + bigrams, sublinear tf, L2-normalised) and a logistic regression
+# giving P(technical), trained by `manage.py train_preclassifier` from the complaints the
+# agent has already routed (ComplaintTriage). Pure Python and CPU only: a prediction is a
+# dictionary lookup per token, well under a millisecond.
+AI_PRECLASSIFIER_PATH = os.getenv(
+    "AI_PRECLASSIFIER_PATH", str(Path(__file__).resolve().parents[2] / "var" / "ai-preclassifier.json")
+)
+# route locally only when P(non-technical) reaches this; everything else goes to the LLM
+AI_PRECLASSIFIER_THRESHOLD = float(os.getenv("AI_PRECLASSIFIER_THRESHOLD", "0.9"))
+# a text with fewer known terms than this says too little to overrule the LLM
+MIN_KNOWN_TERMS = 2
+MODEL_VERSION = 1
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def features(text: str) -> Counter:
+    """Term counts of a complaint: lower-cased word unigrams and bigrams ("a b")."""
+    # the AI cache's normalisation: case, width and Arabic diacritics don't make a new term
+    words = [w for w in _TOKEN_RE.findall(normalize_complaint(text)) if not w.isdigit()]
+    terms = Counter(words)
+    terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+class PreClassifier:
+    """A trained model: per term (idf, weight) and a bias; predict() gives P(technical)."""
+
+    def __init__(self, terms: dict[str, Tuple[float, float]], bias: float, meta: dict[str, Any] | None = None):
+        self.terms = terms
+        self.bias = bias
+        self.meta = meta or {}
+
+    def _vector(self, counts: Counter) -> List[Tuple[str, float]]:
+        # sublinear tf * idf over the known terms, L2-normalised
+        vector = [(t, (1.0 + math.log(tf)) * self.terms[t][0]) for t, tf in counts.items() if t in self.terms]
+        norm = math.sqrt(sum(v * v for _, v in vector)) or 1.0
+        return [(t, v / norm) for t, v in vector]
+
+    def predict(self, text: str) -> Tuple[float, int]:
+        """(P(technical), number of known terms) for one complaint."""
+        vector = self._vector(features(text))
+        z = self.bias + sum(self.terms[term][1] * v for term, v in vector)
+        return _sigmoid(z), len(vector)
+
+    # ---- training
+
+    @classmethod
+    def train(
+        cls,
+        examples: Sequence[Tuple[str, bool]],
+        *,
+        min_df: int = 2,
+        max_terms: int = 50000,
+        epochs: int = 8,
+        l2: float = 1e-5,
+        learning_rate: float = 0.5,
+        seed: int = 0,
+    ) -> "PreClassifier":
+        """Fit on (text, is_technical) pairs: vocabulary and idf from the texts, weights by SGD on log loss."""
+        docs = [features(text) for text, _ in examples]
+        df: Counter = Counter()
+        for doc in docs:
+            df.update(doc.keys())
+        n = len(docs)
+        vocabulary = [t for t, c in df.most_common(max_terms) if c >= min_df]
+        idf = {t: math.log((1 + n) / (1 + df[t])) + 1.0 for t in vocabulary}
+        model = cls({t: (idf[t], 0.0) for t in vocabulary}, 0.0)
+
+        vectors = [model._vector(doc) for doc in docs]
+        labels = [1.0 if technical else 0.0 for _, technical in examples]
+        weights = dict.fromkeys(vocabulary, 0.0)
+        positives = sum(labels)
+        # start from the class prior so rare terms only have to explain the difference
+        bias = math.log((positives + 1) / (n - positives + 1))
+        order = list(range(n))
+        rng = random.Random(seed)
+        step = 0
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for i in order:
+                step += 1
+                rate = learning_rate / (1 + learning_rate * l2 * step)
+                vector = vectors[i]
+                error = _sigmoid(bias + sum(weights[t] * v for t, v in vector)) - labels[i]
+                bias -= rate * error
+                for t, v in vector:
+                    weights[t] -= rate * (error * v + l2 * weights[t])
+        model.terms = {t: (idf[t], weights[t]) for t in vocabulary if weights[t]}
+        model.bias = bias
+        model.meta = {"examples": n, "technical": int(positives), "terms": len(model.terms)}
+        return model
+
+    # ---- persistence (JSON: readable, diffable, no pickle)
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        payload = {"version": MODEL_VERSION, "bias": self.bias, "meta": self.meta, "terms": self.terms}
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".ai-preclassifier-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                json.dump(payload, out, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "PreClassifier | None":
+        """The model saved at `path`, or None if there is none (or it is from another format version)."""
+        try:
+            with open(path, encoding="utf-8") as src:
+                payload = json.load(src)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != MODEL_VERSION:
+            return None
+        terms = {t: (float(idf), float(w)) for t, (idf, w) in payload["terms"].items()}
+        return cls(terms, float(payload["bias"]), payload.get("meta"))
+
+
+def answers_locally(p_technical: float, known_terms: int, threshold: float) -> bool:
+    return known_terms >= MIN_KNOWN_TERMS and 1 - p_technical >= threshold
+
+
+def evaluate(model: PreClassifier, examples: Iterable[Tuple[str, bool]], threshold: float) -> dict[str, Any]:
+    """
+    How routing held-out (text, is_technical) pairs at `threshold` would have gone: the share
+    answered locally (LLM calls saved), technical complaints wrongly answered locally, overall
+    accuracy of the technical/non-technical call, and prediction latency.
+    """
+    total = local = local_technical = correct = 0
+    timings: List[float] = []
+    for text, technical in examples:
+        started = time.perf_counter()
+        p_technical, known = model.predict(text)
+        timings.append(time.perf_counter() - started)
+        total += 1
+        correct += (p_technical >= 0.5) == bool(technical)
+        if answers_locally(p_technical, known, threshold):
+            local += 1
+            local_technical += bool(technical)
+    timings.sort()
+    return {
+        "examples": total,
+        "accuracy": correct / total if total else None,
+        "threshold": threshold,
+        "llm_calls_saved": local,
+        "saved_rate": local / total if total else None,
+        "technical_answered_locally": local_technical,
+        "local_precision": (local - local_technical) / local if local else None,
+        "p50_ms": timings[len(timings) // 2] * 1000 if timings else None,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000 if timings else None,
+    }
+
+
+# ---- runtime: the process-wide model and its counters
+
+_lock = threading.Lock()
+_model: dict[str, Any] = {"loaded": False, "model": None}
+_counters = {"local": 0, "llm": 0, "seconds": 0.0}
+
+
+def get_model() -> PreClassifier | None:
+    with _lock:
+        if not _model["loaded"]:
+            _model["model"] = PreClassifier.load(AI_PRECLASSIFIER_PATH)
+            _model["loaded"] = True
+        return _model["model"]
+
+
+def reset_model() -> None:
+    """Forget the loaded model (e.g. after retraining); the next call reloads it from disk."""
+    with _lock:
+        _model.update(loaded=False, model=None)
+
+
+def local_result(p_technical: float) -> dict[str, Any]:
+    """An agent-shaped result for a complaint routed locally, so for_frontend gives the ticket_prefill path."""
+    return {
+        "routing": {"is_technical": False, "category": "non_technical", "confidence": round(1 - p_technical, 4)},
+        "summary": "",
+        "steps_to_apply": [],
+        "verification_checklist": [],
+        "requests_for_more_info": [],
+        "solution": {"code_language": None, "code": ""},
+        "routed_by": "local_classifier",
+    }
+
+
+def preclassify(text: str, *, threshold: float | None = None) -> dict[str, Any] | None:
+    """
+    The local result for an obviously non-technical complaint, or None when the LLM should
+    answer (no trained model, too few known terms, or not confident enough).
+    """
+    threshold = AI_PRECLASSIFIER_THRESHOLD if threshold is None else threshold
+    model = get_model()
+    if model is None:
+        return None
+    started = time.perf_counter()
+    p_technical, known = model.predict(text)
+    local = answers_locally(p_technical, known, threshold)
+    with _lock:
+        _counters["local" if local else "llm"] += 1
+        _counters["seconds"] += time.perf_counter() - started
+    return local_result(p_technical) if local else None
+
+
+def preclassifier_stats() -> dict[str, Any]:
+    """Complaints answered locally vs passed on to the LLM since start-up, and classification time."""
+    with _lock:
+        local, llm, seconds = _counters["local"], _counters["llm"], _counters["seconds"]
+    checked = local + llm
+    return {
+        "local": local,
+        "llm": llm,
+        "seconds": seconds,
+        "saved_rate": local / checked if checked else None,
+        "mean_ms": seconds * 1000 / checked if checked else None,
+    }
+
+
+def reset_stats() -> None:
+    with _lock:
+        _counters.update(local=0, llm=0, seconds=0.0)
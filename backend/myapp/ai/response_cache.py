@@ -0,0 +1,106 @@
+# ==============================================
+# Content-addressed cache in front of ai_agent
+# ==============================================
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any
+
+from myapp.ttl_cache import TTLCache
+
+AI_CACHE_TTL_S = int(os.getenv("AI_CACHE_TTL", str(24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "2048"))
+
+# harakat, superscript alef and tatweel: spelling variants that don't change meaning
+_ARABIC_MARKS_RE = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_WS_RE = re.compile(r"\s+")
+
+_store = TTLCache(maxsize=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL_S)
+_counter_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def normalize_complaint(text: str) -> str:
+    """Fold whitespace, case and Arabic diacritics so trivially different complaints share a key."""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _ARABIC_MARKS_RE.sub("", text)
+    return _WS_RE.sub(" ", text).strip().casefold()
+
+
+def _prompt_version() -> str:
+    from myapp.ai.complaint_agent import RESPONSE_SCHEMA, SYSTEM_PROMPT
+    return hashlib.sha256((SYSTEM_PROMPT + RESPONSE_SCHEMA).encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(text: str, *, model: str, temperature: float = 0.0, max_tokens: int) -> str:
+    material = json.dumps(
+        [normalize_complaint(text), model, _prompt_version(), float(temperature), max_tokens],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _count(name: str) -> None:
+    with _counter_lock:
+        _counters[name] += 1
+
+
+def cached_result(key: str) -> dict[str, Any] | None:
+    """The cached agent result for a cache_key(), counted as a hit or a miss."""
+    stored = _store.get(key)
+    if stored is None:
+        _count("misses")
+        return None
+    _count("hits")
+    # stored as JSON text: for_frontend mutates the steps it is given, so every caller gets a fresh copy
+    return json.loads(stored)
+
+
+def remember_result(key: str, result: Any) -> None:
+    """Cache an agent result under a cache_key(); error results are dropped."""
+    if isinstance(result, dict) and "error" not in result:
+        _store.set(key, json.dumps(result, ensure_ascii=False))
+
+
+def cached_ai_agent(student_complaint: str, *, model: str = "gpt-4o-mini", temperature: float = 0.0, max_tokens: int = 1000) -> dict[str, Any]:
+    """
+    Same contract as ai_agent, served from the cache when an equivalent complaint was seen.
+    Error results are never cached.
+    """
+    from myapp.ai.complaint_agent import ai_agent
+
+    key = cache_key(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens)
+    result = cached_result(key)
+    if result is None:
+        result = ai_agent(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens)
+        remember_result(key, result)
+    return result
+
+
+async def cached_ai_agent_async(student_complaint: str, *, model: str = "gpt-4o-mini", temperature: float = 0.0, max_tokens: int = 1000) -> dict[str, Any]:
+    """Async counterpart of cached_ai_agent (the cache itself is in-process, so lookups don't block)."""
+    from myapp.ai.complaint_agent import ai_agent_async
+
+    key = cache_key(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens)
+    result = cached_result(key)
+    if result is None:
+        result = await ai_agent_async(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens)
+        remember_result(key, result)
+    return result
+
+
+def cache_stats() -> dict[str, int]:
+    with _counter_lock:
+        stats = dict(_counters)
+    stats["entries"] = len(_store)
+    return stats
+
+
+def clear_cache() -> None:
+    _store.clear()
+    with _counter_lock:
+        _counters.update(hits=0, misses=0)
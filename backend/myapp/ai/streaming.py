@@ -0,0 +1,217 @@
+# ==============================================
+# Streaming agent: incremental JSON parsing + UI fragments (SSE)
+# ==============================================
+from __future__ import annotations
+import json
+from typing import Any, AsyncIterator, Iterator, List, Tuple
+
+# top-level arrays whose elements are useful on their own, emitted one by one
+ITEM_KEYS = ("steps_to_apply", "verification_checklist", "requests_for_more_info")
+
+
+class IncrementalJSONParser:
+    """
+    Feed the model's JSON object in arbitrary chunks; yields events as soon as they are complete:
+      ("field", key, value)        a top-level key whose value has closed
+      ("item", key, index, value)  an element of one of ITEM_KEYS
+    Only tracks nesting and string state, so each character is looked at once. Only the text
+    of what is still open is kept (the elements of ITEM_KEYS, not the arrays around them).
+    `closed` turns true once the top-level object has closed, `malformed` once a value failed
+    to parse (it yields no event).
+    """
+
+    def __init__(self) -> None:
+        self._pieces: List[str] = []  # fed text from absolute offset self._base on
+        self._base = 0
+        self._pos = 0  # absolute offset of the next character
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: str | None = None
+        self._pending_key: str | None = None
+        self._value_start: int | None = None
+        self._item_start: int | None = None
+        self._collecting = False  # the open value is an ITEM_KEYS array
+        self._items: List[Any] = []
+        self._string_start = 0
+        self.closed = False
+        self.malformed = False
+
+    def feed(self, chunk: str) -> Iterator[Tuple[Any, ...]]:
+        self._pieces.append(chunk)
+        for ch in chunk:
+            i = self._pos
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None:
+                        self._pending_key = json.loads(self._slice(self._string_start, i + 1))
+                    elif self._depth == 1:
+                        yield from self._close_value(i + 1)
+                    elif self._depth == 2 and self._item_start is not None and self._item_start == self._string_start:
+                        yield from self._close_item(i + 1)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._mark_start(i, ch)
+            elif ch in "{[":
+                self._mark_start(i, ch)
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.closed = True
+                if self._depth == 0 and self._value_start is not None:
+                    yield from self._close_value(i)  # bare scalar right before the final brace
+                elif self._depth == 1 and self._key is not None and self._value_start is not None:
+                    yield from self._close_value(i + 1)
+                elif self._depth == 2 and self._item_start is not None:
+                    yield from self._close_item(i + 1)
+            elif ch == ":" and self._depth == 1:
+                self._key, self._pending_key = self._pending_key, None
+            elif ch == "," and self._depth == 1 and self._value_start is not None:
+                yield from self._close_value(i)  # bare scalar (number/true/false/null)
+            elif not ch.isspace() and ch not in ",:":
+                self._mark_start(i, ch)
+        self._trim()
+
+    def _slice(self, start: int, end: int) -> str:
+        if len(self._pieces) > 1:
+            self._pieces = ["".join(self._pieces)]
+        return self._pieces[0][start - self._base:end - self._base] if self._pieces else ""
+
+    def _trim(self) -> None:
+        # drop the text no open value, element or key string can still need
+        starts = [self._item_start]
+        if not self._collecting:
+            starts.append(self._value_start)
+        if self._in_string:
+            starts.append(self._string_start)
+        keep = min([s for s in starts if s is not None], default=self._pos)
+        if keep > self._base:
+            text = "".join(self._pieces)
+            self._pieces = [text[keep - self._base:]] if keep < self._pos else []
+            self._base = keep
+
+    def _mark_start(self, i: int, ch: str) -> None:
+        if self._depth == 1 and self._key is not None and self._value_start is None:
+            self._value_start = i
+            self._collecting = self._key in ITEM_KEYS and ch == "["
+            self._items = []
+        elif self._depth == 2 and self._collecting and self._item_start is None and self._value_start is not None:
+            self._item_start = i
+
+    def _close_value(self, end: int) -> Iterator[Tuple[Any, ...]]:
+        key, start, collected = self._key, self._value_start, self._collecting
+        self._key = self._value_start = self._item_start = None
+        self._collecting = False
+        if collected:
+            # the elements were parsed (and their text dropped) as they closed
+            yield ("field", key, self._items)
+            return
+        try:
+            value = json.loads(self._slice(start, end))
+        except ValueError:
+            self.malformed = True
+            return
+        yield ("field", key, value)
+
+    def _close_item(self, end: int) -> Iterator[Tuple[Any, ...]]:
+        start, self._item_start = self._item_start, None
+        try:
+            value = json.loads(self._slice(start, end))
+        except ValueError:
+            self.malformed = True
+            return
+        yield ("item", self._key, len(self._items), value)
+        self._items.append(value)
+
+
+def ui_fragments(events: Iterator[Tuple[Any, ...]], state: dict[str, Any]) -> Iterator[Tuple[str, dict[str, Any]]]:
+    """
+    Turn parser events into (sse_event, data) pairs for the student UI.
+    `state` carries what is known so far (is_technical), since non-technical answers hide their details.
+    """
+    from myapp.ai.complaint_agent import merge_step
+
+    for event in events:
+        if event[0] == "field":
+            _, key, value = event
+            if key == "routing" and isinstance(value, dict):
+                state["is_technical"] = bool(value.get("is_technical", True))
+                yield "routing", {"is_technical": state["is_technical"], "category": value.get("category")}
+            elif key == "summary" and state.get("is_technical", True):
+                yield "summary", {"summary": value}
+        elif state.get("is_technical", True):
+            _, key, index, value = event
+            if key == "steps_to_apply" and isinstance(value, dict) and (value.get("text") or "").strip():
+                yield "step", {"index": index, "text": merge_step(value)}
+            elif key == "verification_checklist":
+                yield "verify", {"index": index, "text": value}
+
+
+def sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def ai_agent_stream(student_complaint: str, *, model: str = "gpt-4o-mini", temperature: float = 0.0, max_tokens: int = 1000) -> AsyncIterator[Tuple[str, dict[str, Any]]]:
+    """
+    Streaming ai_agent for the UI: yields (event, data) pairs. Partial events
+    (routing, summary, step, verify) arrive as the model writes them; the stream
+    always ends with "done" ({"ui", "raw"}, shaped by for_frontend, authoritative)
+    or "error" ({"error", "busy"}). Complaints the local pre-classifier is sure are
+    non-technical, and cached ones, go straight to "done".
+    """
+    from openai import OpenAIError
+
+    from myapp.ai.complaint_agent import LLM_QUEUE_TIMEOUT_S, async_client, chat_request, for_frontend, llm_limiter
+    from myapp.ai.preclassifier import preclassify
+    from myapp.ai.response_cache import cache_key, cached_result, remember_result
+
+    key = cache_key(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens)
+    result = preclassify(student_complaint)
+    if result is None:
+        result = cached_result(key)
+    if result is not None:
+        yield "done", {"ui": for_frontend(result), "raw": result}
+        return
+
+    if not await llm_limiter.acquire(LLM_QUEUE_TIMEOUT_S):
+        yield "error", {"error": "AI assistant is busy, please retry shortly.", "busy": True}
+        return
+    parser = IncrementalJSONParser()
+    state: dict[str, Any] = {}
+    result = {}
+    try:
+        client = await async_client()
+        stream = await client.chat.completions.create(
+            stream=True, **chat_request(student_complaint, model=model, temperature=temperature, max_tokens=max_tokens)
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            # the answer is put together from the parser's fields: the reply text itself is not kept
+            events = list(parser.feed(delta))
+            result.update((event[1], event[2]) for event in events if event[0] == "field")
+            for fragment in ui_fragments(iter(events), state):
+                yield fragment
+        if not parser.closed or parser.malformed:
+            raise ValueError("the model's reply is not a complete JSON object")
+    except OpenAIError as api_err:
+        yield "error", {"error": f"OpenAI API error: {str(api_err)}", "busy": False}
+        return
+    except Exception as e:
+        yield "error", {"error": f"Unexpected error: {str(e)}", "busy": False}
+        return
+    finally:
+        llm_limiter.release()
+
+    remember_result(key, result)
+    yield "done", {"ui": for_frontend(result), "raw": result}
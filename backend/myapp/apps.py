@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        # connect the receivers that invalidate cached roles and student lookups,
+        # and the ones that keep the complaint stats rollup, search fallback index and duplicate flags current
+        from . import duplicates, roles, search, stats_rollup, students  # noqa: F401
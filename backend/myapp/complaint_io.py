@@ -0,0 +1,300 @@
+"""
+Bulk complaint import/export as CSV or JSONL.
+
+Everything here is a generator over rows, so memory stays flat whatever the
+file or table size: imports are read line by line and inserted in batches,
+exports walk the table in complaint_id order one chunk at a time.
+"""
+import csv
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Complaint
+from .stats_rollup import record_created
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_COLUMNS = (
+    'complaint_id', 'student_id', 'title', 'description', 'category',
+    'priority', 'status', 'created_at', 'resolved_at',
+)
+# complaint_id is assigned by the database; an imported complaint_id column is ignored
+REQUIRED_COLUMNS = ('student_id', 'title', 'description', 'category', 'created_at')
+DEFAULTS = {'priority': 'Medium', 'status': 'Open'}
+
+_CHOICES = {
+    'category': {value for value, _ in Complaint.CATEGORY_CHOICES},
+    'priority': {value for value, _ in Complaint.PRIORITY_CHOICES},
+    'status': {value for value, _ in Complaint.STATUS_CHOICES},
+}
+_TITLE_MAX_LENGTH = Complaint._meta.get_field('title').max_length
+
+_INSERT_SQL = (
+    "INSERT INTO complaints (student_id, title, description, category, priority, status, created_at, resolved_at) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+class RowError(ValueError):
+    """A row that can't be imported; `line` is its line number in the source file."""
+
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    errors: List[RowError] = field(default_factory=list)
+
+
+def format_for_path(path, default='csv'):
+    for fmt in FORMATS:
+        if str(path).endswith(f'.{fmt}'):
+            return fmt
+    return default
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (line_number, raw_row) from an open text file, one row at a time."""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                raise RowError(line_no, f"invalid JSON ({exc})") from None
+            if not isinstance(row, dict):
+                raise RowError(line_no, "expected a JSON object")
+            yield line_no, row
+    else:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {FORMATS}")
+
+
+def _datetime(line, name, value, required):
+    if value in (None, ''):
+        if required:
+            raise RowError(line, f"{name} is required")
+        return None
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:  # well formed but out of range, e.g. month 13
+        parsed = None
+    if parsed is None:
+        raise RowError(line, f"{name} {value!r} is not an ISO 8601 datetime")
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_default_timezone())
+    return parsed
+
+
+def validate_row(line: int, row: Dict[str, object]) -> Tuple:
+    """Check one raw row against the Complaint model; returns the values for _INSERT_SQL."""
+    for name in REQUIRED_COLUMNS:
+        if row.get(name) in (None, ''):
+            raise RowError(line, f"{name} is required")
+    try:
+        student_id = int(row['student_id'])
+    except (TypeError, ValueError):
+        raise RowError(line, f"student_id {row['student_id']!r} is not an integer") from None
+    title = str(row['title']).strip()
+    if len(title) > _TITLE_MAX_LENGTH:
+        raise RowError(line, f"title is longer than {_TITLE_MAX_LENGTH} characters")
+
+    values = {}
+    for name, allowed in _CHOICES.items():
+        value = row.get(name) or DEFAULTS.get(name)
+        if not isinstance(value, str) or value not in allowed:  # JSONL rows may hold lists, dicts, numbers
+            raise RowError(line, f"{name} {value!r} is not one of {sorted(allowed)}")
+        values[name] = value
+
+    return (
+        student_id, title, str(row['description']), values['category'], values['priority'], values['status'],
+        _datetime(line, 'created_at', row.get('created_at'), required=True),
+        _datetime(line, 'resolved_at', row.get('resolved_at'), required=False),
+    )
+
+
+def import_rows(
+    rows: Iterable[Tuple[int, Dict[str, object]]],
+    *,
+    batch_size: int = 1000,
+    skip_invalid: bool = False,
+    dry_run: bool = False,
+    max_errors: int = 100,
+    on_batch=None,
+) -> ImportResult:
+    """
+    Validate and insert rows in batches, one transaction and one executemany per batch
+    (plus the batch's stats rollup increments).
+    An invalid row raises RowError unless skip_invalid (batches already written stay).
+    """
+    result = ImportResult()
+    batch: List[Tuple] = []
+
+    def _flush():
+        if batch and not dry_run:
+            adapt = connection.ops.adapt_datetimefield_value
+            params = [(*values[:6], adapt(values[6]), adapt(values[7])) for values in batch]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(_INSERT_SQL, params)
+                # (category, status, priority, created_at): the batch's buckets in the stats rollup
+                record_created((values[3], values[5], values[4], values[6]) for values in batch)
+        result.imported += len(batch)
+        batch.clear()
+        if on_batch is not None:
+            on_batch(result)
+
+    for line, row in rows:
+        try:
+            batch.append(validate_row(line, row))
+        except RowError as err:
+            if not skip_invalid:
+                raise
+            result.skipped += 1
+            if len(result.errors) < max_errors:
+                result.errors.append(err)
+            continue
+        if len(batch) >= batch_size:
+            _flush()
+    _flush()
+    return result
+
+
+def parse_bound(value: str, *, end: bool = False) -> datetime:
+    """
+    A --since/--until style bound: an ISO datetime, or a date meaning the start of that day
+    (or, with end=True, the start of the next day, so a date bound includes the whole day).
+    """
+    day = parse_date(value)  # first: parse_datetime also accepts a bare date, as midnight
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"{value!r} is not an ISO date or datetime")
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_default_timezone())
+    return parsed
+
+
+def filter_complaints(queryset, *, categories=None, statuses=None, since=None, until=None):
+    """Narrow a complaint queryset; `since`/`until` are strings for parse_bound (until is exclusive)."""
+    if categories:
+        queryset = queryset.filter(category__in=categories)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if since:
+        queryset = queryset.filter(created_at__gte=parse_bound(since))
+    if until:
+        queryset = queryset.filter(created_at__lt=parse_bound(until, end=True))
+    return queryset
+
+
+def iter_complaints(
+    queryset=None,
+    *,
+    columns=EXPORT_COLUMNS,
+    chunk_size: int = 2000,
+    order: str = 'complaint_id',
+) -> Iterator[Tuple]:
+    """
+    Yield complaint rows as tuples (values_list, no model instances), `chunk_size` per query.
+
+    Chunks are keyset-paginated on complaint_id rather than relying on a server-side
+    cursor: Django streams .iterator() results on PostgreSQL/Oracle, but on MySQL the
+    driver buffers the whole result set, which is what we are trying to avoid.
+    Pass order='-complaint_id' for newest first.
+    """
+    queryset = Complaint.objects.all() if queryset is None else queryset
+    columns = tuple(columns)
+    pk_at = columns.index('complaint_id') if 'complaint_id' in columns else None
+    fetch = columns if pk_at is not None else columns + ('complaint_id',)
+    descending = order.startswith('-')
+    last_id: Optional[int] = None
+    while True:
+        chunk = queryset
+        if last_id is not None:
+            chunk = chunk.filter(**{'complaint_id__lt' if descending else 'complaint_id__gt': last_id})
+        rows = list(chunk.order_by(order).values_list(*fetch)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][pk_at if pk_at is not None else -1]
+        for row in rows:
+            yield row if pk_at is not None else row[:-1]
+        if len(rows) < chunk_size:
+            return
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _text(value):
+    return '' if value is None else _jsonable(value)
+
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows: Iterable[Tuple], header=EXPORT_COLUMNS) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_text(value) for value in row])
+
+
+def jsonl_lines(rows: Iterable[Tuple], header=EXPORT_COLUMNS) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(header, map(_jsonable, row))), ensure_ascii=False) + '\n'
+
+
+def buffered(lines: Iterable[str], size: int = 64 * 1024) -> Iterator[str]:
+    """Join short lines into ~`size` character pieces, so a streamed response isn't one write per row."""
+    pending: List[str] = []
+    length = 0
+    for line in lines:
+        pending.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(pending)
+            pending.clear()
+            length = 0
+    if pending:
+        yield ''.join(pending)
+
+
+def export_lines(rows: Iterable[Tuple], fmt: str, header=EXPORT_COLUMNS) -> Iterator[str]:
+    if fmt == 'csv':
+        return csv_lines(rows, header)
+    if fmt == 'jsonl':
+        return jsonl_lines(rows, header)
+    raise ValueError(f"unknown format {fmt!r}, expected one of {FORMATS}")
+
+
+def peak_rss_mib() -> Optional[float]:
+    """Peak resident memory of this process, or None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Complaint, ComplaintStatsDaily, ComplaintStatsTotal
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    """Status / priority counters for one complaint category."""
+    total: int = 0
+    by_status: Dict[str, int] = field(default_factory=dict)
+    by_priority: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def pending(self) -> int:
+        return self.by_status.get('Open', 0)
+
+    @property
+    def in_progress(self) -> int:
+        return self.by_status.get('In Progress', 0)
+
+    @property
+    def resolved(self) -> int:
+        return self.by_status.get('Resolved', 0)
+
+    def as_context(self) -> Dict[str, object]:
+        # keys the dashboard templates already use
+        return {
+            'stats': self,
+            'pending_queries': self.pending,
+            'in_progress_queries': self.in_progress,
+            'resolved_queries': self.resolved,
+        }
+
+
+def _bucket_aggregates() -> Dict[str, Count]:
+    # one conditional COUNT per bucket, aliased by position so labels with spaces stay valid SQL
+    aggregates = {'total': Count('complaint_id')}
+    for i, (value, _) in enumerate(Complaint.STATUS_CHOICES):
+        aggregates[f'status_{i}'] = Count('complaint_id', filter=Q(status=value))
+    for i, (value, _) in enumerate(Complaint.PRIORITY_CHOICES):
+        aggregates[f'priority_{i}'] = Count('complaint_id', filter=Q(priority=value))
+    return aggregates
+
+
+def compute_dashboard_stats(category: str) -> DashboardStats:
+    """Compute every status/priority bucket for a category in a single query over the complaints table."""
+    row = Complaint.objects.filter(category=category).aggregate(**_bucket_aggregates())
+    return DashboardStats(
+        total=row['total'] or 0,
+        by_status={value: row[f'status_{i}'] or 0 for i, (value, _) in enumerate(Complaint.STATUS_CHOICES)},
+        by_priority={value: row[f'priority_{i}'] or 0 for i, (value, _) in enumerate(Complaint.PRIORITY_CHOICES)},
+    )
+
+
+def get_dashboard_stats(category: str) -> DashboardStats:
+    """The same counters read from the stats rollup: at most statuses x priorities rows, whatever the table size."""
+    by_status = {value: 0 for value, _ in Complaint.STATUS_CHOICES}
+    by_priority = {value: 0 for value, _ in Complaint.PRIORITY_CHOICES}
+    rows = ComplaintStatsTotal.objects.filter(category=category).values_list('status', 'priority', 'count')
+    for status, priority, n in rows:
+        by_status[status] = by_status.get(status, 0) + n
+        by_priority[priority] = by_priority.get(priority, 0) + n
+    return DashboardStats(total=sum(by_status.values()), by_status=by_status, by_priority=by_priority)
+
+
+def get_category_totals() -> Dict[str, int]:
+    """Complaints per category, from the rollup (every category present, zero if it has none)."""
+    totals = {value: 0 for value, _ in Complaint.CATEGORY_CHOICES}
+    for category, n in ComplaintStatsTotal.objects.values_list('category').annotate(n=Sum('count')).order_by():
+        totals[category] = n or 0
+    return totals
+
+
+def get_daily_trend(category: Optional[str] = None, days: int = 7, today: Optional[date] = None) -> Dict[str, List]:
+    """
+    New complaints per creation day over the last `days` days (one category, or all),
+    and how many of each day's complaints are resolved or closed by now.
+    """
+    today = today or timezone.localdate(timezone=timezone.get_default_timezone())
+    first = today - timedelta(days=days - 1)
+    rows = ComplaintStatsDaily.objects.filter(day__gte=first, day__lte=today)
+    if category is not None:
+        rows = rows.filter(category=category)
+    created = {first + timedelta(days=i): 0 for i in range(days)}
+    resolved = dict(created)
+    for day, status, n in rows.values_list('day', 'status').annotate(n=Sum('count')).order_by():
+        created[day] += n
+        if status in ('Resolved', 'Closed'):
+            resolved[day] += n
+    return {
+        'labels': [day.isoformat() for day in created],
+        'created': list(created.values()),
+        'resolved': list(resolved.values()),
+    }
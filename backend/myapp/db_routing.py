@@ -0,0 +1,97 @@
+"""
+Read replicas for the read-heavy pages.
+
+ReplicaRoutingMiddleware picks a replica (settings.REPLICA_DATABASES) for GET/HEAD requests
+to the views named in settings.REPLICA_READ_VIEWS (fnmatch patterns on URL names:
+dashboards, queries pages, analytics), and ReplicaRouter sends that request's reads of
+this app's models there. Everything else reads from the primary ('default'):
+
+  - writes, and every read of a request that isn't a listed GET;
+  - sessions, users and groups (other apps' models): small, and a user who has just
+    logged in must find their session;
+  - code running outside a request (workers, management commands, the live dashboards);
+  - for REPLICA_STICKY_SECONDS after a browser's own write (any successful POST, PUT, PATCH
+    or DELETE), so a student sees the complaint they've just submitted and staff the
+    status they've just set, however far the replica lags.
+
+Raw SQL through django.db.connection always goes to the primary.
+"""
+import fnmatch
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# the replica alias the current request reads from, None for the primary
+_read_from: ContextVar[Optional[str]] = ContextVar('replica_read_from', default=None)
+
+
+def read_database() -> str:
+    """The alias this request reads this app's models from."""
+    return _read_from.get() or DEFAULT_DB_ALIAS
+
+
+def reads_from_replica(url_name: Optional[str]) -> bool:
+    return bool(url_name) and any(fnmatch.fnmatchcase(url_name, p) for p in settings.REPLICA_READ_VIEWS)
+
+
+def _sticky(request) -> bool:
+    try:
+        until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    # bounded, so a doctored cookie can't pin a browser to the primary for longer than the window
+    return now < until <= now + settings.REPLICA_STICKY_SECONDS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_from.get()
+        if alias is not None and model._meta.app_label == 'myapp':
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same data as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema by replication
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_from.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and settings.REPLICA_DATABASES:
+            window = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, str(int(time.time()) + window), max_age=window,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = settings.REPLICA_DATABASES
+        if (
+            replicas
+            and request.method in ('GET', 'HEAD')
+            and reads_from_replica(getattr(request.resolver_match, 'url_name', None))
+            and not _sticky(request)
+        ):
+            _read_from.set(random.choice(replicas))
+        return None
@@ -0,0 +1,385 @@
+"""
+Near-duplicate detection for newly submitted complaints.
+
+A complaint's normalised title and description are cut into overlapping character
+shingles and reduced to a MinHash signature of NUM_PERM values; the share of positions
+on which two signatures agree estimates the Jaccard similarity of their shingle sets.
+Signatures are split into BANDS bands of ROWS values (locality-sensitive hashing), and
+complaints of the same category sharing any band are candidates, confirmed when their
+estimated similarity reaches settings.DUPLICATE_THRESHOLD. Only the first complaint of
+a cluster is indexed; its duplicates are recorded in ComplaintDuplicate and point to it.
+A lookup is BANDS dictionary probes plus the few cluster roots they return, however many
+complaints (or duplicates of one outage) have been seen.
+
+The index lives in each process: loaded from settings.DUPLICATE_INDEX_PATH on first use,
+caught up before each check, capped at DUPLICATE_INDEX_MAX_ENTRIES roots (oldest dropped
+first), and written back every DUPLICATE_INDEX_SAVE_EVERY new roots. A catch-up reads the
+complaints above the highest complaint_id seen plus those created in the last
+DUPLICATE_LATE_COMMIT_SECONDS that are neither indexed nor flagged, since a transaction can
+commit a lower id after a higher one has been seen. Building the index from the last
+DUPLICATE_WINDOW_DAYS is `manage.py rebuild_duplicate_index`'s job, run at deploy time; a
+process that finds no saved index starts an empty one rather than scanning the window
+inside a student's request.
+"""
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import unicodedata
+from array import array
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .complaint_io import iter_complaints
+from .models import Complaint, ComplaintDuplicate
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64  # a power of two: shingles are binned by their low bits
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_CHARS = 5
+
+_BIN_BITS = (NUM_PERM - 1).bit_length()
+_MAX_HASH = (1 << 32) - 1
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+_FILE_MAGIC = b'CDUP'
+_FILE_VERSION = 1
+_HEADER = struct.Struct('<4sHHQI')  # magic, version, NUM_PERM, high-water complaint_id, entries
+_ENTRY = struct.Struct('<QB')  # complaint_id, length of the category that follows
+
+# (cluster_id, similarity): the root a complaint duplicates and how close it is
+Match = Tuple[int, float]
+
+
+def normalise(text: str) -> str:
+    """Lower-cased, accents folded, punctuation and runs of whitespace reduced to single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def shingles(text: str) -> set:
+    text = normalise(text)
+    if len(text) <= SHINGLE_CHARS:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_CHARS] for i in range(len(text) - SHINGLE_CHARS + 1)}
+
+
+def signature(title: str, description: str) -> Optional[array]:
+    """
+    MinHash signature of a complaint (NUM_PERM unsigned 32-bit values), None for empty text.
+
+    One-permutation MinHash: each shingle is hashed once and lands in one of NUM_PERM bins by
+    its low bits, and a bin keeps its smallest hash, so the cost is one hash per shingle rather
+    than NUM_PERM. Empty bins borrow from the next non-empty one (rotation densification),
+    which keeps the agreement rate an estimate of the Jaccard similarity.
+    """
+    pieces = shingles(f'{title or ""} {description or ""}')
+    if not pieces:
+        return None
+    mins = [None] * NUM_PERM
+    for piece in pieces:
+        # blake2b rather than hash(): str hashes are salted per process, and signatures are persisted
+        h = int.from_bytes(blake2b(piece.encode(), digest_size=8).digest(), 'little')
+        slot, value = h & (NUM_PERM - 1), (h >> _BIN_BITS) & _MAX_HASH
+        if mins[slot] is None or value < mins[slot]:
+            mins[slot] = value
+    sig = array('I', [0] * NUM_PERM)
+    for slot in range(NUM_PERM):
+        distance = 0
+        while mins[(slot + distance) % NUM_PERM] is None:
+            distance += 1
+        sig[slot] = (mins[(slot + distance) % NUM_PERM] + distance * 0x9E3779B1) & _MAX_HASH
+    return sig
+
+
+def similarity(left: array, right: array) -> float:
+    """Estimated Jaccard similarity: the share of signature positions that agree."""
+    return sum(x == y for x, y in zip(left, right)) / NUM_PERM
+
+
+class DuplicateIndex:
+    """
+    LSH index of cluster roots. Not thread-safe by itself; the module-level index is used
+    behind _lock.
+    """
+
+    def __init__(self, threshold: float = 0.5, max_entries: int = 50000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.reset()
+
+    def reset(self) -> None:
+        # complaint_id -> (category, signature), oldest first
+        self.entries: Dict[int, Tuple[str, array]] = {}
+        self.buckets: Dict[Tuple[str, int, bytes], List[int]] = {}
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _keys(category: str, sig: array):
+        for band in range(BANDS):
+            yield category, band, sig[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def query(self, category: str, sig: array) -> Optional[Match]:
+        """The most similar indexed complaint of `category` at or above the threshold."""
+        candidates = set()
+        for key in self._keys(category, sig):
+            candidates.update(self.buckets.get(key, ()))
+        best: Optional[Match] = None
+        for complaint_id in sorted(candidates):
+            score = similarity(sig, self.entries[complaint_id][1])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (complaint_id, score)
+        return best
+
+    def add(self, complaint_id: int, category: str, sig: array) -> None:
+        self.entries[complaint_id] = (category, sig)
+        for key in self._keys(category, sig):
+            self.buckets.setdefault(key, []).append(complaint_id)
+        while len(self.entries) > self.max_entries:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        complaint_id = next(iter(self.entries))
+        category, sig = self.entries.pop(complaint_id)
+        for key in self._keys(category, sig):
+            bucket = self.buckets[key]
+            bucket.remove(complaint_id)
+            if not bucket:
+                del self.buckets[key]
+
+    def observe(self, complaint_id: int, category: str, title: str, description: str) -> Optional[Match]:
+        """Check a new complaint: returns its match, or indexes it as a new cluster root."""
+        self.high_water = max(self.high_water, complaint_id)
+        sig = signature(title, description)
+        if sig is None:
+            return None
+        match = self.query(category, sig)
+        if match is None:
+            self.add(complaint_id, category, sig)
+        return match
+
+    def save(self, path) -> None:
+        """Write the index to `path` atomically (a temporary file in the same directory, then a rename)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.duplicate-index-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, NUM_PERM, self.high_water, len(self.entries)))
+                for complaint_id, (category, sig) in self.entries.items():
+                    name = category.encode()
+                    out.write(_ENTRY.pack(complaint_id, len(name)))
+                    out.write(name)
+                    out.write(sig.tobytes())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def load(self, path) -> bool:
+        """Replace the contents with the index saved at `path`; False (and empty) if missing or unreadable."""
+        self.reset()
+        try:
+            with open(path, 'rb') as src:
+                data = src.read()
+        except FileNotFoundError:
+            return False
+        try:
+            magic, version, num_perm, high_water, count = _HEADER.unpack_from(data, 0)
+            if (magic, version, num_perm) != (_FILE_MAGIC, _FILE_VERSION, NUM_PERM):
+                return False
+            offset = _HEADER.size
+            sig_bytes = NUM_PERM * array('I').itemsize
+            for _ in range(count):
+                complaint_id, length = _ENTRY.unpack_from(data, offset)
+                offset += _ENTRY.size
+                category = data[offset:offset + length].decode()
+                offset += length
+                sig = array('I')
+                sig.frombytes(data[offset:offset + sig_bytes])
+                offset += sig_bytes
+                self.add(complaint_id, category, sig)
+        except (struct.error, ValueError, UnicodeDecodeError):
+            self.reset()
+            return False
+        self.high_water = high_water
+        return True
+
+
+_index = DuplicateIndex()
+_lock = threading.Lock()
+_state = {'loaded': False, 'unsaved': 0}
+
+
+def _configure() -> None:
+    _index.threshold = getattr(settings, 'DUPLICATE_THRESHOLD', 0.5)
+    _index.max_entries = getattr(settings, 'DUPLICATE_INDEX_MAX_ENTRIES', 50000)
+
+
+def _index_path() -> Optional[str]:
+    return getattr(settings, 'DUPLICATE_INDEX_PATH', None) or None
+
+
+def _window_start(now: Optional[datetime] = None) -> datetime:
+    return (now or timezone.now()) - timedelta(days=getattr(settings, 'DUPLICATE_WINDOW_DAYS', 14))
+
+
+def _load() -> None:
+    _configure()
+    path = _index_path()
+    if path is None or not _index.load(path):
+        # no saved index: start from the newest complaint instead of reading the window here
+        newest = Complaint.objects.order_by('-complaint_id').values_list('complaint_id', flat=True).first()
+        _index.high_water = newest or 0
+        logger.warning("no saved duplicate index%s; run `manage.py rebuild_duplicate_index`",
+                       f" at {path}" if path else "")
+    _state['loaded'] = True
+
+
+def _unseen_rows() -> List[Tuple[int, str, str, str]]:
+    # above the high-water mark, or recent enough to have committed after a higher id was seen
+    late = timezone.now() - timedelta(seconds=getattr(settings, 'DUPLICATE_LATE_COMMIT_SECONDS', 300))
+    queryset = (
+        Complaint.objects.filter(Q(complaint_id__gt=_index.high_water) | Q(created_at__gte=late))
+        .exclude(complaint_id__in=ComplaintDuplicate.objects.values('complaint_id'))
+    )
+    rows = iter_complaints(queryset, columns=('complaint_id', 'category', 'title', 'description'), chunk_size=2000)
+    return [row for row in rows if row[0] not in _index.entries]
+
+
+def catch_up(rows: Optional[Iterable[Tuple[int, str, str, str]]] = None) -> Dict[int, Match]:
+    """
+    Run the complaints the index has not seen yet (or `rows`) through it and record the
+    duplicates found. Complaints another process has already flagged are skipped. Returns
+    {complaint_id: (cluster_id, similarity)} of the new flags. Call with _lock held.
+    """
+    if not _state['loaded']:
+        _load()
+    if rows is None:
+        rows, flagged = _unseen_rows(), set()
+    else:
+        flagged = set(
+            ComplaintDuplicate.objects.filter(complaint_id__gt=_index.high_water).values_list('complaint_id', flat=True)
+        )
+    found: Dict[int, Tuple[Match, str]] = {}
+    roots_before = len(_index)
+    for complaint_id, category, title, description in rows:
+        if complaint_id in flagged:
+            _index.high_water = max(_index.high_water, complaint_id)
+            continue
+        match = _index.observe(complaint_id, category, title, description)
+        if match is not None:
+            found[complaint_id] = (match, category)
+    if found:
+        ComplaintDuplicate.objects.bulk_create(
+            (
+                ComplaintDuplicate(complaint_id=complaint_id, cluster_id=cluster_id, category=category,
+                                   similarity=score)
+                for complaint_id, ((cluster_id, score), category) in found.items()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,  # another process flagged it first
+        )
+    _state['unsaved'] += max(len(_index) - roots_before, 0)
+    save_every = getattr(settings, 'DUPLICATE_INDEX_SAVE_EVERY', 200)
+    if save_every and _state['unsaved'] >= save_every:
+        try:
+            save_index()
+        except OSError as exc:
+            # the in-memory index is still good; a later save (or the rebuild command) can try again
+            logger.warning("could not save the duplicate index: %s", exc)
+    return {complaint_id: match for complaint_id, (match, _) in found.items()}
+
+
+def save_index() -> Optional[str]:
+    """Persist the index to settings.DUPLICATE_INDEX_PATH (if set); returns the path written."""
+    path = _index_path()
+    if path is None:
+        return None
+    _index.save(path)
+    _state['unsaved'] = 0
+    return path
+
+
+def check_new_complaint(complaint_id: int) -> Optional[Match]:
+    """
+    Flag a just-inserted (committed) complaint if it duplicates an earlier one; returns
+    (cluster_id, similarity) or None.
+    """
+    with _lock:
+        return catch_up().get(complaint_id)
+
+
+def rebuild_index(*, since: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Start the index over from the complaints created since `since` (default: the window),
+    flagging any duplicates not flagged yet, and save it. Returns (complaints seen, roots).
+    """
+    with _lock:
+        _configure()
+        _index.reset()
+        _state['loaded'] = True
+        seen = 0
+
+        def rows():
+            nonlocal seen
+            queryset = Complaint.objects.filter(created_at__gte=since or _window_start())
+            for row in iter_complaints(queryset, columns=('complaint_id', 'category', 'title', 'description')):
+                seen += 1
+                yield row
+
+        catch_up(rows())
+        save_index()
+        return seen, len(_index)
+
+
+def reset_duplicate_index() -> None:
+    """Forget the in-memory index; the next check reloads it from disk (or starts an empty one)."""
+    with _lock:
+        _index.reset()
+        _state.update(loaded=False, unsaved=0)
+
+
+@receiver(post_delete, sender=Complaint)
+def _complaint_deleted(sender, instance, **kwargs):
+    ComplaintDuplicate.objects.filter(complaint_id=instance.pk).delete()
+
+
+def duplicate_clusters(category: str, *, days: int = 7, limit: int = 5, now: Optional[datetime] = None) -> List[dict]:
+    """
+    The largest clusters of duplicates flagged in `category` during the last `days`, for the
+    department dashboards: the first complaint of each, how many reports it has (itself
+    included) and when the latest arrived.
+    """
+    since = (now or timezone.now()) - timedelta(days=days)
+    rows = list(
+        ComplaintDuplicate.objects.filter(category=category, created_at__gte=since)
+        .values('cluster_id')
+        .annotate(duplicates=Count('id'), last_reported=Max('created_at'))
+        .order_by('-duplicates', '-last_reported')[:limit]
+    )
+    roots = Complaint.objects.in_bulk([row['cluster_id'] for row in rows]) if rows else {}
+    return [
+        {
+            'cluster_id': row['cluster_id'],
+            'complaint': roots.get(row['cluster_id']),
+            'reports': row['duplicates'] + 1,
+            'last_reported': row['last_reported'],
+        }
+        for row in rows
+    ]
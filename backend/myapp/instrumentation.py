@@ -0,0 +1,256 @@
+"""
+Per-view request instrumentation.
+
+InstrumentationMiddleware (first in MIDDLEWARE) measures every request and files it under
+its view's URL name (`dashboard_it`, `admin:index`; `<unresolved>` for 404s):
+
+  - SQL queries run and the time spent in them, on every database alias
+    (connection.execute_wrapper);
+  - time spent rendering templates (InstrumentedDjangoTemplates, the TEMPLATES backend),
+    including the queries of querysets the template evaluates;
+  - total latency, from the first middleware in to the response out.
+
+The samples go into histograms in `registry`, one per process, which the `metrics` view
+serves in the Prometheus text format at /metrics, along with the hit and miss counters of
+the ai_analyze response cache (myapp/ai/response_cache.py) and the complaints the local
+pre-classifier answered vs passed on to the LLM (myapp/ai/preclassifier.py). Each server
+process keeps its own registry: scrape every process, or run one per host.
+
+settings.VIEW_BUDGETS declares ceilings per view, e.g. {'dashboard_it': {'queries': 5}}
+(budget keys: queries, sql_ms, template_ms, total_ms). A request over its view's budget is
+logged and counted in view_budget_exceeded_total; ViewBudgetTests requests every budgeted
+view and fails when one is over, so an N+1 query shows up in CI instead of in production.
+
+For streaming responses (the CSV and XLSX exports) only the work done before the response
+is returned is measured: the rows are read while it streams.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+from myapp.ai.preclassifier import preclassifier_stats
+from myapp.ai.response_cache import cache_stats
+
+# Prometheus' default buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+UNRESOLVED = '<unresolved>'
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Timings:
+    queries: int = 0
+    sql_seconds: float = 0.0
+    template_seconds: float = 0.0
+
+
+# what the current request has spent so far, None outside an instrumented request
+_current: ContextVar[Optional[_Timings]] = ContextVar('instrumentation_timings', default=None)
+
+
+@dataclass(frozen=True)
+class RequestSample:
+    view: str
+    queries: int
+    sql_seconds: float
+    template_seconds: float
+    total_seconds: float
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus exposes them."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, observations <= le) for every bucket, +Inf last."""
+        total, out = 0, []
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            out.append(('+Inf' if bound == float('inf') else f'{bound:g}', total))
+        return out
+
+
+# name, help, bucket bounds, RequestSample field
+METRICS = (
+    ('http_request_duration_seconds', 'Request latency by view.', SECONDS_BUCKETS, 'total_seconds'),
+    ('http_request_sql_queries', 'SQL queries per request by view.', QUERY_BUCKETS, 'queries'),
+    ('http_request_sql_duration_seconds', 'Time spent in SQL per request by view.', SECONDS_BUCKETS, 'sql_seconds'),
+    ('http_request_template_duration_seconds', 'Template rendering time per request by view.',
+     SECONDS_BUCKETS, 'template_seconds'),
+)
+
+
+@dataclass
+class Registry:
+    histograms: Dict[Tuple[str, str], Histogram] = field(default_factory=dict)
+    # (view, budget key) -> requests over that budget
+    exceeded: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    # the last sample of every view, for tests and the shell
+    last: Dict[str, RequestSample] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def observe(self, sample: RequestSample, over_budget: Sequence[str] = ()) -> None:
+        with self.lock:
+            for name, _, buckets, attr in METRICS:
+                histogram = self.histograms.get((name, sample.view))
+                if histogram is None:
+                    histogram = self.histograms[(name, sample.view)] = Histogram(buckets)
+                histogram.observe(getattr(sample, attr))
+            for key in over_budget:
+                self.exceeded[(sample.view, key)] = self.exceeded.get((sample.view, key), 0) + 1
+            self.last[sample.view] = sample
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms.clear()
+            self.exceeded.clear()
+            self.last.clear()
+
+    def render(self) -> str:
+        """The registry in the Prometheus text exposition format (version 0.0.4)."""
+        with self.lock:
+            lines = []
+            for name, help_text, _, _ in METRICS:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (metric, view), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    label = f'view="{_escape(view)}"'
+                    for le, n in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{label},le="{le}"}} {n}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum:.6g}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+            lines += ['# HELP view_budget_exceeded_total Requests over their view budget (settings.VIEW_BUDGETS).',
+                      '# TYPE view_budget_exceeded_total counter']
+            for (view, key), n in sorted(self.exceeded.items()):
+                lines.append(f'view_budget_exceeded_total{{view="{_escape(view)}",budget="{key}"}} {n}')
+        ai_cache = cache_stats()
+        lines += ['# HELP ai_response_cache_requests_total ai_analyze lookups in the response cache by result.',
+                  '# TYPE ai_response_cache_requests_total counter',
+                  f'ai_response_cache_requests_total{{result="hit"}} {ai_cache["hits"]}',
+                  f'ai_response_cache_requests_total{{result="miss"}} {ai_cache["misses"]}',
+                  '# HELP ai_response_cache_entries Answers held in the response cache.',
+                  '# TYPE ai_response_cache_entries gauge',
+                  f'ai_response_cache_entries {ai_cache["entries"]}']
+        routed = preclassifier_stats()
+        lines += ['# HELP ai_preclassifier_requests_total Complaints the local pre-classifier answered (local) '
+                  'or passed on to the LLM (llm).',
+                  '# TYPE ai_preclassifier_requests_total counter',
+                  f'ai_preclassifier_requests_total{{route="local"}} {routed["local"]}',
+                  f'ai_preclassifier_requests_total{{route="llm"}} {routed["llm"]}',
+                  '# HELP ai_preclassifier_seconds Time spent by the local pre-classifier.',
+                  '# TYPE ai_preclassifier_seconds summary',
+                  f'ai_preclassifier_seconds_sum {routed["seconds"]}',
+                  f'ai_preclassifier_seconds_count {routed["local"] + routed["llm"]}']
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def over_budget(sample: RequestSample) -> List[str]:
+    """The budget keys of settings.VIEW_BUDGETS[sample.view] the sample exceeds."""
+    budget = settings.VIEW_BUDGETS.get(sample.view, {})
+    spent = {
+        'queries': sample.queries,
+        'sql_ms': sample.sql_seconds * 1000,
+        'template_ms': sample.template_seconds * 1000,
+        'total_ms': sample.total_seconds * 1000,
+    }
+    return [key for key, limit in budget.items() if spent[key] > limit]
+
+
+def _count_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.sql_seconds += time.perf_counter() - started
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every render for the current request's sample."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_count_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        match = request.resolver_match
+        sample = RequestSample(
+            view=(match.view_name if match else None) or UNRESOLVED,
+            queries=timings.queries,
+            sql_seconds=timings.sql_seconds,
+            template_seconds=timings.template_seconds,
+            total_seconds=time.perf_counter() - started,
+        )
+        exceeded = over_budget(sample)
+        if exceeded:
+            # info, not warning: a user's first page after logging in also resolves their roles and student
+            logger.info("%s over its budget (%s): %s", sample.view, ', '.join(exceeded), sample)
+        registry.observe(sample, exceeded)
+        return response
@@ -0,0 +1,396 @@
+"""
+Live department dashboards over WebSockets.
+
+backend/asgi.py sends WebSocket connections to `websocket_application`. A dashboard
+connects to /ws/dashboard/<department>/ once its page has loaded and receives JSON messages:
+
+  {"type": "stats", "total": n, "by_status": {...}, "by_priority": {...}}
+      the department's counters as of the connection (sent once, first)
+  {"type": "complaint.created", "complaint": {...}}
+      a new complaint in the department's category
+  {"type": "complaint.updated", "complaint_id": id, "status": s, "priority": p}
+      a complaint of the category moved to another status or priority
+  {"type": "stats.changed", "total": d, "by_status": {...}, "by_priority": {...}}
+      counter deltas (new, re-prioritised, moved on or deleted complaints); only non-zero entries
+
+?since=<complaint_id> replays the category's complaints created after the page was rendered;
+the connection drops the broadcaster's copies of the rows it replayed.
+
+One Broadcaster per server process polls the database every LIVE_POLL_INTERVAL seconds while
+anyone is connected: complaints above the last complaint_id it has seen, the ComplaintChange
+entries above the last one it has seen (written with every status or priority change, see
+stats_rollup.log_changes), and the stats rollup totals (myapp/stats_rollup.py). For both logs it
+also rereads the ids of the rows from the last LIVE_LATE_COMMIT_SECONDS, since a transaction
+can commit a lower id after a higher one was published. It fans the differences out through
+the channel layer to every subscribed dashboard. That is five small queries per interval per
+process, however many dashboards are open, and it picks up writes made by any process,
+imports included.
+"""
+import asyncio
+import itertools
+import json
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http.request import split_domain_port, validate_host
+from django.utils import timezone
+
+from .models import Complaint, ComplaintChange, ComplaintStatsTotal
+from .roles import QUERIES_CATEGORY
+
+PATH_PREFIX = '/ws/dashboard/'
+COMPLAINT_FIELDS = ('complaint_id', 'student_id', 'title', 'category', 'priority', 'status', 'created_at')
+CHANGE_FIELDS = ('complaint_id', 'category', 'status', 'priority', 'changed_at')
+# the change log is only read a few seconds back; the poller drops older entries now and then
+CHANGE_LOG_RETENTION = timedelta(hours=1)
+CHANGE_LOG_PRUNE_EVERY = 600
+
+# close codes (4000-4999 are for applications): the client reloads on OVERFLOW and gives up on FORBIDDEN
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+CLOSE_OVERFLOW = 4008
+
+_OVERFLOW = object()
+
+logger = logging.getLogger(__name__)
+
+
+def group_name(category: str) -> str:
+    return f'complaints.{category}'
+
+
+class InMemoryChannelLayer:
+    """
+    Groups of channels, each channel a bounded queue: the part of a Django Channels layer the
+    dashboards need, for a single process (tests, one-worker deployments). A channel that falls
+    `capacity` messages behind is marked overflowed instead of growing without bound.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.groups: Dict[str, Set[str]] = {}
+        self.channels: Dict[str, asyncio.Queue] = {}
+        self.overflowed: Set[str] = set()
+        self._names = itertools.count(1)
+
+    def new_channel(self) -> str:
+        name = f'dashboard.{next(self._names)}'
+        self.channels[name] = asyncio.Queue(self.capacity)
+        return name
+
+    def group_add(self, group: str, channel: str) -> None:
+        self.groups.setdefault(group, set()).add(channel)
+
+    def group_discard(self, group: str, channel: str) -> None:
+        members = self.groups.get(group)
+        if members is not None:
+            members.discard(channel)
+            if not members:
+                del self.groups[group]
+        self.channels.pop(channel, None)
+        self.overflowed.discard(channel)
+
+    def group_send(self, group: str, message: dict) -> int:
+        """Queue `message` for every channel of `group`; returns how many got it."""
+        delivered = 0
+        for channel in self.groups.get(group, ()):
+            queue = self.channels.get(channel)
+            if queue is None or channel in self.overflowed:
+                continue
+            if queue.qsize() >= self.capacity - 1:
+                # the last slot is for the overflow marker: the consumer gets it after what was queued
+                self.overflowed.add(channel)
+                queue.put_nowait(_OVERFLOW)
+                continue
+            queue.put_nowait(message)
+            delivered += 1
+        return delivered
+
+    async def receive(self, channel: str):
+        return await self.channels[channel].get()
+
+
+def _stats(totals: Dict[Tuple[str, str, str], int], category: str) -> Dict[str, object]:
+    by_status: Counter = Counter({value: 0 for value, _ in Complaint.STATUS_CHOICES})
+    by_priority: Counter = Counter({value: 0 for value, _ in Complaint.PRIORITY_CHOICES})
+    for (c, status, priority), n in totals.items():
+        if c == category:
+            by_status[status] += n
+            by_priority[priority] += n
+    return {'total': sum(by_status.values()), 'by_status': dict(by_status), 'by_priority': dict(by_priority)}
+
+
+def stats_changes(
+    old: Dict[Tuple[str, str, str], int], new: Dict[Tuple[str, str, str], int],
+) -> Dict[str, Dict[str, object]]:
+    """Per category, the non-zero differences between two snapshots of the rollup totals."""
+    changes: Dict[str, Dict[str, object]] = {}
+    for key in old.keys() | new.keys():
+        delta = new.get(key, 0) - old.get(key, 0)
+        if not delta:
+            continue
+        category, status, priority = key
+        change = changes.setdefault(category, {'total': 0, 'by_status': Counter(), 'by_priority': Counter()})
+        change['total'] += delta
+        change['by_status'][status] += delta
+        change['by_priority'][priority] += delta
+    for change in changes.values():
+        for name in ('by_status', 'by_priority'):
+            change[name] = {k: v for k, v in change[name].items() if v}
+    return changes
+
+
+def _totals() -> Dict[Tuple[str, str, str], int]:
+    rows = ComplaintStatsTotal.objects.values_list('category', 'status', 'priority', 'count')
+    return {(c, s, p): n for c, s, p, n in rows}
+
+
+def _new_complaints(after: int, limit: int, category: Optional[str] = None) -> List[dict]:
+    queryset = Complaint.objects.filter(complaint_id__gt=after)
+    if category is not None:
+        queryset = queryset.filter(category=category)
+    return list(queryset.order_by('complaint_id').values(*COMPLAINT_FIELDS)[:limit])
+
+
+class _Feed:
+    """
+    Rows of a table read in primary-key order, including those that commit after a higher key
+    was read: keys at or below the high-water mark whose `time_field` falls in the late-commit
+    window and that were not read yet.
+    """
+
+    def __init__(self, model, time_field: str, fields: Tuple[str, ...]):
+        self.model = model
+        self.time_field = time_field
+        self.fields = fields
+        self.high_water = 0
+        # pk -> time_field of the rows read inside the late-commit window
+        self.recent: Dict[int, datetime] = {}
+
+    def start(self, since: datetime) -> None:
+        last = self.model.objects.order_by('-pk').values_list('pk', flat=True).first()
+        recent = self.model.objects.filter(**{f'{self.time_field}__gte': since})
+        self.high_water, self.recent = last or 0, dict(recent.values_list('pk', self.time_field))
+
+    def read(self, since: datetime, limit: int) -> List[dict]:
+        recent = self.model.objects.filter(pk__lte=self.high_water, **{f'{self.time_field}__gte': since})
+        late = [pk for pk in recent.values_list('pk', flat=True) if pk not in self.recent]
+        rows = Q(pk__gt=self.high_water) | Q(pk__in=late) if late else Q(pk__gt=self.high_water)
+        return list(self.model.objects.filter(rows).order_by('pk').values('pk', *self.fields)[:limit])
+
+    def seen(self, row: dict) -> None:
+        self.high_water = max(self.high_water, row['pk'])
+        self.recent[row['pk']] = row[self.time_field]
+
+    def forget(self, before: datetime) -> None:
+        self.recent = {pk: at for pk, at in self.recent.items() if at >= before}
+
+
+class Broadcaster:
+    """
+    Polls for new complaints, status changes and counter changes while at least one dashboard
+    is subscribed, and publishes them to the per-category groups of the channel layer.
+    """
+
+    def __init__(self, layer: InMemoryChannelLayer, interval: float = 1.0, batch_size: int = 200,
+                 late_commit_seconds: float = 30.0):
+        self.layer = layer
+        self.interval = interval
+        self.batch_size = batch_size
+        self.late_commit = timedelta(seconds=late_commit_seconds)
+        self.subscribers = 0
+        self.complaints = _Feed(Complaint, 'created_at', COMPLAINT_FIELDS)
+        self.changes = _Feed(ComplaintChange, 'changed_at', CHANGE_FIELDS)
+        self.totals: Dict[Tuple[str, str, str], int] = {}
+        self.polls = 0
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+
+    def _snapshot(self) -> Dict[Tuple[str, str, str], int]:
+        close_old_connections()
+        since = timezone.now() - self.late_commit
+        self.complaints.start(since)
+        self.changes.start(since)
+        return _totals()
+
+    def _poll(self) -> Tuple[List[dict], List[dict], Dict[Tuple[str, str, str], int]]:
+        # a long-lived task, not a request: let Django drop connections past CONN_MAX_AGE or broken ones
+        close_old_connections()
+        now = timezone.now()
+        if self.polls % CHANGE_LOG_PRUNE_EVERY == 0:
+            # only this poller reads the log, and only its last few seconds
+            ComplaintChange.objects.filter(changed_at__lt=now - CHANGE_LOG_RETENTION).delete()
+        since = now - self.late_commit
+        return self.complaints.read(since, self.batch_size), self.changes.read(since, self.batch_size), _totals()
+
+    async def subscribe(self, category: str, channel: str) -> Dict[str, object]:
+        """Join `category`'s group; returns its current counters (once the first snapshot is in)."""
+        self.layer.group_add(group_name(category), channel)
+        self.subscribers += 1
+        if self._task is None or self._task.done():
+            self._ready = asyncio.get_running_loop().create_future()
+            self._task = asyncio.ensure_future(self._run())
+        await asyncio.shield(self._ready)
+        return _stats(self.totals, category)
+
+    def unsubscribe(self, category: str, channel: str) -> None:
+        self.layer.group_discard(group_name(category), channel)
+        self.subscribers -= 1
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        try:
+            self.totals = await sync_to_async(self._snapshot)()
+        except Exception as exc:
+            self._ready.set_exception(exc)
+            return
+        self._ready.set_result(None)
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                rows, changes, totals = await sync_to_async(self._poll)()
+            except Exception:
+                # a database hiccup: dashboards go stale for an interval, they don't lose their socket
+                logger.exception("live dashboard poll failed")
+                continue
+            self.polls += 1
+            self.publish(rows, totals, changes)
+
+    def publish(self, rows: Iterable[dict], totals: Dict[Tuple[str, str, str], int],
+                changes: Iterable[dict] = ()) -> None:
+        for row in rows:
+            self.complaints.seen(row)
+            complaint = {name: row[name] for name in COMPLAINT_FIELDS}
+            self.layer.group_send(group_name(row['category']), {'type': 'complaint.created', 'complaint': complaint})
+        for change in changes:
+            self.changes.seen(change)
+            self.layer.group_send(group_name(change['category']), {
+                'type': 'complaint.updated', 'complaint_id': change['complaint_id'],
+                'status': change['status'], 'priority': change['priority'],
+            })
+        for category, change in stats_changes(self.totals, totals).items():
+            self.layer.group_send(group_name(category), {'type': 'stats.changed', **change})
+        self.totals = totals
+        before = timezone.now() - self.late_commit
+        self.complaints.forget(before)
+        self.changes.forget(before)
+
+
+channel_layer = InMemoryChannelLayer(getattr(settings, 'LIVE_QUEUE_SIZE', 100))
+broadcaster = Broadcaster(channel_layer, getattr(settings, 'LIVE_POLL_INTERVAL', 1.0),
+                          late_commit_seconds=getattr(settings, 'LIVE_LATE_COMMIT_SECONDS', 30.0))
+
+
+def _headers(scope) -> Dict[str, str]:
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def _origin_allowed(headers: Dict[str, str]) -> bool:
+    # browsers send Origin on WebSocket handshakes and do not apply the same-origin policy to them,
+    # so check it like CSRF would: another site must not open a socket with our session cookie
+    origin = headers.get('origin')
+    if origin is None:
+        return True  # not a browser
+    host = origin.split('://', 1)[-1]
+    domain, _ = split_domain_port(host)
+    allowed = settings.ALLOWED_HOSTS or (['.localhost', '127.0.0.1', '[::1]'] if settings.DEBUG else [])
+    return bool(domain) and validate_host(domain, allowed)
+
+
+def _has_access(headers: Dict[str, str], department: str) -> bool:
+    """The session cookie's user may open `department`'s dashboard (the same rule as require_department)."""
+    from http.cookies import SimpleCookie
+    from importlib import import_module
+
+    from django.contrib.auth import get_user
+    from django.http import HttpRequest
+
+    from .roles import has_department_access
+
+    close_old_connections()
+    cookies = SimpleCookie()
+    cookies.load(headers.get('cookie', ''))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return False
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    request.user = get_user(request)
+    allowed = request.user.is_authenticated and has_department_access(request, department)
+    if request.session.modified:
+        request.session.save()  # has_department_access caches the roles in the session
+    return allowed
+
+
+def _dumps(message: dict) -> str:
+    return json.dumps(message, cls=DjangoJSONEncoder)
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for the /ws/dashboard/<department>/ endpoint."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    path = scope.get('path', '')
+    department = path[len(PATH_PREFIX):].strip('/') if path.startswith(PATH_PREFIX) else None
+    category = QUERIES_CATEGORY.get(department)
+    if category is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    headers = _headers(scope)
+    if not _origin_allowed(headers) or not await sync_to_async(_has_access)(headers, department):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+    await send({'type': 'websocket.accept'})
+
+    channel = channel_layer.new_channel()
+    try:
+        stats = await broadcaster.subscribe(category, channel)
+        await send({'type': 'websocket.send', 'text': _dumps({'type': 'stats', **stats})})
+        since = parse_qs(scope.get('query_string', b'').decode()).get('since', [''])[0]
+        replayed: Set[int] = set()
+        if since.isdigit():
+            # what was created since the page was rendered; the broadcaster may queue some of it too
+            limit = getattr(settings, 'LIVE_REPLAY_LIMIT', 50)
+            missed = await sync_to_async(_new_complaints)(int(since), limit, category)
+            for row in missed:
+                replayed.add(row['complaint_id'])
+                await send({'type': 'websocket.send', 'text': _dumps({'type': 'complaint.created', 'complaint': row})})
+        await _pump(receive, send, channel, replayed)
+    finally:
+        broadcaster.unsubscribe(category, channel)
+
+
+async def _pump(receive, send, channel: str, replayed: Set[int]) -> None:
+    # forward the channel to the socket until the client goes away, minus the rows in `replayed`
+    # (already sent); client messages are ignored
+    incoming = asyncio.ensure_future(receive())
+    outgoing = asyncio.ensure_future(channel_layer.receive(channel))
+    try:
+        while True:
+            done, _ = await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+            if incoming in done:
+                if incoming.result()['type'] == 'websocket.disconnect':
+                    return
+                incoming = asyncio.ensure_future(receive())
+            if outgoing in done:
+                message = outgoing.result()
+                if message is _OVERFLOW:
+                    await send({'type': 'websocket.close', 'code': CLOSE_OVERFLOW})
+                    return
+                if message['type'] != 'complaint.created' or message['complaint']['complaint_id'] not in replayed:
+                    await send({'type': 'websocket.send', 'text': _dumps(message)})
+                outgoing = asyncio.ensure_future(channel_layer.receive(channel))
+    finally:
+        incoming.cancel()
+        outgoing.cancel()
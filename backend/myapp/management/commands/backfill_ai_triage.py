@@ -0,0 +1,105 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.ai.batch import BatchUsage, ai_agent_batch
+from myapp.models import Complaint, ComplaintTriage
+from myapp.triage import complaint_text, save_triage
+
+
+class Command(BaseCommand):
+    help = (
+        "Classify historical complaints that have no AI triage yet. Results are appended to a "
+        "JSONL checkpoint as they arrive, so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint', default='ai_triage_backfill.jsonl')
+        parser.add_argument('--chunk-size', type=int, default=200, help="complaints read and saved per round")
+        parser.add_argument('--pack-size', type=int, default=5, help="short complaints per LLM request")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--rpm', type=float, default=None, help="request-per-minute ceiling")
+        parser.add_argument('--limit', type=int, default=None, help="stop after this many complaints")
+        parser.add_argument('--model', default='gpt-4o-mini')
+
+    def handle(self, *args, **opts):
+        done = self._replay_checkpoint(opts['checkpoint'])
+        usage = BatchUsage()
+        processed = failed = 0
+        started = time.perf_counter()
+        last_id = 0
+
+        with open(opts['checkpoint'], 'a', encoding='utf-8') as checkpoint:
+            while opts['limit'] is None or processed < opts['limit']:
+                size = opts['chunk_size'] if opts['limit'] is None else min(opts['chunk_size'], opts['limit'] - processed)
+                chunk = list(
+                    Complaint.objects.filter(complaint_id__gt=last_id)
+                    .exclude(complaint_id__in=ComplaintTriage.objects.values('complaint_id'))
+                    .order_by('complaint_id')
+                    .only('complaint_id', 'title', 'description')[:size]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1].complaint_id
+                chunk = [c for c in chunk if c.complaint_id not in done]
+                if not chunk:
+                    continue
+
+                def _on_result(i, result, chunk=chunk):
+                    nonlocal failed
+                    if 'error' in result:
+                        failed += 1  # not checkpointed, so the next run retries it
+                        return
+                    checkpoint.write(json.dumps({'complaint_id': chunk[i].complaint_id, 'result': result}, ensure_ascii=False) + '\n')
+                    checkpoint.flush()
+
+                results = ai_agent_batch(
+                    [complaint_text(c) for c in chunk],
+                    model=opts['model'], pack_size=opts['pack_size'], concurrency=opts['concurrency'],
+                    rpm=opts['rpm'], usage=usage, on_result=_on_result,
+                )
+                os.fsync(checkpoint.fileno())
+                for complaint, result in zip(chunk, results):
+                    if 'error' not in result:
+                        save_triage(complaint.complaint_id, result)
+                processed += len(chunk)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{processed} complaints ({failed} failed) in {elapsed:.1f}s "
+                    f"= {processed / elapsed:.2f}/s; {usage.requests} requests, "
+                    f"{usage.total_tokens} tokens, {usage.rate_limited} rate-limited"
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"done: {processed} complaints in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.2f}/s), "
+            f"{failed} failed; tokens prompt={usage.prompt_tokens} completion={usage.completion_tokens}"
+        ))
+
+    def _replay_checkpoint(self, path):
+        """Save results that reached the checkpoint but not the database before a crash."""
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path, 'rb+') as raw:
+            raw.seek(0, os.SEEK_END)
+            if raw.tell():
+                raw.seek(-1, os.SEEK_END)
+                if raw.read(1) != b'\n':
+                    raw.write(b'\n')  # don't glue the next entry onto a torn line
+        stored = set(ComplaintTriage.objects.values_list('complaint_id', flat=True))
+        with open(path, encoding='utf-8') as checkpoint:
+            for line in checkpoint:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-write
+                done.add(entry['complaint_id'])
+                if entry['complaint_id'] not in stored:
+                    save_triage(entry['complaint_id'], entry['result'])
+        if done:
+            self.stdout.write(f"resuming: {len(done)} complaints already in {path}")
+        return done
@@ -0,0 +1,141 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.ai.complaint_agent import (
+    _CMD_LINE_RE, _INLINE_BT_RE, _INLINE_CMD_PATTERNS, _TRIPLE_BLOCK_RE, _extract_commands_list, _lines,
+)
+from myapp.models import ComplaintTriage
+
+# solution.code values in the shapes the agent actually returns
+SAMPLES = [
+    "",
+    "pip install requests",
+    "```bash\npython -m venv .venv\nsource .venv/bin/activate\npip install -r requirements.txt\n```",
+    "Run `pip install numpy` and then `python -m pytest -q` to check.",
+    "```python\nimport requests\nprint(requests.__version__)\n```\nIf that fails: `pip3 install requests`",
+    "$ git clone https://github.com/example/repo.git\n$ cd repo\n$ npm install\n$ npm run dev",
+    "sudo apt-get install python3-venv\nthen run python3 -m venv env",
+    "```powershell\npowershell -ExecutionPolicy Bypass -File setup.ps1\ncmd /c dir\nset PATH=%PATH%;C:\\Python311\n```",
+    "conda create -n ml python=3.11\nconda activate ml\nconda install pytorch -c pytorch",
+    "curl -I https://api.example.com/health\nwget https://example.com/file.zip\nbrew install wget",
+    "yarn add axios\npnpm install\nnpx create-react-app demo\nexport NODE_ENV=production",
+    "Check the version with `python --version`; if it is old, `brew install python@3.12`.",
+    "```\n$ pip install django\n$ python manage.py migrate\n```\n```sql\nSELECT * FROM complaints;\n```",
+]
+
+_TOKENS = [
+    "pip", "pip3", "install", "python", "python3", "-m", "pytest", "git", "clone", "pull", "checkout", "conda",
+    "create", "env", "npm", "i", "yarn", "add", "pnpm", "sudo", "apt", "apt-get", "brew", "curl", "wget",
+    "powershell", "-Command", "cmd", "/c", "$", "`", "```", "```bash", "\n", " ", "  ", "\t", "requests",
+    "https://x.y/z", "the", "then", "run", "set", "PATH=1", "export", "cd", "..", ".", ";", "PIP", "Sudo",
+    # characters re.IGNORECASE folds onto ASCII letters, and plain non-ASCII text
+    "\u017fudo", "p\u0130p", "p\u0131p", "\u212a", "\u062b\u0628\u062a",
+]
+_PROSE = "please check that your environment is configured correctly before trying again "
+
+
+def _legacy_extract_commands_list(code_raw):
+    """The previous four-scan implementation, kept as the reference for equivalence."""
+    if not code_raw:
+        return []
+    candidates = []
+
+    for block in _TRIPLE_BLOCK_RE.findall(code_raw):
+        for ln in _lines(block):
+            s = ln.strip()
+            if not s:
+                continue
+            if s.startswith("$"):
+                s = s[1:].strip()
+            if _CMD_LINE_RE.match(s):
+                candidates.append(s)
+
+    for inline in _INLINE_BT_RE.findall(code_raw):
+        s = inline.strip()
+        if s.startswith("$"):
+            s = s[1:].strip()
+        if _CMD_LINE_RE.match(s) or any(p.search(s) for p in _INLINE_CMD_PATTERNS):
+            candidates.append(s)
+
+    for patt in _INLINE_CMD_PATTERNS:
+        for m in patt.findall(code_raw):
+            s = m.strip()
+            if s.startswith("$"):
+                s = s[1:].strip()
+            candidates.append(s)
+
+    for ln in _lines(code_raw):
+        s = ln.strip()
+        if s.startswith("$"):
+            s = s[1:].strip()
+        if _CMD_LINE_RE.match(s):
+            candidates.append(s)
+
+    seen = set(); dedup = []
+    for c in candidates:
+        if c not in seen:
+            seen.add(c); dedup.append(c)
+    return dedup
+
+
+def _random_code(rng, n_tokens, prose=0.0):
+    """Random token soup; with `prose`, that share of tokens is filler so keywords are sparse."""
+    return "".join(
+        (_PROSE if rng.random() < prose else rng.choice(_TOKENS)) + rng.choice(["", " ", " ", "\n"])
+        for _ in range(n_tokens)
+    )
+
+
+def _pathological(size):
+    """~`size` bytes each: one huge fenced block, one huge line, and a wall of inline backticks."""
+    lines = [random.Random(i).choice(SAMPLES[1:]) for i in range(size // 40)]
+    block = "```bash\n" + "\n".join(lines)[:size] + "\n```"
+    one_line = ("pip install pkg " * (size // 16))[:size]
+    backticks = ("see `pip install x` and `git pull origin main` then " * (size // 50))[:size]
+    return [block, one_line, backticks]
+
+
+class Command(BaseCommand):
+    help = "Check _extract_commands_list against the previous implementation and time both."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fuzz', type=int, default=2000, help="random inputs checked for identical output")
+        parser.add_argument('--big', type=int, default=100_000, help="size in bytes of the pathological inputs")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(12)
+        stored = [
+            ((raw or {}).get('solution') or {}).get('code') or ''
+            for raw in ComplaintTriage.objects.values_list('raw', flat=True)[:5000]
+        ]
+        corpus = SAMPLES + [c for c in stored if c]
+        fuzz = [_random_code(rng, rng.randint(1, 80), prose=rng.choice([0.0, 0.9])) for _ in range(opts['fuzz'])]
+        big = _pathological(opts['big'])
+
+        mismatches = [c for c in corpus + fuzz + big if _extract_commands_list(c) != _legacy_extract_commands_list(c)]
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} inputs differ, first: {mismatches[0][:200]!r}")
+        self.stdout.write(self.style.SUCCESS(
+            f"identical output on {len(corpus)} agent outputs ({len(stored)} stored), {len(fuzz)} fuzzed, {len(big)} x {opts['big']} B"
+        ))
+
+        for label, inputs in (('agent outputs', corpus), ('pathological', big)):
+            legacy = self._time(_legacy_extract_commands_list, inputs, opts['repeat'])
+            current = self._time(_extract_commands_list, inputs, opts['repeat'])
+            self.stdout.write(
+                f"{label:<14} legacy={legacy * 1000:.2f}ms current={current * 1000:.2f}ms "
+                f"speed-up={legacy / current if current else 0:.1f}x"
+            )
+
+    @staticmethod
+    def _time(fn, inputs, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for text in inputs:
+                fn(text)
+            best = min(best, time.perf_counter() - started)
+        return best
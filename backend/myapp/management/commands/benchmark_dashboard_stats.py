@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from myapp.dashboard_stats import compute_dashboard_stats, get_dashboard_stats
+from myapp.models import Complaint
+from myapp.stats_rollup import record_created
+
+
+def _legacy_counts(category):
+    # what every dashboard view did before: three separate COUNT(*) round trips
+    complaints = Complaint.objects.filter(category=category)
+    return (
+        complaints.filter(status='Open').count(),
+        complaints.filter(status='In Progress').count(),
+        complaints.filter(status='Resolved').count(),
+    )
+
+
+def _aggregated_counts(category):
+    stats = compute_dashboard_stats(category)
+    return stats.pending, stats.in_progress, stats.resolved
+
+
+def _rollup_counts(category):
+    stats = get_dashboard_stats(category)
+    return stats.pending, stats.in_progress, stats.resolved
+
+
+class Command(BaseCommand):
+    help = "Compare query count and latency of the dashboard counters: per-status COUNTs, one aggregate, the stats rollup."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', default='IT_Support')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0,
+                            help="insert N synthetic complaints first (rolled back when the run ends)")
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            if opts['seed']:
+                self._seed(opts['seed'], opts['batch_size'])
+            self._run('legacy', _legacy_counts, opts)
+            self._run('aggregated', _aggregated_counts, opts)
+            self._run('rollup', _rollup_counts, opts)
+            # never keep the synthetic rows
+            transaction.set_rollback(True)
+
+    def _seed(self, n, batch_size):
+        categories = [c for c, _ in Complaint.CATEGORY_CHOICES]
+        statuses = [s for s, _ in Complaint.STATUS_CHOICES]
+        priorities = [p for p, _ in Complaint.PRIORITY_CHOICES]
+        now = timezone.now()
+        started = time.perf_counter()
+        for offset in range(0, n, batch_size):
+            batch = Complaint.objects.bulk_create([
+                Complaint(
+                    student_id=random.randint(1, 50000),
+                    title=f'benchmark complaint {offset + i}',
+                    description='seeded by benchmark_dashboard_stats',
+                    category=random.choice(categories),
+                    priority=random.choice(priorities),
+                    status=random.choice(statuses),
+                    created_at=now - timedelta(minutes=offset + i),
+                )
+                for i in range(min(batch_size, n - offset))
+            ])
+            # bulk_create sends no signals
+            record_created((c.category, c.status, c.priority, c.created_at) for c in batch)
+        self.stdout.write(f"seeded {n} complaints in {time.perf_counter() - started:.1f}s")
+
+    def _run(self, label, fn, opts):
+        timings = []
+        with CaptureQueriesContext(connection) as ctx:
+            result = fn(opts['category'])
+        queries = len(ctx.captured_queries)
+        for _ in range(opts['repeat']):
+            started = time.perf_counter()
+            fn(opts['category'])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f"{label:<11} queries={queries} "
+            f"median={timings[len(timings) // 2]:.2f}ms max={timings[-1]:.2f}ms "
+            f"counts(open, in progress, resolved)={result}"
+        )
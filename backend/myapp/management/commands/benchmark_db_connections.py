@@ -0,0 +1,131 @@
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+from backend.db_pool import get_pool
+from myapp.models import Complaint, ComplaintStatsTotal
+
+PLAIN_ENGINES = {
+    'backend.db_pool.mysql': 'django.db.backends.mysql',
+    'backend.db_pool.sqlite3': 'django.db.backends.sqlite3',
+}
+POOLED_ENGINES = {plain: pooled for pooled, plain in PLAIN_ENGINES.items()}
+MODES = ('connect', 'persistent', 'pool')
+
+
+def _dashboard_queries(category):
+    # what a department dashboard reads: its counters from the rollup and the newest complaints
+    querysets = [
+        ComplaintStatsTotal.objects.filter(category=category).values_list('status', 'priority', 'count'),
+        Complaint.objects.filter(category=category).order_by('-created_at', '-complaint_id')
+        .values_list('complaint_id', 'title', 'status', 'created_at')[:25],
+    ]
+    return [qs.query.sql_with_params() for qs in querysets]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay simulated dashboard requests on N threads with a new connection per request, "
+        "per-thread persistent connections (CONN_MAX_AGE) and the connection pool (backend/db_pool), "
+        "and compare request latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--pool-size', type=int, default=None, help="default: --threads")
+        parser.add_argument('--category', default='IT_Support')
+        parser.add_argument('--asgi', action='store_true',
+                            help="every request gets fresh connection state, as under ASGI, instead of its thread's")
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+
+    def handle(self, *args, **opts):
+        base = copy.deepcopy(connections.settings[opts['database']])
+        engine = PLAIN_ENGINES.get(base['ENGINE'], base['ENGINE'])
+        if engine not in POOLED_ENGINES:
+            raise CommandError(f"no pooled backend for {engine}")
+        queries = _dashboard_queries(opts['category'])
+        self.stdout.write(
+            f"{opts['requests']} requests on {opts['threads']} threads against {engine} "
+            f"({'ASGI' if opts['asgi'] else 'WSGI'}-style connection state)"
+        )
+        self.stdout.write(f"{'mode':>10} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'connects':>9}")
+        for mode in opts['modes']:
+            settings_dict = {**base, 'ENGINE': engine, 'CONN_MAX_AGE': 0}
+            if mode == 'persistent':
+                settings_dict['CONN_MAX_AGE'] = 600
+            elif mode == 'pool':
+                settings_dict['ENGINE'] = POOLED_ENGINES[engine]
+                settings_dict['POOL'] = {**base.get('POOL', {}), 'SIZE': opts['pool_size'] or opts['threads']}
+            self._report(mode, *self._run(mode, settings_dict, queries, opts))
+
+    def _run(self, mode, settings_dict, queries, opts):
+        backend = load_backend(settings_dict['ENGINE'])
+        alias = f'benchmark-{mode}'
+        local = threading.local()
+        wrappers = []
+        wrappers_lock = threading.Lock()
+
+        def new_wrapper():
+            wrapper = backend.DatabaseWrapper(copy.deepcopy(settings_dict), alias)
+            with wrappers_lock:
+                wrappers.append(wrapper)
+            return wrapper
+
+        def request(_):
+            if opts['asgi']:
+                wrapper = new_wrapper()
+            else:
+                wrapper = getattr(local, 'wrapper', None) or new_wrapper()
+                local.wrapper = wrapper
+            started = time.perf_counter()
+            wrapper.close_if_unusable_or_obsolete()  # request_started
+            with wrapper.cursor() as cursor:
+                for sql, params in queries:
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+            wrapper.close_if_unusable_or_obsolete()  # request_finished
+            elapsed = time.perf_counter() - started
+            if opts['asgi']:
+                wrapper.inc_thread_sharing()  # the next request's thread may be another one
+            return elapsed
+
+        connect_count = []
+        original_connect = backend.DatabaseWrapper.get_new_connection
+
+        def counting_connect(wrapper, params):
+            connect_count.append(1)
+            return original_connect(wrapper, params)
+
+        started = time.perf_counter()
+        backend.DatabaseWrapper.get_new_connection = counting_connect
+        try:
+            with ThreadPoolExecutor(opts['threads']) as executor:
+                latencies = sorted(executor.map(request, range(opts['requests'])))
+        finally:
+            backend.DatabaseWrapper.get_new_connection = original_connect
+            elapsed = time.perf_counter() - started
+            for wrapper in wrappers:
+                wrapper.inc_thread_sharing()
+                wrapper.close()
+        connects = len(connect_count)
+        if mode == 'pool':
+            pool = get_pool(alias, settings_dict)
+            connects = pool.connects  # connections actually opened, not taken from the pool
+            pool.close_idle()
+        return latencies, elapsed, connects
+
+    def _report(self, mode, latencies, elapsed, connects):
+        def ms(q):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+
+        self.stdout.write(
+            f"{mode:>10} {len(latencies) / elapsed:>8.0f} {ms(0.5):>8.3f} {ms(0.9):>8.3f} {ms(0.99):>8.3f} "
+            f"{latencies[-1] * 1000:>8.3f} {connects:>9}"
+        )
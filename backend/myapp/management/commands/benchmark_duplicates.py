@@ -0,0 +1,145 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.complaint_io import peak_rss_mib
+from myapp.duplicates import DuplicateIndex
+from myapp.models import Complaint
+
+# what a few hundred students type when the same thing breaks: one story per outage, filed under a real category
+OUTAGES = [
+    ('IT_Support', "WiFi not working in hostel block {b}",
+     "The WiFi in hostel block {b} has been down since {t}. Nobody on floor {f} can connect to the network."),
+    ('IT_Support', "Campus portal login fails",
+     "Every time I try to log in to the student portal it says invalid session and sends me back to the login page."),
+    ('Facilities_Logistics', "No water supply in block {b}",
+     "There has been no water in the bathrooms of block {b} since {t}, floor {f} taps are completely dry."),
+    ('Facilities_Logistics', "Power cut in block {b}",
+     "The electricity went off in block {b} at {t}. Lights and fans on floor {f} are not working."),
+    ('Facilities_Logistics', "Mess food is cold",
+     "Dinner served in the mess today was cold again and several students on floor {f} felt sick afterwards."),
+]
+PREFIXES = ['', '', 'Hi, ', 'Urgent: ', 'Please help! ', 'Dear sir, ']
+SUFFIXES = ['', '', ' Please fix asap.', ' Thanks.', ' This is really urgent.', ' Kindly look into it.']
+TIMES = ['morning', 'yesterday', 'last night', '9am', 'the afternoon']
+
+# distinct complaints: a subject plus a sentence of random pseudo-words, so any two share little text
+SUBJECTS = ['projector', 'fan', 'door lock', 'library card', 'bus pass', 'laptop charger', 'printer', 'bed frame',
+            'window', 'fee receipt', 'id card', 'lab computer', 'exam form', 'scholarship', 'locker', 'ceiling light']
+SYLLABLES = ['ka', 'lo', 'mi', 'ten', 'ra', 'su', 've', 'dor', 'pa', 'ni', 'gu', 'bel', 'tra', 'os', 'fi', 'zen']
+
+
+def _typos(text, rng, rate):
+    chars = list(text)
+    for i in range(len(chars) - 1):
+        roll = rng.random()
+        if roll < rate / 2:
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        elif roll < rate:
+            chars[i] = ''
+    return ''.join(chars)
+
+
+def _burst_complaint(rng, outage, typo_rate):
+    category, title, description = OUTAGES[outage]
+    fill = {'b': rng.choice('ABCD'), 'f': rng.randint(1, 5), 't': rng.choice(TIMES)}
+    title, description = title.format(**fill), description.format(**fill)
+    if rng.random() < 0.5:
+        title = title.lower() if rng.random() < 0.5 else title.upper()
+    description = rng.choice(PREFIXES) + _typos(description, rng, typo_rate) + rng.choice(SUFFIXES)
+    return category, title, description
+
+
+def _distinct_complaint(rng, vocabulary):
+    subject = rng.choice(SUBJECTS)
+    words = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(8, 20)))
+    category = rng.choice([value for value, _ in Complaint.CATEGORY_CHOICES])
+    return category, f"Problem with the {subject}", f"The {subject} {words}."
+
+
+class Command(BaseCommand):
+    help = (
+        "Feed a burst of near-identical complaints (outages) mixed with distinct ones through the "
+        "near-duplicate index: latency per complaint, precision/recall, index size, save/load time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', type=int, default=50000, help="near-identical complaints, spread over the outages")
+        parser.add_argument('--distinct', type=int, default=10000, help="unrelated complaints mixed in")
+        parser.add_argument('--threshold', type=float, default=0.5)
+        parser.add_argument('--typo-rate', type=float, default=0.02, help="chance of a typo per character")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts['seed'])
+        vocabulary = [''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(5000)]
+        stream = [('burst', i % len(OUTAGES)) for i in range(opts['burst'])]
+        stream += [('distinct', None)] * opts['distinct']
+        rng.shuffle(stream)
+
+        index = DuplicateIndex(threshold=opts['threshold'], max_entries=max(len(stream), 1))
+        outage_of_root = {}
+        outages_seen = set()
+        latencies = []
+        true_pos = false_pos = missed = 0
+        started = time.perf_counter()
+        for complaint_id, (kind, outage) in enumerate(stream, start=1):
+            if kind == 'burst':
+                category, title, description = _burst_complaint(rng, outage, opts['typo_rate'])
+            else:
+                category, title, description = _distinct_complaint(rng, vocabulary)
+            t0 = time.perf_counter()
+            match = index.observe(complaint_id, category, title, description)
+            latencies.append(time.perf_counter() - t0)
+            if match is None:
+                outage_of_root[complaint_id] = outage
+                if kind == 'burst':
+                    missed += outage in outages_seen  # a second root for an outage already indexed
+                    outages_seen.add(outage)
+            elif kind == 'burst' and outage_of_root.get(match[0]) == outage:
+                true_pos += 1
+            else:
+                false_pos += 1
+        elapsed = time.perf_counter() - started
+
+        def ms(seconds):
+            return f"{seconds * 1000:.3f} ms"
+
+        ordered = sorted(latencies)
+        tenth = max(len(latencies) // 10, 1)
+        self.stdout.write(f"{len(stream)} complaints ({opts['burst']} in {len(OUTAGES)} outages, "
+                          f"{opts['distinct']} distinct) in {elapsed:.1f}s, {len(stream) / elapsed:.0f}/s")
+        self.stdout.write(
+            f"latency p50 {ms(ordered[len(ordered) // 2])}, p99 {ms(ordered[int(len(ordered) * 0.99)])}, "
+            f"max {ms(ordered[-1])}; mean of first/last 10%: "
+            f"{ms(statistics.mean(latencies[:tenth]))} / {ms(statistics.mean(latencies[-tenth:]))}"
+        )
+        flagged = true_pos + false_pos
+        burst_roots = sum(1 for outage in outage_of_root.values() if outage is not None)
+        self.stdout.write(
+            f"flagged {flagged}: precision {true_pos / flagged if flagged else 1:.4f}, "
+            f"recall {true_pos / max(opts['burst'] - len(OUTAGES), 1):.4f} "
+            f"({burst_roots} roots for {len(OUTAGES)} outages, {missed} of them extra), "
+            f"{false_pos} false positives"
+        )
+        largest = max((len(ids) for ids in index.buckets.values()), default=0)
+        self.stdout.write(f"index: {len(index)} roots, {len(index.buckets)} buckets, largest bucket {largest}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'duplicate-index.bin')
+            t0 = time.perf_counter()
+            index.save(path)
+            saved = time.perf_counter() - t0
+            size = os.path.getsize(path)
+            t0 = time.perf_counter()
+            restored = DuplicateIndex(threshold=opts['threshold'], max_entries=index.max_entries)
+            restored.load(path)
+            loaded = time.perf_counter() - t0
+        self.stdout.write(f"saved {size / 1024:.0f} KiB in {ms(saved)}, loaded {len(restored)} roots in {ms(loaded)}")
+        peak = peak_rss_mib()
+        if peak is not None:
+            self.stdout.write(f"peak RSS {peak:.0f} MiB")
@@ -0,0 +1,63 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+\d+\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# python -c bodies run from the project directory with the current settings module
+_SETUP = "import django; django.setup(); "
+SCENARIOS = [
+    ("manage.py check", ["manage.py", "check"]),
+    ("worker cold start", ["-c", _SETUP + "import myapp.urls, myapp.management.commands.run_triage_worker"]),
+    ("eager AI import (old behaviour)", ["-c", _SETUP + "import myapp.urls; from myapp.ai.complaint_agent import get_client; get_client()"]),
+]
+
+
+def _top_level_imports(stderr):
+    """Cumulative microseconds per top-level package from `python -X importtime` output."""
+    totals = {}
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m and len(m.group(2)) == 1:  # one space of indent = imported by the program itself
+            package = m.group(3).split('.')[0]
+            totals[package] = totals.get(package, 0) + int(m.group(1))
+    return totals
+
+
+class Command(BaseCommand):
+    help = "Measure process start-up cost (wall clock and `python -X importtime`) for common entry points."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=5, help="heaviest top-level imports to list")
+
+    def handle(self, *args, **opts):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'))
+        # a dummy key so the eager scenario can build its client without a real one
+        env.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+        for label, argv in SCENARIOS:
+            walls, imports = [], {}
+            for _ in range(opts['repeat']):
+                started = time.perf_counter()
+                proc = subprocess.run(
+                    [sys.executable, '-X', 'importtime', *argv],
+                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+                )
+                walls.append((time.perf_counter() - started) * 1000)
+                if proc.returncode != 0:
+                    self.stderr.write(f"{label}: exited with {proc.returncode}\n{proc.stderr[-2000:]}")
+                    break
+                imports = _top_level_imports(proc.stderr)
+            walls.sort()
+            heaviest = sorted(imports.items(), key=lambda kv: kv[1], reverse=True)[:opts['top']]
+            self.stdout.write(
+                f"{label:<32} median={walls[len(walls) // 2]:.0f}ms "
+                f"imports={sum(imports.values()) / 1000:.0f}ms "
+                f"openai loaded={'yes' if 'openai' in imports else 'no'}"
+            )
+            self.stdout.write("    " + ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in heaviest))
@@ -0,0 +1,87 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.ai.complaint_agent import _StepIndex, _tokens
+
+_VERBS = ["install", "check", "update", "configure", "restart", "verify", "upgrade", "remove", "open", "set"]
+_NOUNS = ["version", "package", "environment", "path", "server", "driver", "cache", "kernel", "config", "port"]
+
+
+def _legacy_best_step_idx_for_cmd(cmd, steps_texts):
+    """The previous scorer (re-tokenises every step per command), kept as the reference."""
+    ctoks = set(_tokens(cmd))
+    if not ctoks:
+        return None
+    best_i, best_score = None, 0.0
+    for i, step in enumerate(steps_texts):
+        stoks = set(_tokens(step))
+        if not stoks:
+            continue
+        inter = len(ctoks & stoks)
+        score = inter / max(1, min(len(ctoks), len(stoks)))
+        if ("version" in ctoks and "version" in stoks) or ("install" in ctoks and "install" in stoks):
+            score += 0.25
+        if score > best_score:
+            best_i, best_score = i, score
+    return best_i if (best_i is not None and best_score >= 0.25) else None
+
+
+def _workload(rng, n_steps, n_commands):
+    """Steps and commands over a vocabulary that grows with the step count, as distinct steps do."""
+    vocab = [f"pkg{i}" for i in range(4 * n_steps)]
+    steps = [
+        f"{rng.choice(_VERBS)} the {rng.choice(vocab)} {rng.choice(_NOUNS)} and {rng.choice(vocab)}"
+        for _ in range(n_steps)
+    ]
+    commands = [
+        f"{rng.choice(['pip install', 'apt-get install', 'python -m', 'git pull'])} {rng.choice(vocab)} {rng.choice(vocab)}"
+        for _ in range(n_commands)
+    ]
+    return steps, commands
+
+
+class Command(BaseCommand):
+    help = "Check for_frontend's indexed step matching against the previous scorer and time both."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--steps', type=int, nargs='+', default=[6, 60, 600, 6000])
+        parser.add_argument('--commands', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--legacy-limit', type=int, default=200_000,
+                            help="skip the legacy timing above this many step x command scorings")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(13)
+        self.stdout.write(
+            f"{'steps':>6} {'commands':>8} {'legacy us/cmd':>14} {'build us/step':>14} "
+            f"{'query us/cmd':>13} {'steps visited/cmd':>18}"
+        )
+        for n_steps in opts['steps']:
+            for n_commands in opts['commands']:
+                steps, commands = _workload(rng, n_steps, n_commands)
+
+                started = time.perf_counter()
+                index = _StepIndex(steps)
+                build_us = (time.perf_counter() - started) / n_steps * 1e6
+                started = time.perf_counter()
+                indexed = [index.best_step(cmd) for cmd in commands]
+                query_us = (time.perf_counter() - started) / n_commands * 1e6
+                visited = sum(
+                    len({i for tok in set(_tokens(cmd)) for i in index.postings.get(tok, ())}) for cmd in commands
+                ) / n_commands
+
+                legacy_us = None
+                if n_steps * n_commands <= opts['legacy_limit']:
+                    started = time.perf_counter()
+                    legacy = [_legacy_best_step_idx_for_cmd(cmd, steps) for cmd in commands]
+                    legacy_us = (time.perf_counter() - started) / n_commands * 1e6
+                    if legacy != indexed:
+                        raise CommandError(f"results differ for {n_steps} steps x {n_commands} commands")
+
+                legacy_col = f"{legacy_us:.1f}" if legacy_us is not None else "skipped"
+                self.stdout.write(
+                    f"{n_steps:>6} {n_commands:>8} {legacy_col:>14} {build_us:>14.1f} "
+                    f"{query_us:>13.1f} {visited:>18.1f}"
+                )
+        self.stdout.write(self.style.SUCCESS("indexed results identical wherever the legacy scorer ran"))
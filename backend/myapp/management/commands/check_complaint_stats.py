@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.stats_rollup import compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the complaint stats rollup against a full aggregation of the complaints table. "
+        "Exits non-zero when they differ, so it can run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show', type=int, default=20, help="mismatching buckets to print")
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        mismatches = compare()
+        elapsed = time.perf_counter() - started
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f"rollup matches the complaints table ({elapsed:.1f}s)"))
+            return
+        for table, key, expected, actual in mismatches[:opts['show']]:
+            self.stderr.write(f"{table:<6} {' / '.join(map(str, key))}: expected {expected}, rollup has {actual}")
+        if len(mismatches) > opts['show']:
+            self.stderr.write(f"... and {len(mismatches) - opts['show']} more")
+        raise CommandError(
+            f"{len(mismatches)} rollup buckets differ from the complaints table; "
+            f"run manage.py rebuild_complaint_stats to recompute them"
+        )
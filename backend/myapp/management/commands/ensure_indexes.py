@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, models
+from django.utils import timezone
+
+from myapp.models import Complaint, Student
+from myapp.search import FULLTEXT_INDEX_NAME
+
+# MySQL only: Django can't declare FULLTEXT indexes in Meta.indexes (see myapp/search.py)
+FULLTEXT_COLUMNS = ('title', 'description')
+
+
+def _sample_queries():
+    # the hot queries each planned index exists for, used for the EXPLAIN report
+    return {
+        'complaints_cat_created_idx': Complaint.objects.filter(category='IT_Support').order_by('-created_at', '-complaint_id')[:25],
+        'complaints_cat_status_idx': Complaint.objects.filter(category='IT_Support', status='Open'),
+        'complaints_student_created_idx': Complaint.objects.filter(student_id=1).order_by('-created_at', '-complaint_id')[:25],
+        'complaints_created_idx': Complaint.objects.filter(created_at__gte=timezone.now() - timedelta(days=7)).order_by('complaint_id')[:500],
+        'students_email_uniq': Student.objects.filter(email='student@example.com'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the indexes declared in Meta.indexes / Meta.constraints on the unmanaged "
+        "complaints and students tables, plus the FULLTEXT index search uses on MySQL, "
+        "after adding any model columns those tables lack. Safe to run on every deploy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="only report missing columns and indexes")
+        parser.add_argument('--explain', action='store_true', help="print EXPLAIN output for the queries behind missing indexes")
+
+    def handle(self, *args, **opts):
+        # columns first: the model (and so every query) already selects them
+        for model in (Complaint, Student):
+            self._ensure_columns(model, opts['dry_run'])
+        samples = _sample_queries()
+        missing = []
+        for model in (Complaint, Student):
+            existing = self._existing_column_sets(model)
+            planned = list(model._meta.indexes) + list(model._meta.constraints)
+            for item in planned:
+                columns = tuple(model._meta.get_field(f).column for f in item.fields)
+                if (columns, self._is_unique(item)) in existing:
+                    self.stdout.write(f"ok       {model._meta.db_table}.{item.name} {columns}")
+                    continue
+                self.stdout.write(self.style.WARNING(f"missing  {model._meta.db_table}.{item.name} {columns}"))
+                if opts['explain'] and item.name in samples:
+                    self.stdout.write(samples[item.name].explain())
+                missing.append((model, item))
+        fulltext_missing = self._check_fulltext()
+
+        if opts['dry_run'] or not (missing or fulltext_missing):
+            return
+
+        failed = []
+        for model, item in missing:
+            try:
+                with connection.schema_editor() as editor:
+                    if self._is_unique(item):
+                        editor.add_constraint(model, item)
+                    else:
+                        editor.add_index(model, item)
+            except DatabaseError as exc:
+                # e.g. duplicate students.email values block the unique index; keep going with the rest
+                self.stderr.write(f"failed   {model._meta.db_table}.{item.name}: {exc}")
+                failed.append(item.name)
+                continue
+            self.stdout.write(self.style.SUCCESS(f"created  {model._meta.db_table}.{item.name}"))
+        if fulltext_missing:
+            table, qn = Complaint._meta.db_table, connection.ops.quote_name
+            columns = ', '.join(qn(c) for c in FULLTEXT_COLUMNS)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"CREATE FULLTEXT INDEX {qn(FULLTEXT_INDEX_NAME)} ON {qn(table)} ({columns})")
+            except DatabaseError as exc:
+                self.stderr.write(f"failed   {table}.{FULLTEXT_INDEX_NAME}: {exc}")
+                failed.append(FULLTEXT_INDEX_NAME)
+            else:
+                self.stdout.write(self.style.SUCCESS(f"created  {table}.{FULLTEXT_INDEX_NAME}"))
+        if failed:
+            raise CommandError(f"could not create: {', '.join(failed)}")
+
+    def _ensure_columns(self, model, dry_run):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            existing = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+        for field in model._meta.local_concrete_fields:
+            if field.column in existing:
+                continue
+            self.stdout.write(self.style.WARNING(f"missing  {table}.{field.column} (column)"))
+            if dry_run:
+                continue
+            # e.g. complaints.version: NOT NULL with a database default, so raw SQL inserts keep working
+            with connection.schema_editor() as editor:
+                editor.add_field(model, field)
+            self.stdout.write(self.style.SUCCESS(f"created  {table}.{field.column}"))
+
+    def _check_fulltext(self):
+        """Report the search FULLTEXT index; True if it should be created (MySQL only)."""
+        if connection.vendor != 'mysql':
+            return False
+        table = Complaint._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        for info in constraints.values():
+            if info.get('type') == 'fulltext' and tuple(info.get('columns') or ()) == FULLTEXT_COLUMNS:
+                self.stdout.write(f"ok       {table}.{FULLTEXT_INDEX_NAME} {FULLTEXT_COLUMNS}")
+                return False
+        self.stdout.write(self.style.WARNING(f"missing  {table}.{FULLTEXT_INDEX_NAME} {FULLTEXT_COLUMNS} (FULLTEXT)"))
+        return True
+
+    @staticmethod
+    def _is_unique(item):
+        return isinstance(item, models.UniqueConstraint)
+
+    @staticmethod
+    def _existing_column_sets(model):
+        # match on columns rather than names so an equivalent index created by hand counts
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        found = set()
+        for info in constraints.values():
+            if info.get('primary_key') or not info.get('columns'):
+                continue
+            columns = tuple(info['columns'])
+            if info.get('unique'):
+                found.add((columns, True))
+            if info.get('index') or info.get('unique'):
+                found.add((columns, False))
+        return found
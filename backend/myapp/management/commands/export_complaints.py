@@ -0,0 +1,52 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.complaint_io import (
+    FORMATS, export_lines, filter_complaints, format_for_path, iter_complaints, peak_rss_mib,
+)
+from myapp.models import Complaint
+
+
+class Command(BaseCommand):
+    help = "Stream complaints to a CSV or JSONL file (or stdout), a chunk at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="file to write, or - for stdout")
+        parser.add_argument('--format', choices=FORMATS, help="default: from the file extension, else csv")
+        parser.add_argument('--category', action='append', choices=[c for c, _ in Complaint.CATEGORY_CHOICES])
+        parser.add_argument('--status', action='append', choices=[s for s, _ in Complaint.STATUS_CHOICES])
+        parser.add_argument('--since', help="created on/after this ISO date or datetime")
+        parser.add_argument('--until', help="created before this datetime, or on/before this date")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="rows fetched per query")
+
+    def handle(self, *args, **opts):
+        fmt = opts['format'] or format_for_path(opts['output'])
+        try:
+            queryset = filter_complaints(
+                Complaint.objects.all(), categories=opts['category'], statuses=opts['status'],
+                since=opts['since'], until=opts['until'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        started = time.perf_counter()
+        rows = 0
+        out = sys.stdout if opts['output'] == '-' else open(opts['output'], 'w', encoding='utf-8', newline='')
+        try:
+            for line in export_lines(iter_complaints(queryset, chunk_size=opts['chunk_size']), fmt):
+                out.write(line)
+                rows += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if fmt == 'csv':
+            rows -= 1  # header
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mib()
+        self.stderr.write(
+            f"exported {rows} complaints as {fmt} in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"
+            + (f", peak RSS {peak:.0f} MiB" if peak is not None else "")
+        )
+
@@ -0,0 +1,62 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.complaint_io import FORMATS, RowError, format_for_path, import_rows, peak_rss_mib, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream complaints from a CSV or JSONL file (or stdin) into the complaints table, "
+        "validated against Complaint's choices and inserted in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="file to read, or - for stdin")
+        parser.add_argument('--format', choices=FORMATS, help="default: from the file extension, else csv")
+        parser.add_argument('--batch-size', type=int, default=1000, help="rows per INSERT batch and transaction")
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help="report and skip invalid rows instead of stopping at the first one")
+        parser.add_argument('--dry-run', action='store_true', help="validate only, insert nothing")
+        parser.add_argument('--progress-every', type=int, default=100_000, help="rows between progress lines")
+
+    def handle(self, *args, **opts):
+        fmt = opts['format'] or format_for_path(opts['input'])
+        started = time.perf_counter()
+        next_report = opts['progress_every']
+
+        def _progress(result):
+            nonlocal next_report
+            done = result.imported + result.skipped
+            if opts['progress_every'] and done >= next_report:
+                next_report += opts['progress_every']
+                elapsed = time.perf_counter() - started
+                self.stderr.write(f"{done} rows in {elapsed:.1f}s ({done / elapsed:.0f} rows/s)")
+
+        source = sys.stdin if opts['input'] == '-' else open(opts['input'], encoding='utf-8-sig', newline='')
+        try:
+            result = import_rows(
+                read_rows(source, fmt), batch_size=opts['batch_size'], skip_invalid=opts['skip_invalid'],
+                dry_run=opts['dry_run'], on_batch=_progress,
+            )
+        except RowError as err:
+            raise CommandError(f"{err} (batches before this line were committed; fix it and re-run from there, "
+                               f"or use --skip-invalid)")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        for err in result.errors:
+            self.stderr.write(f"skipped {err}")
+        if result.skipped > len(result.errors):
+            self.stderr.write(f"... and {result.skipped - len(result.errors)} more invalid rows")
+
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mib()
+        verb = 'validated' if opts['dry_run'] else 'imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.imported} complaints, skipped {result.skipped}, in {elapsed:.1f}s "
+            f"({result.imported / elapsed if elapsed else 0:.0f} rows/s)"
+            + (f", peak RSS {peak:.0f} MiB" if peak is not None else "")
+        ))
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from myapp.ai.fake_openai import running_fake_openai
+from myapp.ai.response_cache import clear_cache
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire N concurrent ai_analyze requests at a local fake OpenAI server and measure "
+        "dashboard latency while they are in flight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="concurrent AI requests")
+        parser.add_argument('--delay', type=float, default=3.0, help="fake LLM latency in seconds")
+        parser.add_argument('--samples', type=int, default=30, help="dashboard requests per phase")
+        parser.add_argument('--username', help="staff user used for the dashboard (default: first superuser)")
+        parser.add_argument('--dashboard', default='dashboard_it')
+
+    def handle(self, *args, **opts):
+        if opts['username']:
+            user = User.objects.filter(username=opts['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("no user to open the dashboard with; pass --username")
+
+        setup_test_environment()
+        previous_base_url = os.environ.get('OPENAI_BASE_URL')
+        try:
+            with running_fake_openai(delay=opts['delay']) as (base_url, fake):
+                os.environ['OPENAI_BASE_URL'] = base_url
+                clear_cache()
+                asyncio.run(self._run(user, opts))
+                self.stdout.write(f"fake OpenAI server answered {fake.requests} requests")
+        finally:
+            if previous_base_url is None:
+                os.environ.pop('OPENAI_BASE_URL', None)
+            else:
+                os.environ['OPENAI_BASE_URL'] = previous_base_url
+            teardown_test_environment()
+
+    async def _dashboard_latencies(self, client, url, samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            response = await client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+        return timings
+
+    async def _ai_request(self, client, url, i):
+        started = time.perf_counter()
+        response = await client.post(url, {'text': f'pip install fails in my venv (load test #{i})'}, content_type='application/json')
+        return response.status_code, time.perf_counter() - started
+
+    async def _run(self, user, opts):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        dashboard_url = reverse(opts['dashboard'])
+        ai_url = reverse('student_ai_analyze')
+
+        idle = await self._dashboard_latencies(client, dashboard_url, opts['samples'])
+
+        ai_tasks = [asyncio.create_task(self._ai_request(client, ai_url, i)) for i in range(opts['requests'])]
+        await asyncio.sleep(min(0.5, opts['delay'] / 4))  # let the AI requests reach the fake server
+        loaded = await self._dashboard_latencies(client, dashboard_url, opts['samples'])
+        in_flight = sum(not t.done() for t in ai_tasks)
+        results = await asyncio.gather(*ai_tasks)
+
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        ai_times = [elapsed for _, elapsed in results]
+
+        self.stdout.write(f"dashboard idle:    p50={_percentile(idle, 50):.1f}ms p95={_percentile(idle, 95):.1f}ms")
+        self.stdout.write(
+            f"dashboard loaded:  p50={_percentile(loaded, 50):.1f}ms p95={_percentile(loaded, 95):.1f}ms "
+            f"({in_flight} AI requests still in flight after sampling)"
+        )
+        self.stdout.write(
+            f"ai_analyze:        {len(results)} requests, statuses={statuses}, "
+            f"p50={_percentile(ai_times, 50):.2f}s max={max(ai_times):.2f}s"
+        )
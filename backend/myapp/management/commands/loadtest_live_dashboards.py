@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+from importlib import import_module
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapp import live
+from myapp.complaint_io import peak_rss_mib
+from myapp.models import Complaint
+from myapp.roles import QUERIES_CATEGORY
+
+# what one full reload of a department dashboard costs: session + user, counters, duplicate
+# clusters, complaint list (RoleResolutionTests.test_dashboard_query_count_is_bounded)
+QUERIES_PER_RELOAD = 5
+
+
+class DashboardConnection:
+    """One WebSocket client talking to an ASGI application in-process, no server or network in between."""
+
+    def __init__(self, application, path, cookie='', query_string='', headers=()):
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        headers = [(b'cookie', cookie)] * bool(cookie) + list(headers)
+        scope = {
+            'type': 'websocket',
+            'path': path,
+            'query_string': query_string.encode(),
+            'headers': [(name, value.encode()) for name, value in headers],
+        }
+        self.task = asyncio.ensure_future(application(scope, self.inbox.get, self._send))
+
+    async def _send(self, message):
+        await self.outbox.put((time.perf_counter(), message))
+
+    async def connect(self, timeout=10):
+        """The accept (or close) message the application answered the handshake with."""
+        await self.inbox.put({'type': 'websocket.connect'})
+        return (await asyncio.wait_for(self.outbox.get(), timeout))[1]
+
+    async def receive(self, timeout=10):
+        """(arrival time, message) of the next message; text frames are decoded from JSON."""
+        arrived, message = await asyncio.wait_for(self.outbox.get(), timeout)
+        if message['type'] == 'websocket.send':
+            message = json.loads(message['text'])
+        return arrived, message
+
+    async def disconnect(self):
+        await self.inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 10)
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else float('nan')
+
+
+class Command(BaseCommand):
+    help = (
+        "Open N live dashboards in-process, insert complaints into their department and measure how "
+        "fast the changes reach every dashboard, against what reloading the page on a timer would cost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--department', default='it', choices=sorted(QUERIES_CATEGORY))
+        parser.add_argument('--complaints', type=int, default=20, help="complaints inserted while they listen")
+        parser.add_argument('--spacing', type=float, default=0.25, help="seconds between inserts")
+        parser.add_argument('--interval', type=float, default=settings.LIVE_POLL_INTERVAL,
+                            help="broadcaster poll interval (LIVE_POLL_INTERVAL)")
+        parser.add_argument('--reload-every', type=float, default=30.0,
+                            help="refresh period of the page-reloading dashboards compared against")
+
+    def handle(self, *args, **opts):
+        if opts['clients'] < 1 or opts['complaints'] < 1:
+            raise CommandError("--clients and --complaints must be at least 1")
+        user, cookie = self._staff_session(opts['department'])
+        created = []
+        try:
+            async_to_sync(self._run)(opts, cookie, created)
+        finally:
+            # ORM deletes, so the stats rollup takes them back out
+            for complaint in Complaint.objects.filter(pk__in=created):
+                complaint.delete()
+            user.delete()
+
+    def _staff_session(self, department):
+        username = 'loadtest-live@example.invalid'
+        User.objects.filter(username=username).delete()
+        user = User.objects.create_user(username=username, email=username)
+        user.groups.add(Group.objects.get_or_create(name=department)[0])
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return user, f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    async def _run(self, opts, cookie, created):
+        live.broadcaster.interval = opts['interval']
+        category = QUERIES_CATEGORY[opts['department']]
+        path = f"{live.PATH_PREFIX}{opts['department']}/"
+        clients = opts['clients']
+
+        started = time.perf_counter()
+        connections = [DashboardConnection(live.websocket_application, path, cookie) for _ in range(clients)]
+
+        async def open_one(connection):
+            t0 = time.perf_counter()
+            accepted = await connection.connect()
+            if accepted['type'] != 'websocket.accept':
+                raise CommandError(f"dashboard refused: {accepted}")
+            await connection.receive()  # the counters
+            return time.perf_counter() - t0
+
+        connect_times = sorted(await asyncio.gather(*map(open_one, connections)))
+        opened = time.perf_counter() - started
+        polls_before = live.broadcaster.polls
+
+        inserted_at = {}
+        arrivals = [[] for _ in connections]
+        expected = opts['complaints']
+
+        async def listen(i, connection):
+            # until every complaint and its +1 on the counters have arrived
+            rows = counted = 0
+            while rows < expected or counted < expected:
+                arrived, message = await connection.receive(timeout=opts['interval'] * 5 + opts['spacing'] * expected + 10)
+                arrivals[i].append((arrived, message))
+                rows += message['type'] == 'complaint.created'
+                counted += message['total'] if message['type'] == 'stats.changed' else 0
+
+        listeners = [asyncio.ensure_future(listen(i, c)) for i, c in enumerate(connections)]
+        insert_started = time.perf_counter()
+        for n in range(expected):
+            complaint = await sync_to_async(Complaint.objects.create)(
+                student_id=0, title=f'live dashboard load test {n}', description='load test',
+                category=category, priority='Medium', status='Open', created_at=timezone.now(),
+            )
+            created.append(complaint.pk)
+            inserted_at[complaint.pk] = time.perf_counter()
+            await asyncio.sleep(opts['spacing'])
+        results = await asyncio.gather(*listeners, return_exceptions=True)
+        window = time.perf_counter() - insert_started
+        polls = live.broadcaster.polls - polls_before
+
+        latencies, delivered, stats_messages = [], 0, 0
+        for messages in arrivals:
+            for arrived, message in messages:
+                if message['type'] == 'complaint.created':
+                    delivered += 1
+                    latencies.append(arrived - inserted_at[message['complaint']['complaint_id']])
+                elif message['type'] == 'stats.changed':
+                    stats_messages += 1
+        latencies.sort()
+        timeouts = sum(1 for r in results if isinstance(r, Exception))
+        await asyncio.gather(*(c.disconnect() for c in connections))
+
+        def ms(seconds):
+            return f"{seconds * 1000:.1f} ms"
+
+        self.stdout.write(f"{clients} dashboards opened together in {opened:.2f}s: connect p50 {ms(_percentile(connect_times, 0.5))}, "
+                          f"p99 {ms(_percentile(connect_times, 0.99))}, max {ms(connect_times[-1])}")
+        self.stdout.write(
+            f"{expected} complaints -> {delivered}/{clients * expected} deliveries, {stats_messages} counter updates, "
+            f"{timeouts} dashboards timed out"
+        )
+        self.stdout.write(
+            f"insert -> dashboard p50 {ms(_percentile(latencies, 0.5))}, p99 {ms(_percentile(latencies, 0.99))}, "
+            f"max {ms(latencies[-1]) if latencies else '-'} (poll interval {ms(opts['interval'])})"
+        )
+        reloading = clients * QUERIES_PER_RELOAD * window / opts['reload_every']
+        self.stdout.write(
+            f"over {window:.1f}s: {polls} polls = {polls * 2} queries; {clients} dashboards reloading every "
+            f"{opts['reload_every']:g}s would run {reloading:.0f} queries and be {opts['reload_every'] / 2:g}s stale on average"
+        )
+        peak = peak_rss_mib()
+        if peak is not None:
+            self.stdout.write(f"peak RSS {peak:.0f} MiB")
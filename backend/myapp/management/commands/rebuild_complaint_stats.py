@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.stats_rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the complaint stats rollup (ComplaintStatsDaily / ComplaintStatsTotal) from the "
+        "complaints table, e.g. after rows were written with raw SQL that didn't record them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="rollup rows per INSERT")
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        buckets = rebuild(batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"rebuilt {buckets} daily buckets in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from myapp import triage
+
+
+def _run_in_thread(job, lease, max_attempts):
+    try:
+        return triage.run_job(job, lease, max_attempts=max_attempts)
+    finally:
+        # worker threads each hold their own DB connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Run the AI triage worker: classify newly submitted complaints off the request path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="concurrent agent calls")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="seconds to sleep when the queue is empty")
+        parser.add_argument('--visibility-timeout', type=int, default=120,
+                            help="seconds before a running job whose worker vanished is retried")
+        parser.add_argument('--max-attempts', type=int, default=triage.DEFAULT_MAX_ATTEMPTS)
+        parser.add_argument('--once', action='store_true', help="drain what is due now, then exit")
+
+    def handle(self, *args, **opts):
+        visibility = timedelta(seconds=opts['visibility_timeout'])
+        in_flight = set()
+        counts = {}
+        with ThreadPoolExecutor(max_workers=opts['threads'], thread_name_prefix='triage') as pool:
+            try:
+                while True:
+                    close_old_connections()
+                    triage.enqueue_new_complaints()
+                    free = opts['threads'] - len(in_flight)
+                    claimed = triage.claim_jobs(free, visibility, opts['max_attempts']) if free else []
+                    for job, lease in claimed:
+                        in_flight.add(pool.submit(_run_in_thread, job, lease, opts['max_attempts']))
+
+                    if not in_flight:
+                        if opts['once']:
+                            break
+                        time.sleep(opts['poll_interval'])
+                        continue
+
+                    done, in_flight = wait(in_flight, timeout=opts['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            status = future.result() or 'lease lost'
+                        except Exception as exc:
+                            # not the agent (its errors are recorded by run_job): the job stays 'running' until
+                            # its visibility timeout passes, then is retried or, out of attempts, failed
+                            self.stderr.write(f"triage job crashed: {exc!r}")
+                            status = 'crashed'
+                        counts[status] = counts.get(status, 0) + 1
+            except KeyboardInterrupt:
+                self.stdout.write("stopping; waiting for in-flight jobs")
+                wait(in_flight)
+        self.stdout.write(f"triage worker finished: {counts}")
@@ -0,0 +1,79 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.complaint_io import parse_bound, peak_rss_mib
+from myapp.models import Complaint
+from myapp.sla_analytics import backlog_report, default_window, resolution_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolution-time percentiles and SLA breaches of complaints resolved in a window, "
+        "and the age histogram of the current backlog, per category and priority."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="resolved on/after this ISO date or datetime (default: 30 days ago)")
+        parser.add_argument('--until', help="resolved before this datetime, or on/before this date (default: now)")
+        parser.add_argument('--category', action='append', choices=[c for c, _ in Complaint.CATEGORY_CHOICES])
+        parser.add_argument('--accuracy', type=float, default=0.01, help="relative accuracy of the percentiles")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="rows fetched per query")
+        parser.add_argument('--json', action='store_true', help="print both reports as JSON")
+
+    def handle(self, *args, **opts):
+        since, until = default_window()
+        try:
+            if opts['since']:
+                since = parse_bound(opts['since'])
+            if opts['until']:
+                until = parse_bound(opts['until'], end=True)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        started = time.perf_counter()
+        resolution = resolution_report(
+            since, until, categories=opts['category'], chunk_size=opts['chunk_size'],
+            relative_accuracy=opts['accuracy'],
+        )
+        backlog = backlog_report(categories=opts['category'])
+        elapsed = time.perf_counter() - started
+        if opts['json']:
+            self.stdout.write(json.dumps({'resolution': resolution, 'backlog': backlog}, indent=2))
+            return
+
+        self.stdout.write(f"Resolution time, resolved {resolution['since']} .. {resolution['until']} "
+                          f"(percentiles within {resolution['relative_accuracy']:.0%})")
+        self.stdout.write(f"{'category':<24} {'priority':<9} {'count':>8} {'p50 h':>8} {'p90 h':>8} "
+                          f"{'p99 h':>8} {'SLA h':>6} {'breaches':>9}")
+        sla = resolution['sla_hours']
+        for row in resolution['groups']:
+            self._resolution_line(row['category'], row['priority'], row, sla.get(row['priority']))
+        for category, row in resolution['by_category'].items():
+            self._resolution_line(category, 'all', row, None)
+        self._resolution_line('all', 'all', resolution['overall'], None)
+        if resolution['skipped']:
+            self.stderr.write(f"skipped {resolution['skipped']} complaints resolved before they were created")
+
+        self.stdout.write(f"\nBacklog (Open / In Progress) as of {backlog['as_of']}")
+        self.stdout.write(f"{'category':<24} {'priority':<9} {'total':>8} {'overdue':>8} "
+                          + ' '.join(f"{label:>7}" for label in backlog['bin_labels']))
+        for row in backlog['groups']:
+            self.stdout.write(f"{row['category']:<24} {row['priority']:<9} {row['total']:>8} {row['overdue']:>8} "
+                              + ' '.join(f"{n:>7}" for n in row['bins']))
+
+        peak = peak_rss_mib()
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{resolution['overall']['count']} resolved complaints in {elapsed:.1f}s"
+            + (f", peak RSS {peak:.0f} MiB" if peak is not None else "")
+        ))
+
+    def _resolution_line(self, category, priority, row, target):
+        def cell(value):
+            return '-' if value is None else f"{value:.1f}"
+
+        self.stdout.write(
+            f"{category:<24} {priority:<9} {row['count']:>8} {cell(row['p50_hours']):>8} {cell(row['p90_hours']):>8} "
+            f"{cell(row['p99_hours']):>8} {'' if target is None else target:>6} {row['breaches']:>9}"
+        )
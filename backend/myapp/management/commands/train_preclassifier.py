@@ -0,0 +1,90 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.ai.preclassifier import (
+    AI_PRECLASSIFIER_PATH, AI_PRECLASSIFIER_THRESHOLD, PreClassifier, evaluate, reset_model,
+)
+from myapp.models import Complaint, ComplaintTriage
+from myapp.triage import complaint_text
+
+
+def _triaged_examples(chunk_size=2000):
+    """(text, is_technical) for every complaint the triage worker has routed with the agent."""
+    rows = ComplaintTriage.objects.order_by('complaint_id').values_list('complaint_id', 'is_technical')
+    last_id = 0
+    while True:
+        chunk = list(rows.filter(complaint_id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        complaints = Complaint.objects.only('title', 'description').in_bulk([cid for cid, _ in chunk])
+        for complaint_id, technical in chunk:
+            if complaint_id in complaints:
+                yield complaint_text(complaints[complaint_id]), technical
+
+
+def _file_examples(path):
+    with open(path, encoding='utf-8') as src:
+        for line_no, line in enumerate(src, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                yield str(row['text']), bool(row['is_technical'])
+            except (ValueError, KeyError, TypeError):
+                raise CommandError(f"{path} line {line_no}: expected {{\"text\": ..., \"is_technical\": ...}}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Train the local pre-classifier that answers obviously non-technical complaints without the LLM, "
+        "from the complaints the agent has already routed (or a JSONL file), and report how it does on a held-out split."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jsonl', help='train on {"text": ..., "is_technical": ...} lines instead of ComplaintTriage')
+        parser.add_argument('--output', default=AI_PRECLASSIFIER_PATH, help="where to save the model")
+        parser.add_argument('--threshold', type=float, default=AI_PRECLASSIFIER_THRESHOLD,
+                            help="P(non-technical) needed to skip the LLM (AI_PRECLASSIFIER_THRESHOLD)")
+        parser.add_argument('--test-size', type=float, default=0.2, help="share held out for evaluation")
+        parser.add_argument('--min-examples', type=int, default=200)
+        parser.add_argument('--epochs', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--dry-run', action='store_true', help="evaluate only, don't save a model")
+
+    def handle(self, *args, **opts):
+        examples = list(_file_examples(opts['jsonl']) if opts['jsonl'] else _triaged_examples())
+        if len(examples) < opts['min_examples']:
+            raise CommandError(f"only {len(examples)} labelled complaints, need --min-examples {opts['min_examples']}")
+        technical = sum(1 for _, t in examples if t)
+        self.stdout.write(f"{len(examples)} labelled complaints, {technical} technical")
+
+        random.Random(opts['seed']).shuffle(examples)
+        held_out = int(len(examples) * opts['test_size'])
+        test, train = examples[:held_out], examples[held_out:]
+        started = time.perf_counter()
+        model = PreClassifier.train(train, epochs=opts['epochs'], seed=opts['seed'])
+        self.stdout.write(f"trained on {len(train)} in {time.perf_counter() - started:.1f}s, {len(model.terms)} terms")
+
+        if test:
+            self.stdout.write(f"held-out {len(test)}:")
+            self.stdout.write(f"{'threshold':>9} {'accuracy':>9} {'LLM saved':>10} {'saved %':>8} "
+                              f"{'tech lost':>10} {'precision':>10} {'p50 ms':>7} {'p99 ms':>7}")
+            for threshold in sorted({0.8, 0.9, 0.95, 0.99, opts['threshold']}):
+                m = evaluate(model, test, threshold)
+                precision = '-' if m['local_precision'] is None else f"{m['local_precision']:.4f}"
+                self.stdout.write(
+                    f"{threshold:>9.2f} {m['accuracy']:>9.4f} {m['llm_calls_saved']:>10} {m['saved_rate']:>8.1%} "
+                    f"{m['technical_answered_locally']:>10} {precision:>10} {m['p50_ms']:>7.3f} {m['p99_ms']:>7.3f}"
+                )
+
+        if opts['dry_run']:
+            return
+        # the saved model learns from everything, the held-out split included
+        model = PreClassifier.train(examples, epochs=opts['epochs'], seed=opts['seed'])
+        model.save(opts['output'])
+        reset_model()
+        self.stdout.write(self.style.SUCCESS(f"saved {len(model.terms)} terms to {opts['output']}"))
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:23
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def populate(apps, schema_editor):
+    # complaints is unmanaged: on a fresh database (tests) it doesn't exist yet and there is nothing to count
+    connection = schema_editor.connection
+    if 'complaints' not in connection.introspection.table_names():
+        return
+    Complaint = apps.get_model('myapp', 'Complaint')
+    ComplaintStatsDaily = apps.get_model('myapp', 'ComplaintStatsDaily')
+    ComplaintStatsTotal = apps.get_model('myapp', 'ComplaintStatsTotal')
+    rows = (
+        Complaint.objects.using(connection.alias)
+        .annotate(day=TruncDate('created_at', tzinfo=timezone.get_default_timezone()))
+        .values('category', 'day', 'status', 'priority')
+        .annotate(n=Count('complaint_id'))
+        .order_by()
+        .values_list('category', 'day', 'status', 'priority', 'n')
+    )
+    totals = Counter()
+    daily = []
+    for category, day, status, priority, n in rows:
+        daily.append(ComplaintStatsDaily(category=category, day=day, status=status, priority=priority, count=n))
+        totals[(category, status, priority)] += n
+    ComplaintStatsDaily.objects.using(connection.alias).bulk_create(daily, batch_size=5000)
+    ComplaintStatsTotal.objects.using(connection.alias).bulk_create(
+        ComplaintStatsTotal(category=c, status=s, priority=p, count=n) for (c, s, p), n in totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_complainttriage_triagejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintStatsDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=32)),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=32)),
+                ('priority', models.CharField(max_length=32)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'day', 'status', 'priority'), name='statsdaily_bucket_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ComplaintStatsTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=32)),
+                ('status', models.CharField(max_length=32)),
+                ('priority', models.CharField(max_length=32)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'status', 'priority'), name='statstotal_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
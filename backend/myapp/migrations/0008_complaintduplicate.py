@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_complaintstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintDuplicate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('complaint_id', models.IntegerField(unique=True)),
+                ('cluster_id', models.IntegerField()),
+                ('category', models.CharField(max_length=32)),
+                ('similarity', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'created_at'], name='complaintdup_cat_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_complaintduplicate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('complaint_id', models.IntegerField()),
+                ('category', models.CharField(max_length=32)),
+                ('status', models.CharField(max_length=32)),
+                ('priority', models.CharField(max_length=32)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['changed_at'], name='complaintchange_changed_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 
 class Student(models.Model):
@@ -12,6 +13,10 @@ class Student(models.Model):
 	class Meta:
 		db_table = 'students'
 		managed = False
+		# Not applied by migrate (unmanaged table); `manage.py ensure_indexes` creates them.
+		constraints = [
+			models.UniqueConstraint(fields=['email'], name='students_email_uniq'),
+		]
 
 	def __str__(self):
 		return f"{self.name} (ID: {self.student_id})"
@@ -76,6 +81,8 @@ class Complaint(models.Model):
 	status = models.CharField(max_length=32, choices=STATUS_CHOICES, default='Open')
 	created_at = models.DateTimeField()
 	resolved_at = models.DateTimeField(null=True, blank=True)
+	# bumped by every status transition (myapp/workflow.py), which only applies to the version it was shown
+	version = models.PositiveIntegerField(default=0, db_default=0)
 
 	# Add a virtual property to map to departments based on category
 	@property
@@ -92,10 +99,124 @@ class Complaint(models.Model):
 	class Meta:
 		db_table = 'complaints'
 		managed = False  # Don't let Django manage this table
+		# Not applied by migrate (unmanaged table); `manage.py ensure_indexes` creates them.
+		indexes = [
+			models.Index(fields=['category', 'created_at', 'complaint_id'], name='complaints_cat_created_idx'),
+			models.Index(fields=['category', 'status'], name='complaints_cat_status_idx'),
+			models.Index(fields=['student_id', 'created_at', 'complaint_id'], name='complaints_student_created_idx'),
+			# recent-window scans: triage's catch-up of complaints inserted outside the web form
+			models.Index(fields=['created_at', 'complaint_id'], name='complaints_created_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.title} (Student ID: {self.student_id}) - {self.category}"
 
+class ComplaintTriage(models.Model):
+	"""AI routing result for a complaint, written by the triage worker (myapp/triage.py)."""
+	complaint_id = models.IntegerField(unique=True)
+	is_technical = models.BooleanField(default=False)
+	category = models.CharField(max_length=64, blank=True)
+	confidence = models.FloatField(null=True, blank=True)
+	summary = models.TextField(blank=True)
+	raw = models.JSONField(default=dict)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"Complaint {self.complaint_id} -> {self.category or 'unknown'}"
+
+
+class TriageJob(models.Model):
+	"""One queued AI triage run per complaint; see myapp/triage.py for the claim/retry protocol."""
+	STATUS_CHOICES = [
+		('pending', 'Pending'),
+		('running', 'Running'),
+		('done', 'Done'),
+		('failed', 'Failed'),
+	]
+
+	complaint_id = models.IntegerField(unique=True)
+	status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+	attempts = models.PositiveIntegerField(default=0)
+	available_at = models.DateTimeField(default=timezone.now)  # not picked up before this (retry backoff)
+	locked_until = models.DateTimeField(null=True, blank=True)  # visibility timeout of a running job
+	lease = models.CharField(max_length=32, blank=True)
+	last_error = models.TextField(blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'available_at'], name='triagejob_status_avail_idx'),
+		]
+
+	def __str__(self):
+		return f"Triage complaint {self.complaint_id} ({self.status})"
+
+class ComplaintStatsDaily(models.Model):
+	"""Complaints per category, creation day, status and priority, kept current by myapp/stats_rollup.py."""
+	category = models.CharField(max_length=32)
+	day = models.DateField()  # created_at's date in settings.TIME_ZONE
+	status = models.CharField(max_length=32)
+	priority = models.CharField(max_length=32)
+	count = models.IntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['category', 'day', 'status', 'priority'], name='statsdaily_bucket_uniq'),
+		]
+
+	def __str__(self):
+		return f"{self.category} {self.day} {self.status}/{self.priority}: {self.count}"
+
+
+class ComplaintStatsTotal(models.Model):
+	"""All-time counterpart of ComplaintStatsDaily (at most categories x statuses x priorities rows)."""
+	category = models.CharField(max_length=32)
+	status = models.CharField(max_length=32)
+	priority = models.CharField(max_length=32)
+	count = models.IntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['category', 'status', 'priority'], name='statstotal_bucket_uniq'),
+		]
+
+	def __str__(self):
+		return f"{self.category} {self.status}/{self.priority}: {self.count}"
+
+class ComplaintDuplicate(models.Model):
+	"""A complaint flagged at submission as a near-duplicate of an earlier one (myapp/duplicates.py)."""
+	complaint_id = models.IntegerField(unique=True)
+	cluster_id = models.IntegerField()  # complaint_id of the first complaint of the cluster
+	category = models.CharField(max_length=32)
+	similarity = models.FloatField()  # estimated Jaccard similarity of the two texts
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['category', 'created_at'], name='complaintdup_cat_created_idx'),
+		]
+
+	def __str__(self):
+		return f"Complaint {self.complaint_id} duplicates {self.cluster_id} ({self.similarity:.2f})"
+
+class ComplaintChange(models.Model):
+	"""A complaint's status and priority after a change, for the live dashboards (myapp/live.py); kept an hour."""
+	complaint_id = models.IntegerField()
+	category = models.CharField(max_length=32)
+	status = models.CharField(max_length=32)
+	priority = models.CharField(max_length=32)
+	changed_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['changed_at'], name='complaintchange_changed_idx'),
+		]
+
+	def __str__(self):
+		return f"Complaint {self.complaint_id} now {self.status}/{self.priority}"
+
 # Keep Query model for backward compatibility if needed
 class Query(models.Model):
 	STATUS_CHOICES = [
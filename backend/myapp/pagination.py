@@ -0,0 +1,107 @@
+import base64
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+
+@dataclass
+class KeysetPage:
+    """One page of complaints ordered newest first, on (created_at, complaint_id)."""
+    items: List
+    page_size: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    query: str = ''  # urlencoded filters the page links carry along (search form)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(complaint, direction: str) -> str:
+    payload = {'c': complaint.created_at.isoformat(), 'i': complaint.complaint_id, 'd': direction}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]):
+    """Return (created_at, complaint_id, direction) or None for a missing/garbled cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        created_at = parse_datetime(payload['c'])
+        complaint_id = int(payload['i'])
+        direction = payload['d']
+    except (ValueError, TypeError, KeyError):
+        return None
+    if created_at is None or direction not in ('next', 'prev'):
+        return None
+    return created_at, complaint_id, direction
+
+
+def get_page_size(request) -> int:
+    default = getattr(settings, 'COMPLAINTS_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, getattr(settings, 'COMPLAINTS_MAX_PAGE_SIZE', MAX_PAGE_SIZE)))
+
+
+def paginate_complaints(queryset, request) -> KeysetPage:
+    """
+    Keyset-paginate a complaint queryset newest first.
+
+    Every page is a single indexed range scan of page_size + 1 rows (the extra
+    row tells us whether another page exists), so page N costs the same as page 1.
+    """
+    page_size = get_page_size(request)
+    decoded = decode_cursor(request.GET.get('cursor'))
+
+    if decoded is None:
+        rows = list(queryset.order_by('-created_at', '-complaint_id')[:page_size + 1])
+        has_more, items = len(rows) > page_size, rows[:page_size]
+        has_before = False
+    else:
+        created_at, complaint_id, direction = decoded
+        if direction == 'next':
+            rows = list(
+                queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, complaint_id__lt=complaint_id))
+                .order_by('-created_at', '-complaint_id')[:page_size + 1]
+            )
+            has_more, items = len(rows) > page_size, rows[:page_size]
+            has_before = True
+        else:
+            # walk backwards in ascending order, then flip back to newest first
+            rows = list(
+                queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, complaint_id__gt=complaint_id))
+                .order_by('created_at', 'complaint_id')[:page_size + 1]
+            )
+            has_before, items = len(rows) > page_size, rows[:page_size][::-1]
+            has_more = True
+
+    return KeysetPage(
+        items=items,
+        page_size=page_size,
+        next_cursor=encode_cursor(items[-1], 'next') if (items and has_more) else None,
+        prev_cursor=encode_cursor(items[0], 'prev') if (items and has_before) else None,
+    )
@@ -0,0 +1,152 @@
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+from django.shortcuts import redirect
+
+ROLES_SESSION_KEY = '_myapp_roles'
+DEFAULT_ROLES_SESSION_TTL = 60
+
+# order matters: first match decides where redirect_user_dashboard sends a user
+DASHBOARD_FOR_ROLE = [
+    ('it', 'dashboard_it'),
+    ('rector', 'dashboard_rector'),
+    ('maintenance', 'dashboard_maintenance'),
+    ('warden', 'dashboard_warden'),
+    ('panel', 'panel_dashboard'),
+]
+
+# Category shown on each department's *_queries page and live dashboard, and exported by dashboard_queries_export
+QUERIES_CATEGORY = {
+    'panel': 'Finance_Admin',
+    'admin': 'Certificates_Documents',
+    'warden': 'Certificates_Documents',
+    'rector': 'Courses_Training',
+    'maintenance': 'Facilities_Logistics',
+    'it': 'IT_Support',
+}
+
+
+def _version_key(user_id):
+    return f'myapp:roles_version:{user_id}'
+
+
+def _roles_version(user_id):
+    # a token rather than a counter: a key evicted from the cache (or missing in a fresh worker)
+    # comes back as a new value, so no session copy stored against the old one matches it
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_roles(user_id):
+    cache.set(_version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def get_user_roles(request):
+    """
+    Return the set of group names of request.user.
+
+    Resolved at most once per request and kept in the session for ROLES_SESSION_TTL
+    seconds, so dashboards don't re-query auth_user_groups on every page. A group
+    change drops the session copy at once in the process that made it; the cache is
+    per process, so other workers pick it up when the copy expires.
+    """
+    cached = getattr(request, '_myapp_roles', None)
+    if cached is not None:
+        return cached
+
+    user = request.user
+    if not user.is_authenticated:
+        roles = frozenset()
+    else:
+        version = _roles_version(user.pk)
+        stored = request.session.get(ROLES_SESSION_KEY)
+        now = time.time()
+        if (stored and stored.get('user') == user.pk and stored.get('version') == version
+                and stored.get('expires', 0) > now):
+            roles = frozenset(stored['roles'])
+        else:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            request.session[ROLES_SESSION_KEY] = {
+                'user': user.pk, 'version': version, 'roles': sorted(roles),
+                'expires': now + getattr(settings, 'ROLES_SESSION_TTL', DEFAULT_ROLES_SESSION_TTL),
+            }
+
+    request._myapp_roles = roles
+    return roles
+
+
+def has_department_access(request, *departments):
+    """Department staff, the admin group and superusers may open a department's pages."""
+    if request.user.is_superuser:
+        return True
+    roles = get_user_roles(request)
+    return 'admin' in roles or any(d in roles for d in departments)
+
+
+def require_login(view_func):
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return redirect('login')
+        return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+def require_department(*departments):
+    """
+    Guard a view for the given department group(s); admin and superusers always pass.
+
+        @require_department('it')
+        def dashboard_it(request): ...
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return redirect('login')
+            if not has_department_access(request, *departments):
+                return redirect('login')
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
+
+
+def dashboard_url_name(request):
+    roles = get_user_roles(request)
+    for role, url_name in DASHBOARD_FOR_ROLE:
+        if role in roles:
+            return url_name
+    return 'student_dashboard'
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_roles(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): remember the members before they are gone
+        instance._myapp_cleared_users = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        for user_id in getattr(instance, '_myapp_cleared_users', ()):
+            invalidate_roles(user_id)
+    elif action in ('post_add', 'post_remove'):
+        for user_id in pk_set or ():
+            invalidate_roles(user_id)
+
+
+@receiver(pre_delete, sender=Group)
+def _group_deleted(sender, instance, **kwargs):
+    for user_id in instance.user_set.values_list('pk', flat=True):
+        invalidate_roles(user_id)
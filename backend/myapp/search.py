@@ -0,0 +1,241 @@
+"""
+Full-text search over complaint titles and descriptions.
+
+On MySQL this is the FULLTEXT index complaints_fulltext_idx (created by
+`manage.py ensure_indexes`), queried in boolean mode with every word required
+and matched as a prefix, ranked by MATCH() relevance. Other databases (SQLite
+in tests and development) get the same semantics from an in-process inverted
+index with BM25 ranking, built on first use; it picks up new complaints by
+complaint_id before every search and is dropped when an indexed complaint is
+edited or deleted.
+"""
+import math
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import escape
+from django.utils.safestring import SafeString, mark_safe
+
+from .complaint_io import iter_complaints
+from .models import Complaint
+
+FULLTEXT_INDEX_NAME = 'complaints_fulltext_idx'
+# InnoDB drops shorter words (innodb_ft_min_token_size), so a required short term would match nothing
+MIN_TERM_LENGTH = 3
+MAX_TERMS = 8
+SNIPPET_CHARS = 160
+
+_WORD_RE = re.compile(r'\w+')
+# words the fallback index leaves out, like InnoDB's default stopword list
+_STOPWORDS = frozenset(
+    'a about an are as at be by com de en for from how i in is it la of on or that the this to was what when '
+    'where who will with und www'.split()
+)
+_MATCH_SQL = "MATCH (title, description) AGAINST (%s IN BOOLEAN MODE)"
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    """The words of a search box query that take part in the search, deduplicated, in order."""
+    terms = [t for t in tokenize(query or '') if len(t) >= MIN_TERM_LENGTH and t not in _STOPWORDS]
+    return list(dict.fromkeys(terms))[:MAX_TERMS]
+
+
+def _boolean_query(terms: Sequence[str]) -> str:
+    # +word* : required, prefix match; \w+ tokens carry no boolean-mode operators
+    return ' '.join(f'+{term}*' for term in terms)
+
+
+def search_complaints(query: str, queryset=None, *, limit: int = 25, offset: int = 0) -> Tuple[List[Complaint], bool]:
+    """
+    Complaints from `queryset` matching every word of `query`, most relevant first.
+    Returns (complaints[offset:offset + limit], whether more follow).
+    """
+    queryset = Complaint.objects.all() if queryset is None else queryset
+    terms = query_terms(query)
+    if not terms:
+        return [], False
+    if connection.vendor == 'mysql':
+        params = (_boolean_query(terms),)
+        rows = list(
+            queryset.filter(RawSQL(_MATCH_SQL, params, output_field=BooleanField()))
+            .annotate(relevance=RawSQL(_MATCH_SQL, params, output_field=FloatField()))
+            .order_by('-relevance', '-complaint_id')[offset:offset + limit + 1]
+        )
+    else:
+        rows = _fallback_index.search(terms, queryset, offset + limit + 1)[offset:]
+    return rows[:limit], len(rows) > limit
+
+
+class InvertedIndex:
+    """
+    In-memory index for databases without FULLTEXT support: postings per word, BM25
+    scores, title words counted TITLE_WEIGHT times. Thread-safe; all state behind one lock.
+    """
+    TITLE_WEIGHT = 2
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._vocabulary: Optional[List[str]] = []
+        self._high_water = 0
+
+    def add(self, complaint_id: int, title: str, description: str) -> None:
+        counts: Dict[str, int] = {}
+        for word in tokenize(title or ''):
+            counts[word] = counts.get(word, 0) + self.TITLE_WEIGHT
+        for word in tokenize(description or ''):
+            counts[word] = counts.get(word, 0) + 1
+        for word, tf in counts.items():
+            if word in _STOPWORDS:
+                continue
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = {}
+                self._vocabulary = None
+            postings[complaint_id] = tf
+        length = sum(counts.values())
+        self.lengths[complaint_id] = length
+        self._total_length += length
+        self._high_water = max(self._high_water, complaint_id)
+
+    def catch_up(self, rows: Optional[Iterable[Tuple[int, str, str]]] = None) -> None:
+        """Index complaints above the high-water mark (all of them the first time)."""
+        if rows is None:
+            rows = iter_complaints(
+                Complaint.objects.filter(complaint_id__gt=self._high_water),
+                columns=('complaint_id', 'title', 'description'), chunk_size=5000,
+            )
+        for complaint_id, title, description in rows:
+            self.add(complaint_id, title, description)
+
+    def _expand(self, term: str) -> List[str]:
+        # indexed words starting with `term`, like `term*` in boolean mode
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        words = []
+        i = bisect_left(self._vocabulary, term)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(term):
+            words.append(self._vocabulary[i])
+            i += 1
+        return words
+
+    def scores(self, terms: Sequence[str]) -> Dict[int, float]:
+        """BM25 score of every complaint containing all `terms` (as prefixes)."""
+        n = len(self.lengths)
+        if not n:
+            return {}
+        avg_length = self._total_length / n
+        result: Optional[Dict[int, float]] = None
+        # rarest term first, so the candidate set only shrinks
+        expanded = sorted(
+            (self._expand(term) for term in terms),
+            key=lambda words: sum(len(self.postings[w]) for w in words),
+        )
+        for words in expanded:
+            # a prefix term is one term: its frequency summed over the words it expands to
+            tfs: Dict[int, int] = {}
+            for word in words:
+                postings = self.postings[word]
+                docs = postings.keys() if result is None else postings.keys() & result.keys()
+                for doc in docs:
+                    tfs[doc] = tfs.get(doc, 0) + postings[doc]
+            # document frequency over the whole index (a doc holding two expansions counts twice; rare)
+            df = min(n, sum(len(self.postings[word]) for word in words))
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            term_scores = {
+                doc: idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * self.lengths[doc] / avg_length))
+                for doc, tf in tfs.items()
+            }
+            if result is None:
+                result = term_scores
+            else:
+                result = {doc: score + term_scores[doc] for doc, score in result.items() if doc in term_scores}
+            if not result:
+                return {}
+        return result or {}
+
+    def search(self, terms: Sequence[str], queryset, limit: int, batch_size: int = 500) -> List[Complaint]:
+        """The `limit` best-scoring complaints that are also in `queryset` (its filters apply)."""
+        with self._lock:
+            self.catch_up()
+            scores = self.scores(terms)
+        ranked = sorted(scores, key=lambda doc: (-scores[doc], -doc))
+        hits: List[Complaint] = []
+        for start in range(0, len(ranked), batch_size):
+            batch = ranked[start:start + batch_size]
+            found = queryset.in_bulk(batch)
+            hits.extend(found[doc] for doc in batch if doc in found)
+            if len(hits) >= limit:
+                break
+        return hits[:limit]
+
+
+_fallback_index = InvertedIndex()
+
+
+def reset_search_index() -> None:
+    """Drop the fallback index; the next search rebuilds it from the complaints table."""
+    with _fallback_index._lock:
+        _fallback_index.reset()
+
+
+@receiver(post_save, sender=Complaint)
+def _complaint_saved(sender, instance, created, **kwargs):
+    # new rows are picked up by complaint_id; an edited one may have lost words, so start over
+    if not created and instance.pk <= _fallback_index._high_water:
+        reset_search_index()
+
+
+@receiver(post_delete, sender=Complaint)
+def _complaint_deleted(sender, instance, **kwargs):
+    if instance.pk <= _fallback_index._high_water:
+        reset_search_index()
+
+
+def highlight(text: str, terms: Sequence[str], max_chars: Optional[int] = None) -> SafeString:
+    """
+    `text` HTML-escaped with words starting with any of `terms` wrapped in <mark>. With
+    max_chars, only a window around the first match is kept (ellipses mark the cuts).
+    """
+    text = text or ''
+    pattern = re.compile(r'\b(?:%s)\w*' % '|'.join(map(re.escape, terms)), re.IGNORECASE) if terms else None
+    if max_chars is not None and len(text) > max_chars:
+        first = pattern.search(text) if pattern else None
+        start = max(0, first.start() - max_chars // 3) if first else 0
+        end = min(len(text), start + max_chars)
+        text = ('…' if start else '') + text[start:end] + ('…' if end < len(text) else '')
+    if pattern is None:
+        return mark_safe(escape(text))
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(f'<mark>{escape(match.group())}</mark>')
+        last = match.end()
+    parts.append(escape(text[last:]))
+    return mark_safe(''.join(parts))
+
+
+def annotate_hits(complaints: Iterable[Complaint], query: str) -> None:
+    """Attach title_html and snippet (highlighted, safe HTML) to each complaint for the results table."""
+    terms = query_terms(query)
+    for complaint in complaints:
+        complaint.title_html = highlight(complaint.title, terms)
+        complaint.snippet = highlight(complaint.description, terms, max_chars=SNIPPET_CHARS)
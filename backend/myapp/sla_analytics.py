@@ -0,0 +1,248 @@
+"""
+Resolution-time and backlog analytics for the panel dashboard and `manage.py sla_report`.
+
+Resolution percentiles are computed in one pass over the complaints resolved in a
+window, feeding each duration into a QuantileSketch per (category, priority): memory
+depends on the range of durations, not on how many complaints there are, and the
+per-group sketches merge into per-category, per-priority and overall figures.
+Backlog ages of still-open complaints are counted by the database in one GROUP BY.
+"""
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .complaint_io import iter_complaints
+from .models import Complaint
+
+DEFAULT_SLA_HOURS = {'Critical': 24, 'High': 72, 'Medium': 168, 'Low': 336}
+OPEN_STATUSES = ('Open', 'In Progress')
+# upper edges of the backlog age bins; the last bin is open-ended
+BACKLOG_BIN_HOURS = (24, 72, 168, 336, 720)
+BACKLOG_BIN_LABELS = ('<1d', '1-3d', '3-7d', '7-14d', '14-30d', '30d+')
+
+
+def sla_hours() -> Dict[str, float]:
+    """Resolution target per priority, in hours (settings.COMPLAINT_SLA_HOURS overrides the defaults)."""
+    return {**DEFAULT_SLA_HOURS, **getattr(settings, 'COMPLAINT_SLA_HOURS', {})}
+
+
+class QuantileSketch:
+    """
+    Log-bucketed histogram (the DDSketch construction): every quantile is within
+    `relative_accuracy` of the exact value, and two sketches with the same accuracy
+    merge exactly. With 1% accuracy, durations from a second to a year fit in ~850 buckets.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Counter = Counter()
+        self.zeros = 0  # values <= 0, which have no logarithm
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        if value > 0:
+            self.buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+        else:
+            self.zeros += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("can only merge sketches with the same relative_accuracy")
+        self.buckets.update(other.buckets)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The nearest-rank q-quantile (0 <= q <= 1): at least q of the values are <= it. None when empty."""
+        if not self.count:
+            return None
+        rank = max(math.ceil(q * self.count) - 1, 0)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # the middle of bucket (gamma^(i-1), gamma^i], within relative_accuracy of anything in it
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+@dataclass
+class ResolutionGroup:
+    """Resolution times (seconds) of one group of complaints, and how many missed their SLA."""
+    sketch: QuantileSketch = field(default_factory=QuantileSketch)
+    breaches: int = 0
+
+    def merge(self, other: 'ResolutionGroup') -> None:
+        self.sketch.merge(other.sketch)
+        self.breaches += other.breaches
+
+    def as_dict(self) -> Dict[str, object]:
+        def hours(seconds):
+            return None if seconds is None else round(seconds / 3600, 2)
+
+        count = self.sketch.count
+        return {
+            'count': count,
+            'p50_hours': hours(self.sketch.quantile(0.5)),
+            'p90_hours': hours(self.sketch.quantile(0.9)),
+            'p99_hours': hours(self.sketch.quantile(0.99)),
+            'mean_hours': hours(self.sketch.mean),
+            'max_hours': hours(self.sketch.max) if count else None,
+            'breaches': self.breaches,
+            'breach_rate': round(self.breaches / count, 4) if count else None,
+        }
+
+
+def default_window(days: int = 30, now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    now = now or timezone.now()
+    return now - timedelta(days=days), now
+
+
+def collect_resolution_times(
+    rows: Iterable[Tuple[str, str, datetime, datetime]],
+    *,
+    relative_accuracy: float = 0.01,
+) -> Tuple[Dict[Tuple[str, str], ResolutionGroup], int]:
+    """
+    Fold (category, priority, created_at, resolved_at) rows into one ResolutionGroup per
+    (category, priority). Returns the groups and the number of rows skipped because they
+    were resolved before they were created.
+    """
+    targets = {priority: hours * 3600 for priority, hours in sla_hours().items()}
+    groups: Dict[Tuple[str, str], ResolutionGroup] = {}
+    skipped = 0
+    for category, priority, created_at, resolved_at in rows:
+        seconds = (resolved_at - created_at).total_seconds()
+        if seconds < 0:
+            skipped += 1
+            continue
+        group = groups.get((category, priority))
+        if group is None:
+            group = groups[(category, priority)] = ResolutionGroup(QuantileSketch(relative_accuracy))
+        group.sketch.add(seconds)
+        target = targets.get(priority)
+        if target is not None and seconds > target:
+            group.breaches += 1
+    return groups, skipped
+
+
+def _rolled_up(groups: Dict[Tuple[str, str], ResolutionGroup], key, relative_accuracy) -> Dict[str, ResolutionGroup]:
+    merged: Dict[str, ResolutionGroup] = {}
+    for group_key, group in groups.items():
+        target = merged.setdefault(key(group_key), ResolutionGroup(QuantileSketch(relative_accuracy)))
+        target.merge(group)
+    return merged
+
+
+def resolution_report(
+    since: datetime,
+    until: datetime,
+    *,
+    categories: Optional[Sequence[str]] = None,
+    chunk_size: int = 5000,
+    relative_accuracy: float = 0.01,
+) -> Dict[str, object]:
+    """p50/p90/p99 resolution time and SLA breaches of complaints resolved in [since, until)."""
+    queryset = Complaint.objects.filter(resolved_at__gte=since, resolved_at__lt=until)
+    if categories:
+        queryset = queryset.filter(category__in=categories)
+    rows = iter_complaints(queryset, columns=('category', 'priority', 'created_at', 'resolved_at'), chunk_size=chunk_size)
+    groups, skipped = collect_resolution_times(rows, relative_accuracy=relative_accuracy)
+    overall = _rolled_up(groups, lambda key: 'all', relative_accuracy).get('all') or ResolutionGroup()
+    return {
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'sla_hours': sla_hours(),
+        'relative_accuracy': relative_accuracy,
+        'skipped': skipped,
+        'overall': overall.as_dict(),
+        'by_category': {
+            k: v.as_dict() for k, v in sorted(_rolled_up(groups, lambda key: key[0], relative_accuracy).items())
+        },
+        'by_priority': {
+            k: v.as_dict() for k, v in sorted(_rolled_up(groups, lambda key: key[1], relative_accuracy).items())
+        },
+        'groups': [
+            {'category': category, 'priority': priority, **group.as_dict()}
+            for (category, priority), group in sorted(groups.items())
+        ],
+    }
+
+
+def backlog_report(*, categories: Optional[Sequence[str]] = None, now: Optional[datetime] = None) -> Dict[str, object]:
+    """
+    Age histogram of complaints still open (or in progress) at `now`, per category and
+    priority, with how many are already past their SLA target. One aggregate query.
+    """
+    now = now or timezone.now()
+    targets = sla_hours()
+    queryset = Complaint.objects.filter(status__in=OPEN_STATUSES)
+    if categories:
+        queryset = queryset.filter(category__in=categories)
+
+    aggregates = {}
+    lower = None
+    for i, upper_hours in enumerate((*BACKLOG_BIN_HOURS, None)):
+        # bin i: created in (now - upper, now - lower]
+        condition = Q()
+        if lower is not None:
+            condition &= Q(created_at__lte=now - timedelta(hours=lower))
+        if upper_hours is not None:
+            condition &= Q(created_at__gt=now - timedelta(hours=upper_hours))
+        aggregates[f'bin_{i}'] = Count('complaint_id', filter=condition)
+        lower = upper_hours
+    overdue = Q()
+    for priority, hours in targets.items():
+        overdue |= Q(priority=priority, created_at__lt=now - timedelta(hours=hours))
+    aggregates['overdue'] = Count('complaint_id', filter=overdue)
+    aggregates['total'] = Count('complaint_id')
+
+    rows = queryset.values('category', 'priority').annotate(**aggregates).order_by('category', 'priority')
+    groups: List[Dict[str, object]] = []
+    by_category: Dict[str, Dict[str, object]] = {}
+    for row in rows:
+        bins = [row[f'bin_{i}'] for i in range(len(BACKLOG_BIN_LABELS))]
+        groups.append({
+            'category': row['category'], 'priority': row['priority'],
+            'total': row['total'], 'overdue': row['overdue'], 'bins': bins,
+        })
+        summary = by_category.setdefault(
+            row['category'], {'total': 0, 'overdue': 0, 'bins': [0] * len(BACKLOG_BIN_LABELS)}
+        )
+        summary['total'] += row['total']
+        summary['overdue'] += row['overdue']
+        summary['bins'] = [a + b for a, b in zip(summary['bins'], bins)]
+    return {
+        'as_of': now.isoformat(),
+        'sla_hours': targets,
+        'bin_labels': list(BACKLOG_BIN_LABELS),
+        'by_category': by_category,
+        'groups': groups,
+    }
@@ -0,0 +1,140 @@
+// live-dashboard.js
+//
+// Keeps a department dashboard current over a WebSocket (myapp/live.py) instead of reloading it:
+// counters marked data-live-stat="<status>" are updated in place, new complaints are appended
+// to the table body marked data-live-complaints, and the cells marked data-live-field="status" or
+// "priority" of the rows already there follow their complaint. Include with data-department="<department>".
+
+(function() {
+    const script = document.currentScript;
+    const department = script && script.dataset.department;
+    if (!department || !('WebSocket' in window)) {
+        return;
+    }
+
+    // close codes sent by the server
+    const CLOSE_FORBIDDEN = 4403;
+    const CLOSE_NOT_FOUND = 4404;
+    const CLOSE_OVERFLOW = 4008;
+    const CELL = 'px-6 py-4 whitespace-nowrap';
+
+    let retryDelay = 1000;
+
+    function lastComplaintId() {
+        let last = 0;
+        document.querySelectorAll('[data-live-complaints] [data-complaint-id]').forEach(function(row) {
+            last = Math.max(last, parseInt(row.dataset.complaintId, 10) || 0);
+        });
+        return last;
+    }
+
+    function setStat(status, value) {
+        document.querySelectorAll('[data-live-stat="' + status + '"]').forEach(function(el) {
+            el.textContent = value;
+        });
+    }
+
+    function addToStat(status, delta) {
+        document.querySelectorAll('[data-live-stat="' + status + '"]').forEach(function(el) {
+            el.textContent = (parseInt(el.textContent, 10) || 0) + delta;
+        });
+    }
+
+    function badge(value) {
+        const span = document.createElement('span');
+        const colour = String(value).toLowerCase();
+        span.className = 'px-2 inline-flex text-xs leading-5 font-semibold rounded-full bg-' + colour + '-100 text-' + colour + '-800';
+        span.textContent = value;
+        return span;
+    }
+
+    function appendComplaint(complaint) {
+        const body = document.querySelector('[data-live-complaints]');
+        if (!body || body.querySelector('[data-complaint-id="' + complaint.complaint_id + '"]')) {
+            return;
+        }
+        const empty = body.querySelector('[data-live-empty]');
+        if (empty) {
+            empty.remove();
+        }
+        const row = document.createElement('tr');
+        row.dataset.complaintId = complaint.complaint_id;
+        const cells = [
+            [complaint.complaint_id, 'text-sm font-medium text-gray-900'],
+            [complaint.student_id, 'text-sm font-medium text-gray-900'],
+            [complaint.title, 'text-sm text-gray-500'],
+            [complaint.category, 'text-sm text-gray-500'],
+            [badge(complaint.priority), '', 'priority'],
+            [badge(complaint.status), '', 'status'],
+            [new Date(complaint.created_at).toLocaleString(), 'text-sm text-gray-500'],
+        ];
+        cells.forEach(function(cell) {
+            const td = document.createElement('td');
+            td.className = (CELL + ' ' + cell[1]).trim();
+            if (cell[2]) {
+                td.dataset.liveField = cell[2];
+            }
+            if (cell[0] instanceof Node) {
+                td.appendChild(cell[0]);
+            } else {
+                td.textContent = cell[0];
+            }
+            row.appendChild(td);
+        });
+        body.appendChild(row);  // the table lists the oldest first
+    }
+
+    function updateComplaint(message) {
+        const row = document.querySelector('[data-live-complaints] [data-complaint-id="' + message.complaint_id + '"]');
+        if (!row) {
+            return;
+        }
+        ['status', 'priority'].forEach(function(field) {
+            const td = row.querySelector('[data-live-field="' + field + '"]');
+            if (td) {
+                td.replaceChildren(badge(message[field]));
+            }
+        });
+    }
+
+    function handle(message) {
+        if (message.type === 'stats') {
+            Object.keys(message.by_status).forEach(function(status) {
+                setStat(status, message.by_status[status]);
+            });
+        } else if (message.type === 'stats.changed') {
+            Object.keys(message.by_status).forEach(function(status) {
+                addToStat(status, message.by_status[status]);
+            });
+        } else if (message.type === 'complaint.created') {
+            appendComplaint(message.complaint);
+        } else if (message.type === 'complaint.updated') {
+            updateComplaint(message);
+        }
+    }
+
+    function connect() {
+        const scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        const since = lastComplaintId();
+        const url = scheme + window.location.host + '/ws/dashboard/' + department + '/' + (since ? '?since=' + since : '');
+        const socket = new WebSocket(url);
+
+        socket.addEventListener('open', function() {
+            retryDelay = 1000;
+        });
+        socket.addEventListener('message', function(event) {
+            handle(JSON.parse(event.data));
+        });
+        socket.addEventListener('close', function(event) {
+            if (event.code === CLOSE_OVERFLOW) {
+                // too far behind to catch up message by message
+                window.location.reload();
+            } else if (event.code !== CLOSE_FORBIDDEN && event.code !== CLOSE_NOT_FOUND) {
+                setTimeout(connect, retryDelay);
+                retryDelay = Math.min(retryDelay * 2, 30000);
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', connect);
+})();
@@ -0,0 +1,214 @@
+"""
+Materialised complaint counters.
+
+ComplaintStatsDaily holds the number of complaints per (category, creation day,
+status, priority) and ComplaintStatsTotal the same without the day, so dashboard
+counters and trend charts read a few rows instead of aggregating the complaints
+table. Both are kept current in the same transaction as the complaint write:
+
+  - ORM saves and deletes of a Complaint, through the signal receivers below;
+  - raw SQL inserts (student_new_query, complaint_io.import_rows) call record_created();
+  - anything else that changes complaints behind the ORM's back (raw SQL,
+    QuerySet.update(), bulk_create()) must call record_change()/record_created() itself.
+
+The same paths log status and priority changes of existing complaints to
+ComplaintChange through log_changes(), which the live dashboards poll to update
+the rows they show.
+
+`manage.py rebuild_complaint_stats` recomputes both tables from the complaints
+table and `manage.py check_complaint_stats` compares them with a full aggregation.
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Complaint, ComplaintChange, ComplaintStatsDaily, ComplaintStatsTotal
+
+# (category, status, priority, created_at): what a complaint contributes to the counters
+Snapshot = Tuple[str, str, str, datetime]
+# (category, day, status, priority): one ComplaintStatsDaily row
+Bucket = Tuple[str, date, str, str]
+
+_SNAPSHOT_FIELDS = ('category', 'status', 'priority', 'created_at')
+
+
+def _day(created_at) -> date:
+    # the day in settings.TIME_ZONE, whatever timezone is active for the request
+    if isinstance(created_at, datetime):
+        if timezone.is_aware(created_at):
+            created_at = timezone.localtime(created_at, timezone.get_default_timezone())
+        return created_at.date()
+    return created_at
+
+
+def bucket(category, status, priority, created_at) -> Bucket:
+    return (category, _day(created_at), status, priority)
+
+
+def _upsert_sql(model, key_fields) -> str:
+    # a single atomic "insert or add to count" per bucket, so concurrent writers never lose an increment
+    qn = connection.ops.quote_name
+    table, count = qn(model._meta.db_table), qn('count')
+    columns = ', '.join(qn(name) for name in (*key_fields, 'count'))
+    placeholders = ', '.join(['%s'] * (len(key_fields) + 1))
+    sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+    if connection.vendor == 'mysql':
+        return f"{sql} ON DUPLICATE KEY UPDATE {count} = {count} + VALUES({count})"
+    # SQLite >= 3.24 and PostgreSQL
+    keys = ', '.join(qn(name) for name in key_fields)
+    return f"{sql} ON CONFLICT ({keys}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}"
+
+
+def apply_deltas(deltas: Dict[Bucket, int]) -> None:
+    """Add per-bucket deltas (negative to remove complaints) to both rollup tables."""
+    daily = sorted((key, n) for key, n in deltas.items() if n)  # fixed lock order across writers
+    if not daily:
+        return
+    totals: Counter = Counter()
+    for (category, _, status, priority), n in daily:
+        totals[(category, status, priority)] += n
+    adapt = connection.ops.adapt_datefield_value
+    with transaction.atomic(), connection.cursor() as cursor:
+        # totals first: the same lock order as rebuild()
+        cursor.executemany(
+            _upsert_sql(ComplaintStatsTotal, ('category', 'status', 'priority')),
+            [(*key, n) for key, n in sorted(totals.items()) if n],
+        )
+        cursor.executemany(
+            _upsert_sql(ComplaintStatsDaily, ('category', 'day', 'status', 'priority')),
+            [(category, adapt(day), status, priority, n) for (category, day, status, priority), n in daily],
+        )
+
+
+def record_created(snapshots: Iterable[Snapshot]) -> None:
+    """Count newly inserted complaints, given as (category, status, priority, created_at)."""
+    apply_deltas(Counter(bucket(*snapshot) for snapshot in snapshots))
+
+
+def record_change(old: Optional[Snapshot], new: Optional[Snapshot]) -> None:
+    """Move one complaint between buckets; old=None for an insert, new=None for a delete."""
+    deltas: Counter = Counter()
+    if old is not None:
+        deltas[bucket(*old)] -= 1
+    if new is not None:
+        deltas[bucket(*new)] += 1
+    apply_deltas(deltas)
+
+
+def log_changes(changes: Iterable[Tuple[int, str, str, str]]) -> None:
+    """Log (complaint_id, category, status, priority) of complaints whose status or priority just changed."""
+    ComplaintChange.objects.bulk_create(
+        [ComplaintChange(complaint_id=i, category=c, status=s, priority=p) for i, c, s, p in changes], batch_size=1000,
+    )
+
+
+def _snapshot(complaint) -> Snapshot:
+    return tuple(getattr(complaint, name) for name in _SNAPSHOT_FIELDS)
+
+
+@receiver(pre_save, sender=Complaint)
+def _complaint_pre_save(sender, instance, update_fields=None, **kwargs):
+    instance._stats_old = None
+    if instance.pk is None:
+        return  # Complaint.objects.create(): nothing to move out of
+    if update_fields is not None and not set(update_fields) & set(_SNAPSHOT_FIELDS):
+        return
+    instance._stats_old = Complaint.objects.filter(pk=instance.pk).values_list(*_SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_save, sender=Complaint)
+def _complaint_post_save(sender, instance, created, update_fields=None, **kwargs):
+    old = getattr(instance, '_stats_old', None)
+    if not created and old is None:
+        return  # no counted field was saved
+    new = _snapshot(instance)
+    if old is not None and update_fields is not None:
+        # fields that weren't saved keep their stored value, whatever the instance says
+        new = tuple(n if name in update_fields else o for name, o, n in zip(_SNAPSHOT_FIELDS, old, new))
+    record_change(old, new)
+    category, status, priority, _ = new
+    if old is not None and (old[1], old[2]) != (status, priority):
+        log_changes([(instance.pk, category, status, priority)])
+
+
+@receiver(pre_delete, sender=Complaint)
+def _complaint_pre_delete(sender, instance, **kwargs):
+    # the stored values: a stale instance.delete() must not uncount what it holds in memory
+    instance._stats_old = Complaint.objects.filter(pk=instance.pk).values_list(*_SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_delete, sender=Complaint)
+def _complaint_post_delete(sender, instance, **kwargs):
+    old = getattr(instance, '_stats_old', None)
+    if old is not None:
+        record_change(old, None)
+
+
+def aggregate_buckets(queryset=None) -> Dict[Bucket, int]:
+    """The rollup computed from scratch: one GROUP BY over the complaints table."""
+    queryset = Complaint.objects.all() if queryset is None else queryset
+    rows = (
+        queryset.annotate(day=TruncDate('created_at', tzinfo=timezone.get_default_timezone()))
+        .values('category', 'day', 'status', 'priority')
+        .annotate(n=Count('complaint_id'))
+        .order_by()
+        .values_list('category', 'day', 'status', 'priority', 'n')
+    )
+    return {(category, day, status, priority): n for category, day, status, priority, n in rows}
+
+
+def _totals(buckets: Dict[Bucket, int]) -> Counter:
+    totals: Counter = Counter()
+    for (category, _, status, priority), n in buckets.items():
+        totals[(category, status, priority)] += n
+    return totals
+
+
+def rebuild(batch_size: int = 5000) -> int:
+    """Replace both rollup tables with a full recomputation; returns the number of daily buckets."""
+    with transaction.atomic():
+        # writers upsert the totals rows before anything else; holding their locks makes them wait for
+        # the new rows rather than add to rows about to be deleted (select_for_update is a no-op on SQLite)
+        list(ComplaintStatsTotal.objects.select_for_update().values_list('pk', flat=True))
+        buckets = aggregate_buckets()
+        ComplaintStatsDaily.objects.all().delete()
+        ComplaintStatsTotal.objects.all().delete()
+        ComplaintStatsDaily.objects.bulk_create(
+            (ComplaintStatsDaily(category=c, day=d, status=s, priority=p, count=n) for (c, d, s, p), n in buckets.items()),
+            batch_size=batch_size,
+        )
+        ComplaintStatsTotal.objects.bulk_create(
+            ComplaintStatsTotal(category=c, status=s, priority=p, count=n) for (c, s, p), n in _totals(buckets).items()
+        )
+    return len(buckets)
+
+
+def compare() -> List[Tuple[str, tuple, int, int]]:
+    """
+    Differences between the rollup tables and a full aggregation, as
+    (table, bucket, expected, actual); empty when they agree. Zero-count rows are ignored.
+    """
+    expected = aggregate_buckets()
+    daily = {
+        (c, d, s, p): n
+        for c, d, s, p, n in ComplaintStatsDaily.objects.values_list('category', 'day', 'status', 'priority', 'count')
+        if n
+    }
+    totals = {
+        (c, s, p): n
+        for c, s, p, n in ComplaintStatsTotal.objects.values_list('category', 'status', 'priority', 'count')
+        if n
+    }
+    mismatches = []
+    for table, want, have in (('daily', expected, daily), ('total', _totals(expected), totals)):
+        for key in sorted(want.keys() | have.keys(), key=str):
+            if want.get(key, 0) != have.get(key, 0):
+                mismatches.append((table, key, want.get(key, 0), have.get(key, 0)))
+    return mismatches
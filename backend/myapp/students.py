@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Student, UserProfile
+from .ttl_cache import TTLCache
+
+# cached value for users with no matching students row, so they don't re-query on every click
+_NO_STUDENT = 'missing'
+
+_local = TTLCache(
+    maxsize=getattr(settings, 'STUDENT_LOCAL_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'STUDENT_LOCAL_CACHE_TTL', 60),
+)
+
+
+def _cache_key(user_id):
+    return f'myapp:student:{user_id}'
+
+
+def _to_cached(student):
+    if student is None:
+        return _NO_STUDENT
+    return {'student_id': student.student_id, 'name': student.name, 'email': student.email, 'phone': student.phone}
+
+
+def _from_cached(value):
+    if value == _NO_STUDENT:
+        return None
+    return Student(**value)
+
+
+def _lookup(user):
+    """Hit the external students table, preferring the id remembered on UserProfile."""
+    profile = UserProfile.objects.filter(user=user).first()
+    if profile is not None and profile.student_db_id is not None:
+        student = Student.objects.filter(pk=profile.student_db_id).first()
+        # the stored id is only trusted while it still belongs to this user's email
+        if student is not None and student.email == user.email:
+            return student
+
+    student = Student.objects.filter(email=user.email).first() if user.email else None
+    if student is not None and (profile is None or profile.student_db_id != student.student_id):
+        UserProfile.objects.update_or_create(user=user, defaults={'student_db_id': student.student_id})
+    return student
+
+
+def get_student_for_user(user):
+    """
+    Return the external Student row for a Django user, or None.
+
+    Looked up in an in-process LRU, then the Django cache, and only then in
+    the students table; the resolved id is persisted on UserProfile.student_db_id.
+    """
+    value = _local.get(user.pk)
+    if value is None:
+        value = cache.get(_cache_key(user.pk))
+        if value is None:
+            value = _to_cached(_lookup(user))
+            cache.set(_cache_key(user.pk), value, _ttl_for(value))
+        _local.set(user.pk, value, ttl=min(_local.ttl, _ttl_for(value)))
+    return _from_cached(value)
+
+
+def _ttl_for(value):
+    # a missing row may be added to students at any time, so forget that quickly
+    if value == _NO_STUDENT:
+        return getattr(settings, 'STUDENT_MISSING_CACHE_TTL', 60)
+    return getattr(settings, 'STUDENT_CACHE_TTL', 900)
+
+
+def invalidate_student(user_id):
+    _local.delete(user_id)
+    cache.delete(_cache_key(user_id))
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # email is the mapping key, so a user save may change which student row applies;
+    # login only touches last_login and is skipped
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    invalidate_student(instance.pk)
@@ -1,3 +1,1411 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.utils import load_backend
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openai import RateLimitError
+
+from backend.db_pool import ConnectionPool, PoolTimeout
+
+from .ai import batch, complaint_agent, preclassifier
+from .ai.batch import BatchUsage, ai_agent_batch
+from .ai.complaint_agent import LLMLimiter, _StepIndex, _extract_commands_list
+from .ai.fake_openai import DEFAULT_REPLY, running_fake_openai
+from .ai.preclassifier import PreClassifier, evaluate, preclassifier_stats
+from .ai.response_cache import cache_key, cache_stats, cached_ai_agent, clear_cache, normalize_complaint
+from .ai.streaming import IncrementalJSONParser
+from .management.commands.benchmark_command_extractor import SAMPLES, _legacy_extract_commands_list, _random_code
+from .management.commands.benchmark_step_matching import _legacy_best_step_idx_for_cmd, _workload
+from .management.commands.loadtest_live_dashboards import DashboardConnection
+from .complaint_io import RowError, csv_lines, filter_complaints, import_rows, iter_complaints, read_rows
+from .dashboard_stats import compute_dashboard_stats, get_daily_trend, get_dashboard_stats
+from .db_routing import STICKY_COOKIE, ReplicaRouter, reads_from_replica
+from .duplicates import (
+    DuplicateIndex, check_new_complaint, duplicate_clusters, rebuild_index, reset_duplicate_index, signature,
+)
+from .instrumentation import Histogram, over_budget, registry
+from . import live
+from .live import InMemoryChannelLayer, stats_changes
+from .models import Complaint, ComplaintDuplicate, ComplaintTriage, Student, TriageJob, UserProfile
+from .pagination import decode_cursor, encode_cursor, paginate_complaints
+from .search import highlight, reset_search_index, search_complaints
+from .sla_analytics import QuantileSketch, backlog_report, resolution_report
+from .stats_rollup import compare, rebuild, record_created
+from .students import get_student_for_user, invalidate_student
+from .triage import claim_jobs, enqueue_new_complaints, enqueue_triage, run_job
+from .workflow import (
+    BULK_CHUNK_SIZE, InvalidTransition, StaleComplaint, TransitionError, bulk_transition, transition,
+)
+
+# complaints/students are managed = False, so the test database doesn't get them from migrate
+UNMANAGED_MODELS = (Complaint, Student)
+
+
+def setUpModule():
+    existing = connection.introspection.table_names()
+    with connection.schema_editor() as editor:
+        for model in UNMANAGED_MODELS:
+            if model._meta.db_table not in existing:
+                editor.create_model(model)
+
+
+def tearDownModule():
+    with connection.schema_editor() as editor:
+        for model in UNMANAGED_MODELS:
+            editor.delete_model(model)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now()
+        # two complaints per timestamp, so every page boundary has to break a created_at tie
+        cls.complaints = [
+            Complaint.objects.create(
+                student_id=1, title=f'complaint {i}', description='d', category='IT_Support',
+                created_at=start - timedelta(minutes=i // 2),
+            )
+            for i in range(7)
+        ]
+        cls.newest_first = sorted(cls.complaints, key=lambda c: (c.created_at, c.complaint_id), reverse=True)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _page(self, cursor=None, page_size=2):
+        params = {'page_size': page_size}
+        if cursor:
+            params['cursor'] = cursor
+        return paginate_complaints(Complaint.objects.all(), self.factory.get('/', params))
+
+    def _ids(self, page):
+        return [c.complaint_id for c in page]
+
+    def test_cursor_round_trips_and_rejects_garbage(self):
+        complaint = self.complaints[3]
+        cursor = encode_cursor(complaint, 'next')
+        self.assertEqual(decode_cursor(cursor), (complaint.created_at, complaint.complaint_id, 'next'))
+        tampered = base64.urlsafe_b64encode(json.dumps({'c': 'x', 'i': 1, 'd': 'next'}).encode()).decode()
+        wrong_direction = base64.urlsafe_b64encode(json.dumps(
+            {'c': complaint.created_at.isoformat(), 'i': 1, 'd': 'sideways'}).encode()).decode()
+        for bad in ('', '!!!', 'bm90IGpzb24', cursor[:-3], tampered, wrong_direction):
+            self.assertIsNone(decode_cursor(bad), bad)
+        # a garbled cursor falls back to the first page
+        self.assertEqual(self._ids(self._page('!!!')), self._ids(self._page()))
+
+    def test_links_at_first_and_last_page(self):
+        first = self._page()
+        self.assertTrue(first.has_next)
+        self.assertFalse(first.has_previous)
+
+        seen, page = self._ids(first), first
+        while page.has_next:
+            page = self._page(page.next_cursor)
+            seen += self._ids(page)
+        self.assertFalse(page.has_next)
+        self.assertTrue(page.has_previous)
+        self.assertEqual(self._ids(page), [self.newest_first[-1].complaint_id])
+        self.assertEqual(seen, [c.complaint_id for c in self.newest_first])
+
+        # walking back from the last page ends on the first page, without a previous link
+        while page.has_previous:
+            page = self._page(page.prev_cursor)
+        self.assertEqual(self._ids(page), self._ids(first))
+        self.assertFalse(page.has_previous)
+
+    def test_created_at_ties_are_broken_by_complaint_id(self):
+        first = self._page()
+        # the first page stops inside a timestamp shared by two complaints; no row is skipped or repeated
+        second = self._page(first.next_cursor)
+        self.assertEqual(self._ids(first) + self._ids(second),
+                         [c.complaint_id for c in self.newest_first[:4]])
+        self.assertEqual(self._ids(self._page(second.prev_cursor)), self._ids(first))
+
+    def test_deep_pages_cost_one_query(self):
+        page = self._page(page_size=1)
+        while page.has_next:
+            with self.assertNumQueries(1):
+                page = self._page(page.next_cursor, page_size=1)
+
+
+class EnsureIndexesTests(TransactionTestCase):
+    # schema changes can't run inside TestCase's transaction (and commit implicitly on MySQL)
+    def setUp(self):
+        # a pre-deploy table: no version column and none of the declared indexes (create_model
+        # leaves them off unmanaged tables; an earlier test's ensure_indexes run may have added them)
+        with connection.schema_editor() as editor:
+            editor.remove_field(Complaint, Complaint._meta.get_field('version'))
+        complaint_indexes, student_indexes = self._index_names('complaints'), self._index_names('students')
+        with connection.schema_editor() as editor:
+            for index in Complaint._meta.indexes:
+                if index.name in complaint_indexes:
+                    editor.remove_index(Complaint, index)
+            for constraint in Student._meta.constraints:
+                if constraint.name in student_indexes:
+                    editor.remove_constraint(Student, constraint)
+
+    def _run(self, **options):
+        out = io.StringIO()
+        call_command('ensure_indexes', stdout=out, **options)
+        return out.getvalue().splitlines()
+
+    def _columns(self):
+        with connection.cursor() as cursor:
+            return {c.name for c in connection.introspection.get_table_description(cursor, 'complaints')}
+
+    def _index_names(self, table):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, table))
+
+    def test_dry_run_changes_nothing(self):
+        before = (self._columns(), self._index_names('complaints'), self._index_names('students'))
+        lines = self._run(dry_run=True)
+        self.assertIn('missing  complaints.version (column)', lines)
+        self.assertIn("missing  complaints.complaints_cat_created_idx ('category', 'created_at', 'complaint_id')", lines)
+        self.assertFalse([line for line in lines if line.startswith('created')])
+        self.assertEqual((self._columns(), self._index_names('complaints'), self._index_names('students')), before)
+
+    def test_creates_what_is_missing_then_only_reports(self):
+        lines = self._run()
+        self.assertIn('created  complaints.version', lines)
+        self.assertIn('version', self._columns())
+        # the model's queries work against the repaired table
+        self.assertEqual(list(Complaint.objects.values_list('version', flat=True)), [])
+
+        after = (self._columns(), self._index_names('complaints'), self._index_names('students'))
+        declared = [*Complaint._meta.indexes, *Student._meta.constraints]
+        self.assertLessEqual({item.name for item in declared}, after[1] | after[2])
+        lines = self._run()
+        self.assertEqual(len(lines), len(declared))
+        self.assertTrue(all(line.startswith('ok ') for line in lines), lines)
+        self.assertEqual((self._columns(), self._index_names('complaints'), self._index_names('students')), after)
+
+
+class RoleResolutionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.it_group, _ = Group.objects.get_or_create(name='it')
+        cls.user = User.objects.create_user(username='it@example.com', email='it@example.com', password='pw')
+        cls.user.groups.add(cls.it_group)
+        for i in range(5):
+            Complaint.objects.create(
+                student_id=1, title=f'complaint {i}', description='d',
+                category='IT_Support', created_at=timezone.now(),
+            )
+
+    def setUp(self):
+        self.client.login(username='it@example.com', password='pw')
+
+    def test_dashboard_query_count_is_bounded(self):
+        self.client.get(reverse('dashboard_it'))  # first hit resolves and stores the roles
+        # session + user, counters, duplicate clusters, complaint list; no auth_user_groups lookups
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('dashboard_it'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_department_is_redirected(self):
+        response = self.client.get(reverse('dashboard_rector'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    def test_group_change_invalidates_cached_roles(self):
+        self.client.get(reverse('dashboard_it'))
+        rector, _ = Group.objects.get_or_create(name='rector')
+        self.user.groups.add(rector)
+        self.assertEqual(self.client.get(reverse('dashboard_rector')).status_code, 200)
+        self.user.groups.remove(self.it_group)
+        response = self.client.get(reverse('dashboard_it'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    def test_session_copy_expires(self):
+        self.client.get(reverse('dashboard_it'))
+        # removed without signals, as if by another worker whose cache invalidation this process never sees
+        User.groups.through.objects.filter(user=self.user, group=self.it_group).delete()
+        self.assertEqual(self.client.get(reverse('dashboard_it')).status_code, 200)
+        with mock.patch('myapp.roles.time.time', return_value=time.time() + settings.ROLES_SESSION_TTL + 1):
+            response = self.client.get(reverse('dashboard_it'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    def test_evicted_version_does_not_revive_the_session_copy(self):
+        self.client.get(reverse('dashboard_it'))
+        self.user.groups.remove(self.it_group)
+        cache.clear()  # the bumped version is evicted
+        response = self.client.get(reverse('dashboard_it'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    def test_login_redirects_to_department_dashboard(self):
+        response = self.client.get(reverse('login'))
+        self.assertRedirects(response, reverse('dashboard_it'), fetch_redirect_response=False)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def _wrapper(self, alias, **pool):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_dict = {**connections.settings['default'], 'NAME': os.path.join(tmp.name, 'pool.sqlite3'),
+                         'ENGINE': 'backend.db_pool.sqlite3', 'CONN_MAX_AGE': 0, 'POOL': pool}
+        wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+        self.addCleanup(wrapper.pool.close_idle)
+        return wrapper
+
+    def test_connections_are_reused_across_requests(self):
+        wrapper = self._wrapper('pool-reuse', SIZE=2)
+        for _ in range(5):
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            raw = wrapper.connection
+            wrapper.close_if_unusable_or_obsolete()  # request_finished, CONN_MAX_AGE = 0
+            self.assertIsNone(wrapper.connection)
+        self.assertEqual((wrapper.pool.connects, wrapper.pool.open, list(wrapper.pool.idle)), (1, 1, [raw]))
+
+        # handed back with autocommit left off: closed, not pooled
+        wrapper.ensure_connection()
+        wrapper.set_autocommit(False)
+        wrapper.close()
+        self.assertEqual((wrapper.pool.open, len(wrapper.pool.idle)), (0, 0))
+
+    def test_pool_size_timeout_and_recycle(self):
+        opened = []
+
+        class Raw:
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        def connect():
+            opened.append(Raw())
+            return opened[-1]
+
+        pool = ConnectionPool(size=1, timeout=0.05, recycle=60)
+        first = pool.acquire(connect)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(connect)
+        pool.release(first)
+        self.assertIs(pool.acquire(connect), first)
+
+        def dead(raw):
+            raise OSError('server has gone away')
+
+        pool.release(first)
+        second = pool.acquire(connect, ping=dead)  # the failed health check replaces the connection
+        self.assertTrue(first.closed)
+        pool.recycle = 0
+        pool.release(second)
+        self.assertTrue(second.closed)
+        self.assertEqual((len(opened), pool.open), (2, 0))
+
+
+class ReplicaRoutingTests(TestCase):
+    """The test database as the primary and a temporary SQLite file, with its own rows, as the replica."""
+    # resolved in setUpClass, once the replica alias exists
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {**connections.settings['default'],
+                                           'NAME': os.path.join(cls.tmp.name, 'replica.sqlite3')}
+        with connections['replica'].schema_editor() as editor:
+            for model in apps.get_app_config('myapp').get_models():
+                editor.create_model(model)
+        cls.routing = override_settings(REPLICA_DATABASES=['replica'])
+        cls.routing.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.routing.disable()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.tmp.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        it_group, _ = Group.objects.get_or_create(name='it')
+        user = User.objects.create_user(username='it@example.com', email='it@example.com', password='pw')
+        user.groups.add(it_group)
+        created = timezone.now()
+        printer, _ = [Complaint.objects.create(student_id=1, title=title, description='d',
+                                               category='IT_Support', created_at=created)
+                      for title in ('Printer jammed', 'VPN down')]
+        # the replica lags: it hasn't got the primary's newest complaint yet
+        Complaint.objects.using('replica').bulk_create([Complaint(
+            complaint_id=printer.pk, student_id=1, title='Printer jammed', description='d',
+            category='IT_Support', created_at=created,
+        )])
+
+    def setUp(self):
+        self.client.login(username='it@example.com', password='pw')
+
+    def _titles(self, response):
+        return [c.title for c in response.context['complaints']]
+
+    def test_dashboard_reads_go_to_the_replica(self):
+        url = reverse('dashboard_it_queries')
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(url)
+        self.assertEqual(self._titles(response), ['Printer jammed'])
+        self.assertTrue(replica_queries)
+        self.assertTrue(all('auth_' not in q['sql'] and 'django_session' not in q['sql'] for q in replica_queries))
+        # outside a routed request, reads stay on the primary
+        self.assertEqual(Complaint.objects.count(), 2)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        complaint = Complaint.objects.get(title='Printer jammed')
+        response = self.client.post(reverse('dashboard_complaint_transition', args=['it', complaint.pk]),
+                                    {'status': 'In Progress', 'version': 0})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse('dashboard_it_queries'))
+        self.assertEqual(sorted(self._titles(response)), ['Printer jammed', 'VPN down'])
+
+        self.client.cookies[STICKY_COOKIE] = str(int(time.time()) - 1)  # the window has passed
+        self.assertEqual(self._titles(self.client.get(reverse('dashboard_it_queries'))), ['Printer jammed'])
+
+    def test_only_listed_views_are_routed(self):
+        self.assertTrue(all(reads_from_replica(name) for name in (
+            'dashboard_it', 'panel_dashboard', 'student_dashboard', 'dashboard_it_queries', 'student_my_queries',
+            'panel_analytics_backlog', 'dashboard_queries_export',
+        )))
+        self.assertFalse(any(reads_from_replica(name) for name in ('student_new_query', 'login', None)))
+        self.assertFalse(ReplicaRouter().allow_migrate('replica', 'myapp'))
+        self.assertTrue(ReplicaRouter().allow_migrate('default', 'myapp'))
+
+
+class ViewBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser('boss@example.com', 'boss@example.com', 'pw')
+        Student.objects.create(student_id=7, name='S', email='boss@example.com')
+        # a few complaints per category and status, so a query per row shows up over the budget
+        for i in range(20):
+            Complaint.objects.create(
+                student_id=7, title=f'complaint {i}', description='d', created_at=timezone.now(),
+                category=Complaint.CATEGORY_CHOICES[i % len(Complaint.CATEGORY_CHOICES)][0],
+                status=Complaint.STATUS_CHOICES[i % len(Complaint.STATUS_CHOICES)][0],
+            )
+
+    def setUp(self):
+        registry.reset()
+        self.client.login(username='boss@example.com', password='pw')
+
+    def test_budgeted_views_stay_within_budget(self):
+        for view, budget in settings.VIEW_BUDGETS.items():
+            with self.subTest(view=view):
+                self.client.get(reverse(view))  # first hit resolves and stores the roles and student
+                response = self.client.get(reverse(view))
+                self.assertEqual(response.status_code, 200)
+                sample = registry.last[view]
+                self.assertEqual(over_budget(sample), [], f"{view} spent {sample}, budget {budget}")
+
+    @override_settings(VIEW_BUDGETS={'dashboard_it': {'queries': 3}})
+    def test_requests_over_budget_are_logged_and_counted(self):
+        with self.assertLogs('myapp.instrumentation', 'INFO'):
+            self.client.get(reverse('dashboard_it'))
+        self.assertEqual(registry.exceeded, {('dashboard_it', 'queries'): 1})
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('dashboard_it'))
+        self.client.get('/no-such-page/')
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('# TYPE http_request_sql_queries histogram', text)
+        self.assertIn('http_request_sql_queries_bucket{view="dashboard_it",le="+Inf"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{view="<unresolved>"} 1', text)
+        self.assertGreater(registry.last['dashboard_it'].template_seconds, 0)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 403)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 9):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [('1', 2), ('5', 3), ('+Inf', 4)])
+        self.assertEqual((histogram.count, histogram.sum), (4, 13))
+
+
+class StudentResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='s@example.com', email='s@example.com', password='pw')
+        Student.objects.create(student_id=42, name='S', email='s@example.com')
+
+    def setUp(self):
+        invalidate_student(self.user.pk)
+
+    def test_lookup_is_cached_and_remembered_on_profile(self):
+        self.assertEqual(get_student_for_user(self.user).student_id, 42)
+        self.assertEqual(UserProfile.objects.get(user=self.user).student_db_id, 42)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_student_for_user(self.user).student_id, 42)
+
+    def test_email_change_invalidates(self):
+        get_student_for_user(self.user)
+        self.user.email = 'other@example.com'
+        self.user.save()
+        self.assertIsNone(get_student_for_user(self.user))
+
+
+class TriageQueueTests(TestCase):
+    def setUp(self):
+        self.complaint = Complaint.objects.create(
+            student_id=1, title='pip broken', description='pip install fails',
+            category='IT_Support', created_at=timezone.now(),
+        )
+
+    def test_enqueue_is_idempotent(self):
+        enqueue_triage(self.complaint.pk)
+        enqueue_triage(self.complaint.pk)
+        self.assertEqual(enqueue_new_complaints(), 0)
+        self.assertEqual(TriageJob.objects.count(), 1)
+
+    def test_catch_up_finds_recent_rows_without_a_job(self):
+        # self.complaint came from an import; a newer one was submitted (and queued) through the form
+        submitted = Complaint.objects.create(
+            student_id=1, title='wifi', description='no wifi', category='IT_Support', created_at=timezone.now(),
+        )
+        enqueue_triage(submitted.pk)
+        Complaint.objects.create(
+            student_id=1, title='old', description='from last year', category='IT_Support',
+            created_at=timezone.now() - timedelta(days=settings.TRIAGE_ENQUEUE_WINDOW_DAYS + 1),
+        )
+        self.assertEqual(enqueue_new_complaints(), 1)
+        self.assertEqual(set(TriageJob.objects.values_list('complaint_id', flat=True)), {self.complaint.pk, submitted.pk})
+        self.assertEqual(enqueue_new_complaints(), 0)
+
+    def test_failed_attempt_is_retried_with_backoff(self):
+        enqueue_triage(self.complaint.pk)
+        [(job, lease)] = claim_jobs(10)
+        status = run_job(job, lease, agent=lambda text: {'error': 'rate limited'})
+        self.assertEqual(status, 'pending')
+        self.assertEqual(claim_jobs(10), [])  # backing off
+
+        TriageJob.objects.update(available_at=timezone.now())
+        [(job, lease)] = claim_jobs(10)
+        result = {'routing': {'is_technical': True, 'category': 'dev_env_tooling', 'confidence': 0.8}, 'summary': 'ok'}
+        self.assertEqual(run_job(job, lease, agent=lambda text: result), 'done')
+        triage = ComplaintTriage.objects.get(complaint_id=self.complaint.pk)
+        self.assertEqual((triage.category, triage.confidence), ('dev_env_tooling', 0.8))
+        self.assertEqual(TriageJob.objects.get().attempts, 2)
+
+    def test_agent_that_always_raises_ends_failed(self):
+        def agent(text):
+            raise RuntimeError('boom')
+
+        enqueue_triage(self.complaint.pk)
+        statuses = []
+        for _ in range(3):
+            TriageJob.objects.update(available_at=timezone.now())
+            [(job, lease)] = claim_jobs(10, max_attempts=3)
+            statuses.append(run_job(job, lease, max_attempts=3, agent=agent))
+        self.assertEqual(statuses, ['pending', 'pending', 'failed'])
+        job = TriageJob.objects.get()
+        self.assertEqual((job.attempts, job.last_error), (3, 'RuntimeError: boom'))
+        self.assertEqual(claim_jobs(10, max_attempts=3), [])
+
+    def test_expired_job_out_of_attempts_is_failed_not_reclaimed(self):
+        enqueue_triage(self.complaint.pk)
+        claim_jobs(10, visibility_timeout=timedelta(seconds=-1), max_attempts=2)  # the worker dies
+        claim_jobs(10, visibility_timeout=timedelta(seconds=-1), max_attempts=2)  # and again
+        self.assertEqual(claim_jobs(10, max_attempts=2), [])
+        job = TriageJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_stale_lease_cannot_finish_job(self):
+        enqueue_triage(self.complaint.pk)
+        [(job, lease)] = claim_jobs(10, visibility_timeout=timedelta(seconds=-1))
+        [(_, new_lease)] = claim_jobs(10)  # visibility timeout passed, another worker takes it
+        self.assertNotEqual(lease, new_lease)
+        self.assertIsNone(run_job(job, lease, agent=lambda text: {'error': 'boom'}))
+
+
+class BatchClassificationTests(TestCase):
+    TEXTS = ['pip install fails', 'git push is rejected', 'jupyter kernel dies']
+
+    def setUp(self):
+        # get_client() is built once per process, from OPENAI_BASE_URL at that moment
+        patcher = mock.patch.object(complaint_agent, '_client', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fake_client(self, *outcomes):
+        """A client whose chat.completions.create raises or answers with `outcomes` in turn."""
+        def create(**kwargs):
+            outcome = outcomes[min(create.calls, len(outcomes) - 1)]
+            create.calls += 1
+            if isinstance(outcome, Exception):
+                raise outcome
+            content = outcome if isinstance(outcome, str) else json.dumps(outcome)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+        create.calls = 0
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        return mock.patch.object(complaint_agent, 'get_client', return_value=client), create
+
+    @staticmethod
+    def _rate_limit():
+        response = httpx.Response(429, headers={'retry-after': '0'}, request=httpx.Request('POST', 'http://fake/v1'))
+        return RateLimitError('slow down', response=response, body=None)
+
+    def test_pack_is_split_into_one_result_per_complaint(self):
+        usage = BatchUsage()
+        with running_fake_openai(delay=0) as (base_url, fake), \
+                mock.patch.dict(os.environ, {'OPENAI_BASE_URL': base_url, 'OPENAI_API_KEY': 'sk-test'}):
+            results = ai_agent_batch(self.TEXTS, pack_size=3, usage=usage)
+        self.assertEqual((fake.requests, usage.requests), (1, 1))
+        self.assertEqual(results, [DEFAULT_REPLY] * 3)
+
+    def test_unusable_pack_reply_is_asked_again_per_complaint(self):
+        partial = {'results': [dict(DEFAULT_REPLY, id=0), {'id': 1, 'summary': 'no routing'}]}
+        for reply, calls in (('{"results": [', 4), (partial, 3)):
+            patcher, create = self._fake_client(reply, DEFAULT_REPLY)
+            with patcher:
+                results = ai_agent_batch(self.TEXTS, pack_size=3)
+            self.assertEqual(results, [DEFAULT_REPLY] * 3)
+            self.assertEqual(create.calls, calls)
+
+    def test_rate_limits_back_off_instead_of_fanning_out(self):
+        usage = BatchUsage()
+        patcher, create = self._fake_client(self._rate_limit(), self._rate_limit(), {'results': [
+            dict(DEFAULT_REPLY, id=i) for i in range(3)]})
+        with patcher:
+            self.assertEqual(ai_agent_batch(self.TEXTS, pack_size=3, usage=usage), [DEFAULT_REPLY] * 3)
+        self.assertEqual((create.calls, usage.rate_limited), (3, 2))
+
+        patcher, create = self._fake_client(self._rate_limit())
+        with patcher, self.assertLogs('myapp.ai.batch', 'WARNING'):
+            results = ai_agent_batch(self.TEXTS, pack_size=3)
+        self.assertEqual(create.calls, batch.MAX_RETRIES)  # the pack's retries only, none per complaint
+        self.assertTrue(all(r['error'].startswith('OpenAI API error') for r in results))
+
+    def test_backfill_resumes_from_its_checkpoint(self):
+        complaints = [
+            Complaint.objects.create(student_id=1, title=text, description='d', category='IT_Support',
+                                     created_at=timezone.now())
+            for text in self.TEXTS
+        ]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'backfill.jsonl')
+        with running_fake_openai(delay=0) as (base_url, fake), \
+                mock.patch.dict(os.environ, {'OPENAI_BASE_URL': base_url, 'OPENAI_API_KEY': 'sk-test'}):
+            call_command('backfill_ai_triage', checkpoint=path, pack_size=2, stdout=io.StringIO())
+            self.assertEqual(fake.requests, 2)
+            self.assertEqual(ComplaintTriage.objects.count(), 3)
+
+            # a crash after the checkpoint was written but before the last save, mid-way through a line
+            ComplaintTriage.objects.filter(complaint_id=complaints[-1].pk).delete()
+            with open(path, 'a', encoding='utf-8') as checkpoint:
+                checkpoint.write('{"complaint_id": 99, "res')
+            out = io.StringIO()
+            call_command('backfill_ai_triage', checkpoint=path, pack_size=2, stdout=out)
+            self.assertEqual(fake.requests, 2)  # nothing was asked again
+        self.assertIn('resuming: 3 complaints', out.getvalue())
+        self.assertEqual(set(ComplaintTriage.objects.values_list('complaint_id', flat=True)),
+                         {c.pk for c in complaints})
+
+
+class CommandExtractorTests(SimpleTestCase):
+    def test_matches_previous_implementation(self):
+        rng = random.Random(3)
+        inputs = SAMPLES + [_random_code(rng, rng.randint(1, 80), prose=rng.choice([0.0, 0.9])) for _ in range(300)]
+        for code in inputs:
+            self.assertEqual(_extract_commands_list(code), _legacy_extract_commands_list(code), code)
+
+    def test_keyword_folded_by_ignorecase_is_not_skipped(self):
+        self.assertEqual(_extract_commands_list("then \u017fudo reboot now"), ["\u017fudo reboot now"])
+
+    def test_step_index_matches_previous_scorer(self):
+        rng = random.Random(4)
+        for n_steps in (1, 3, 6, 40):
+            steps, commands = _workload(rng, n_steps, 50)
+            steps += ["", "Check the installed version.", "install"]
+            index = _StepIndex(steps)
+            for cmd in commands + ["python --version", "pip install", "the and of"]:
+                self.assertEqual(index.best_step(cmd), _legacy_best_step_idx_for_cmd(cmd, steps), cmd)
+
+
+class AsyncAgentTests(SimpleTestCase):
+    def setUp(self):
+        clear_cache()
+
+    def test_limiter_is_shared_across_event_loops(self):
+        limiter = LLMLimiter(1)
+        self.assertTrue(async_to_sync(limiter.acquire)(0))  # held by a view whose loop has ended
+        self.assertFalse(asyncio.run(limiter.acquire(0.01)))
+
+        releaser = threading.Timer(0.05, limiter.release)
+        releaser.start()
+        self.assertTrue(asyncio.run(limiter.acquire(5)))  # handed over from another thread
+        releaser.join()
+        self.assertEqual(limiter.in_use, 1)
+        limiter.release()
+        self.assertEqual(limiter.in_use, 0)
+
+    async def test_busy_when_every_slot_is_taken(self):
+        with mock.patch.object(complaint_agent, 'llm_limiter', LLMLimiter(0)), \
+                mock.patch.object(complaint_agent, 'LLM_QUEUE_TIMEOUT_S', 0.01):
+            response = await self.async_client.post(
+                reverse('student_ai_analyze'), {'text': 'pip install fails'}, content_type='application/json',
+            )
+            stream = await self.async_client.post(
+                reverse('student_ai_analyze_stream'), {'text': 'pip install fails'}, content_type='application/json',
+            )
+            events = [chunk.decode() async for chunk in stream.streaming_content]
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('busy', response.json()['error'])
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0].startswith('event: error\n'))
+        self.assertIn('"busy": true', events[0])
+
+    def test_client_is_closed_with_its_loop(self):
+        async def clients():
+            return await complaint_agent.async_client(), await complaint_agent.async_client()
+
+        with mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'sk-test'}):
+            first, again = asyncio.run(clients())
+        self.assertIs(first, again)
+        self.assertTrue(first.is_closed())
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        clear_cache()
+
+    def test_normalisation_folds_spelling_variants(self):
+        self.assertEqual(normalize_complaint('  Pip INSTALL\n\tfails '), 'pip install fails')
+        # harakat and tatweel
+        self.assertEqual(normalize_complaint('الإنْتَرْنِت لا يَعْمَل'), normalize_complaint('الإنترنـــت لا يعمل'))
+        self.assertNotEqual(normalize_complaint('pip install fails'), normalize_complaint('pip uninstall fails'))
+
+    def test_key_is_stable_and_covers_the_request(self):
+        key = cache_key('Pip install fails', model='gpt-4o-mini', max_tokens=1000)
+        self.assertEqual(key, cache_key('pip  install FAILS', model='gpt-4o-mini', temperature=0, max_tokens=1000))
+        self.assertRegex(key, r'^[0-9a-f]{64}$')
+        for other in ({'model': 'gpt-4o'}, {'temperature': 0.7}, {'max_tokens': 1200}):
+            options = {'model': 'gpt-4o-mini', 'max_tokens': 1000, **other}
+            self.assertNotEqual(cache_key('pip install fails', **options), key, other)
+
+    def test_hits_and_misses(self):
+        reply = json.dumps(DEFAULT_REPLY)
+        with mock.patch('myapp.ai.complaint_agent.ai_agent', side_effect=lambda *a, **kw: json.loads(reply)) as agent:
+            first = cached_ai_agent('pip install fails')
+            first['steps_to_apply'].clear()  # for_frontend mutates its input; the cache hands out copies
+            second = cached_ai_agent('PIP install  fails')
+            cached_ai_agent('pip install fails', temperature=0.5)
+        self.assertEqual(agent.call_count, 2)
+        self.assertEqual(agent.call_args.kwargs['temperature'], 0.5)
+        self.assertEqual(second, DEFAULT_REPLY)
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 2, 'entries': 2})
+        self.assertIn('ai_response_cache_requests_total{result="hit"} 1', registry.render().splitlines())
+
+    def test_errors_are_not_cached(self):
+        error = {'error': 'OpenAI API error: rate limited', 'raw': ''}
+        with mock.patch('myapp.ai.complaint_agent.ai_agent', return_value=error) as agent:
+            self.assertEqual(cached_ai_agent('pip install fails'), error)
+            self.assertEqual(cached_ai_agent('pip install fails'), error)
+        self.assertEqual(agent.call_count, 2)
+        self.assertEqual(cache_stats(), {'hits': 0, 'misses': 2, 'entries': 0})
+
+
+class StreamingAnalyzeTests(SimpleTestCase):
+    def setUp(self):
+        clear_cache()
+
+    def test_parser_events_do_not_depend_on_chunking(self):
+        text = json.dumps(DEFAULT_REPLY)
+        whole = list(IncrementalJSONParser().feed(text))
+        parser = IncrementalJSONParser()
+        by_char = [event for ch in text for event in parser.feed(ch)]
+        self.assertEqual(by_char, whole)
+        items = [e[2:] for e in whole if e[0] == 'item' and e[1] == 'steps_to_apply']
+        self.assertEqual(items, list(enumerate(DEFAULT_REPLY['steps_to_apply'])))
+
+    def test_parser_keeps_only_the_open_value(self):
+        reply = dict(DEFAULT_REPLY, steps_to_apply=[{'text': f'step {i}', 'commands': []} for i in range(500)])
+        text = json.dumps(reply)
+        parser, events, retained = IncrementalJSONParser(), [], 0
+        for start in range(0, len(text), 7):
+            events += parser.feed(text[start:start + 7])
+            retained = max(retained, sum(map(len, parser._pieces)))
+        self.assertEqual({e[1]: e[2] for e in events if e[0] == 'field'}, reply)
+        # the longest single value (routing), not the 500-step array
+        self.assertLess(retained, 100)
+
+    def test_parser_reports_an_incomplete_or_broken_reply(self):
+        text = json.dumps(DEFAULT_REPLY)
+        parser = IncrementalJSONParser()
+        list(parser.feed(text[:-1]))
+        self.assertFalse(parser.closed)
+        list(parser.feed(text[-1]))
+        self.assertEqual((parser.closed, parser.malformed), (True, False))
+        parser = IncrementalJSONParser()
+        events = list(parser.feed('{"summary": tru, "routing": {}}'))
+        self.assertEqual((events, parser.closed, parser.malformed), ([('field', 'routing', {})], True, True))
+
+    async def test_fragments_arrive_before_the_answer_is_complete(self):
+        with running_fake_openai(delay=0.05, chunk_chars=8, token_delay=0.01) as (base_url, _), \
+                mock.patch.dict(os.environ, {'OPENAI_BASE_URL': base_url, 'OPENAI_API_KEY': 'sk-test'}):
+            response = await self.async_client.post(
+                reverse('student_ai_analyze_stream'), {'text': 'pip install fails'}, content_type='application/json',
+            )
+            events = []
+            async for chunk in response.streaming_content:
+                event, data = chunk.decode().strip().split('\n')  # one SSE event per chunk sent
+                events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # each fragment is sent as soon as the parser closes it, in the order the model wrote them
+        self.assertEqual([name for name, _ in events], ['routing', 'summary', 'step', 'step', 'step', 'verify', 'done'])
+        steps = [data for name, data in events if name == 'step']
+        self.assertEqual([step['index'] for step in steps], [0, 1, 2])
+        self.assertEqual(events[-1][1]['ui']['steps'], [step['text'] for step in steps])
+
+
+class PreClassifierTests(SimpleTestCase):
+    TECHNICAL = ['pip install {} fails with a build error', 'python import error no module named {}',
+                 'jupyter kernel crashes when I import {}', 'git push rejected for my {} project']
+    NON_TECHNICAL = ['the AC in hostel room {} is broken', 'I paid the fee twice for semester {}',
+                     'mess food was cold on day {} again', 'the fan in classroom {} is noisy']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        words = ['numpy', 'pandas', 'flask', 'torch', 'alpha', 'beta', 'gamma', 'delta']
+        cls.examples = [
+            (template.format(word), technical)
+            for word in words
+            for technical, templates in ((True, cls.TECHNICAL), (False, cls.NON_TECHNICAL))
+            for template in templates
+        ]
+        cls.model = PreClassifier.train(cls.examples, min_df=1, epochs=30)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'model.json')
+        patcher = mock.patch.object(preclassifier, 'AI_PRECLASSIFIER_PATH', self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        preclassifier.reset_model()
+        preclassifier.reset_stats()
+        self.addCleanup(preclassifier.reset_model)
+
+    def test_separates_and_defers_when_unsure(self):
+        p_technical, known = self.model.predict('The AC in my hostel room is broken, please fix')
+        self.assertLess(p_technical, 0.1)
+        self.assertGreaterEqual(known, 2)
+        self.assertGreater(self.model.predict('pip install requests fails')[0], 0.9)
+        report = evaluate(self.model, self.examples, threshold=0.9)
+        self.assertEqual(report['technical_answered_locally'], 0)
+        self.assertGreater(report['llm_calls_saved'], 0)
+
+        self.model.save(self.path)
+        self.assertIsNone(preclassifier.preclassify('pip install requests fails'))
+        self.assertIsNone(preclassifier.preclassify('zebra quantum'))  # nothing it knows: ask the LLM
+        result = preclassifier.preclassify('The AC in my hostel room is broken, please fix')
+        self.assertEqual((result['routing']['is_technical'], result['routed_by']), (False, 'local_classifier'))
+        self.assertEqual((preclassifier_stats()['local'], preclassifier_stats()['llm']), (1, 2))
+        metrics = registry.render().splitlines()
+        self.assertIn('ai_preclassifier_requests_total{route="local"} 1', metrics)
+        self.assertIn('ai_preclassifier_requests_total{route="llm"} 2', metrics)
+        self.assertIn('ai_preclassifier_seconds_count 3', metrics)
+
+    def test_missing_model_sends_everything_to_the_llm(self):
+        self.assertIsNone(preclassifier.preclassify('The AC in my hostel room is broken'))
+        self.assertEqual(preclassifier_stats()['local'], 0)
+
+    async def test_analyze_skips_the_llm_for_obvious_non_technical(self):
+        self.model.save(self.path)
+        with mock.patch('myapp.views.cached_ai_agent_async', side_effect=AssertionError('LLM called')):
+            response = await self.async_client.post(
+                reverse('student_ai_analyze'), {'text': 'The AC in hostel room 12 is broken'},
+                content_type='application/json',
+            )
+        ui = response.json()['ui']
+        self.assertEqual((ui['is_technical'], ui['steps']), (False, []))
+        self.assertIn('type=non-technical', ui['ticket_prefill'])
+
+
+class ComplaintImportExportTests(TestCase):
+    CSV = (
+        "student_id,title,description,category,priority,status,created_at,resolved_at\n"
+        "7,Wifi down,\"No signal, since \"\"Monday\"\"\",IT_Support,High,Open,2024-03-01T09:00:00,\n"
+        "8,Broken chair,Room 12,Facilities_Logistics,,,2024-03-02 10:30,\n"
+        "9,Refund,Fees,Finance_Admin,Low,Resolved,2024-04-01T08:00:00+02:00,2024-04-03T08:00:00+02:00\n"
+    )
+
+    def test_import_validates_and_applies_defaults(self):
+        result = import_rows(read_rows(io.StringIO(self.CSV), 'csv'), batch_size=2)
+        self.assertEqual((result.imported, result.skipped), (3, 0))
+        chair = Complaint.objects.get(title='Broken chair')
+        self.assertEqual((chair.priority, chair.status), ('Medium', 'Open'))
+        self.assertEqual(Complaint.objects.get(student_id=7).description, 'No signal, since "Monday"')
+
+    def test_invalid_row_reports_its_line(self):
+        bad = self.CSV.replace('Finance_Admin', 'Parking')
+        with self.assertRaisesMessage(RowError, "line 4: category 'Parking'"):
+            import_rows(read_rows(io.StringIO(bad), 'csv'), batch_size=2)
+        self.assertEqual(Complaint.objects.count(), 2)  # the first batch was committed
+
+        result = import_rows(read_rows(io.StringIO(bad), 'csv'), skip_invalid=True, dry_run=True)
+        self.assertEqual((result.imported, result.skipped, result.errors[0].line), (2, 1, 4))
+
+    def test_jsonl_choice_of_the_wrong_type_is_a_row_error(self):
+        row = {'student_id': 7, 'title': 'Wifi', 'description': 'down', 'created_at': '2024-03-01T09:00:00'}
+        lines = [json.dumps(dict(row, category='IT_Support')),
+                 json.dumps(dict(row, category='IT_Support', priority=['High'])),
+                 json.dumps(dict(row, category={'name': 'IT_Support'}))]
+        result = import_rows(read_rows(lines, 'jsonl'), skip_invalid=True)
+        self.assertEqual((result.imported, [e.line for e in result.errors]), (1, [2, 3]))
+        self.assertIn("priority ['High'] is not one of", str(result.errors[0]))
+
+    def test_export_walks_every_row_in_chunks(self):
+        import_rows(read_rows(io.StringIO(self.CSV), 'csv'))
+        rows = list(iter_complaints(chunk_size=2))
+        self.assertEqual([r[2] for r in rows], ['Wifi down', 'Broken chair', 'Refund'])
+        lines = list(csv_lines(iter_complaints(chunk_size=2, order='-complaint_id')))
+        self.assertTrue(lines[0].startswith('complaint_id,student_id,title'))
+        self.assertIn('Refund', lines[1])
+
+        march = filter_complaints(Complaint.objects.all(), statuses=['Open'], since='2024-03-01', until='2024-03-01')
+        self.assertEqual([r[2] for r in iter_complaints(march)], ['Wifi down'])
+
+
+class QueriesExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        it_group, _ = Group.objects.get_or_create(name='it')
+        user = User.objects.create_user(username='it@example.com', email='it@example.com', password='pw')
+        user.groups.add(it_group)
+        created = timezone.make_aware(timezone.datetime(2024, 3, 1, 9))
+        Complaint.objects.create(student_id=1, title='Wifi <down> & "slow"', description='d', category='IT_Support',
+                                 status='Open', created_at=created)
+        Complaint.objects.create(student_id=2, title='VPN', description='d', category='IT_Support',
+                                 status='Resolved', created_at=created + timedelta(days=40))
+        Complaint.objects.create(student_id=3, title='Chair', description='d', category='Facilities_Logistics',
+                                 created_at=created)
+
+    def setUp(self):
+        self.client.login(username='it@example.com', password='pw')
+        self.url = reverse('dashboard_queries_export', args=['it'])
+
+    def test_csv_is_streamed_and_filtered(self):
+        response = self.client.get(self.url, {'status': 'Open', 'since': '2024-03-01', 'until': '2024-03-31'})
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="it-complaints-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Wifi <down> & ""slow""', lines[1])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        response = self.client.get(self.url, {'format': 'xlsx'})
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(workbook.testzip())
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)  # header + both IT complaints, not the chair
+        self.assertIn('Wifi &lt;down&gt; &amp; "slow"', sheet)
+
+    def test_same_access_rules_as_the_queries_page(self):
+        response = self.client.get(reverse('dashboard_queries_export', args=['maintenance']))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('dashboard_queries_export', args=['nope'])).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+
+
+class StatsRollupTests(TestCase):
+    def _complaint(self, **kwargs):
+        fields = {'student_id': 1, 'title': 't', 'description': 'd', 'category': 'IT_Support',
+                  'created_at': timezone.now(), **kwargs}
+        return Complaint.objects.create(**fields)
+
+    def test_orm_writes_keep_the_rollup_current(self):
+        first = self._complaint(priority='High')
+        second = self._complaint(status='Resolved')
+        self._complaint(category='Finance_Admin')
+        first.status = 'In Progress'
+        first.save()
+        second.priority = 'Low'
+        second.save(update_fields=['title'])  # not saved, so not counted
+        second.delete()
+
+        stats = get_dashboard_stats('IT_Support')
+        self.assertEqual((stats.total, stats.in_progress, stats.resolved, stats.by_priority['High']), (1, 1, 0, 1))
+        self.assertEqual(stats, compute_dashboard_stats('IT_Support'))
+        self.assertEqual(compare(), [])
+
+    def test_imports_are_counted_per_day(self):
+        import_rows(read_rows(io.StringIO(ComplaintImportExportTests.CSV), 'csv'), batch_size=2)
+        self.assertEqual(compare(), [])
+        trend = get_daily_trend(days=3, today=timezone.datetime(2024, 3, 2).date())
+        self.assertEqual(trend, {'labels': ['2024-02-29', '2024-03-01', '2024-03-02'],
+                                 'created': [0, 1, 1], 'resolved': [0, 0, 0]})
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        self._complaint()
+        Complaint.objects.update(status='Closed')  # QuerySet.update sends no signals
+        # the Open and Closed buckets, in both the daily and the total table
+        with self.assertRaisesMessage(CommandError, "4 rollup buckets differ"):
+            call_command('check_complaint_stats', stderr=io.StringIO())
+        rebuild()
+        self.assertEqual(compare(), [])
+        self.assertEqual(get_dashboard_stats('IT_Support').by_status['Closed'], 1)
+
+
+class StatusWorkflowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        it_group, _ = Group.objects.get_or_create(name='it')
+        user = User.objects.create_user(username='it@example.com', email='it@example.com', password='pw')
+        user.groups.add(it_group)
+
+    def _complaint(self, **kwargs):
+        fields = {'student_id': 1, 'title': 't', 'description': 'd', 'category': 'IT_Support',
+                  'created_at': timezone.now(), **kwargs}
+        return Complaint.objects.create(**fields)
+
+    def test_transitions_follow_the_state_machine(self):
+        complaint = self._complaint(priority='High')
+        self.assertEqual(transition(complaint.pk, 'In Progress', 0).version, 1)
+        resolved = transition(complaint.pk, 'Resolved', 1)
+        self.assertIsNotNone(resolved.resolved_at)
+        complaint.refresh_from_db()
+        self.assertEqual((complaint.status, complaint.version, complaint.resolved_at),
+                         ('Resolved', 2, resolved.resolved_at))
+        self.assertIsNone(transition(complaint.pk, 'In Progress', 2).resolved_at)  # reopened
+        transition(complaint.pk, 'Closed', 3)
+        with self.assertRaises(InvalidTransition):
+            transition(complaint.pk, 'Open', 4)
+        with self.assertRaises(TransitionError):
+            transition(complaint.pk, 'Done', 4)
+        with self.assertRaises(Complaint.DoesNotExist):
+            transition(complaint.pk, 'Open', 4, category='Finance_Admin')
+        self.assertEqual(get_dashboard_stats('IT_Support').by_status['Closed'], 1)
+        self.assertEqual(compare(), [])
+
+    def test_stale_version_is_refused(self):
+        complaint = self._complaint()
+        transition(complaint.pk, 'Resolved', 0)
+        with self.assertRaises(StaleComplaint) as caught:
+            transition(complaint.pk, 'In Progress', 0)  # a second page still showing version 0
+        self.assertEqual((caught.exception.version, caught.exception.status), (1, 'Resolved'))
+        self.assertEqual(Complaint.objects.get(pk=complaint.pk).status, 'Resolved')
+
+    def test_bulk_transition(self):
+        open_ones = [self._complaint().pk for _ in range(5)]
+        closed = self._complaint(status='Closed').pk
+        elsewhere = self._complaint(category='Finance_Admin').pk
+        result = bulk_transition([*open_ones, closed, elsewhere, 10 ** 6], 'Resolved', category='IT_Support', chunk_size=2)
+        self.assertEqual((result.updated, result.skipped), (5, [closed, elsewhere, 10 ** 6]))
+        rows = Complaint.objects.filter(pk__in=open_ones).values_list('status', 'version', 'resolved_at')
+        self.assertEqual({(status, version) for status, version, _ in rows}, {('Resolved', 1)})
+        self.assertTrue(all(resolved_at is not None for _, _, resolved_at in rows))
+        self.assertEqual(compare(), [])
+
+    def test_bulk_transition_over_several_chunks_keeps_the_rollup(self):
+        now = timezone.now()
+        complaints = [
+            Complaint(student_id=1, title='t', description='d', category='IT_Support',
+                      status=('Open', 'In Progress', 'Closed')[i % 3], priority=('Low', 'High')[i % 2],
+                      created_at=now - timedelta(days=i % 3))
+            for i in range(BULK_CHUNK_SIZE + 200)
+        ]
+        Complaint.objects.bulk_create(complaints)
+        record_created((c.category, c.status, c.priority, c.created_at) for c in complaints)
+        ids = list(Complaint.objects.values_list('pk', flat=True))
+        result = bulk_transition(ids, 'Resolved')
+        closed = len(complaints) // 3
+        self.assertEqual((result.updated, len(result.skipped)), (len(complaints) - closed, closed))
+        self.assertEqual(get_dashboard_stats('IT_Support').by_status['Resolved'], len(complaints) - closed)
+        self.assertEqual(compare(), [])
+
+    def test_views(self):
+        self.client.login(username='it@example.com', password='pw')
+        complaint = self._complaint()
+        url = reverse('dashboard_complaint_transition', args=['it', complaint.pk])
+        response = self.client.post(url, {'status': 'In Progress', 'version': 0})
+        self.assertEqual(response.json()['version'], 1)
+        response = self.client.post(url, json.dumps({'status': 'Resolved', 'version': 0}),
+                                    content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['version']), (409, 1))
+        self.assertEqual(self.client.post(url, {'status': 'Open'}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        other = reverse('dashboard_complaint_transition', args=['maintenance', complaint.pk])
+        self.assertRedirects(self.client.post(other, {'status': 'Resolved', 'version': 1}),
+                             reverse('login'), fetch_redirect_response=False)
+
+        bulk = reverse('dashboard_queries_bulk_transition', args=['it'])
+        response = self.client.post(bulk, {'status': 'Resolved', 'complaint_id': [complaint.pk, 10 ** 6]})
+        self.assertEqual(response.json(), {'updated': 1, 'skipped': [10 ** 6]})
+
+
+class SlaAnalyticsTests(TestCase):
+    def setUp(self):
+        self.now = timezone.make_aware(timezone.datetime(2024, 6, 1, 12))
+
+    def _complaint(self, priority, status, age_hours, resolved_after_hours=None, category='IT_Support'):
+        created = self.now - timedelta(hours=age_hours)
+        resolved = created + timedelta(hours=resolved_after_hours) if resolved_after_hours is not None else None
+        return Complaint.objects.create(student_id=1, title='t', description='d', category=category,
+                                        priority=priority, status=status, created_at=created, resolved_at=resolved)
+
+    def test_sketch_quantiles_are_within_the_relative_accuracy(self):
+        rng = random.Random(17)
+        values = sorted(rng.lognormvariate(10, 2) for _ in range(20000))
+        halves = QuantileSketch(0.01), QuantileSketch(0.01)
+        for i, value in enumerate(values):
+            halves[i % 2].add(value)
+        sketch = halves[0]
+        sketch.merge(halves[1])
+        for q in (0.01, 0.5, 0.9, 0.99, 0.999):
+            exact = values[max(math.ceil(q * len(values)) - 1, 0)]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, 0.01, q)
+        self.assertLess(len(sketch.buckets), 2000)
+
+    def test_resolution_percentiles_and_breaches(self):
+        for hours in (2, 4, 6, 30):  # Critical target is 24 hours
+            self._complaint('Critical', 'Resolved', age_hours=100, resolved_after_hours=hours)
+        self._complaint('Low', 'Closed', age_hours=100, resolved_after_hours=10, category='Finance_Admin')
+        self._complaint('Critical', 'Open', age_hours=100)
+
+        report = resolution_report(self.now - timedelta(days=30), self.now, categories=['IT_Support'], chunk_size=2)
+        self.assertEqual(report['overall']['count'], 4)
+        self.assertEqual(report['overall']['breaches'], 1)
+        self.assertAlmostEqual(report['overall']['p50_hours'], 4, delta=0.04)
+        self.assertAlmostEqual(report['overall']['p99_hours'], 30, delta=0.3)
+        self.assertEqual(list(report['by_category']), ['IT_Support'])
+
+    def test_backlog_age_bins_and_overdue(self):
+        self._complaint('Critical', 'Open', age_hours=2)
+        self._complaint('Critical', 'In Progress', age_hours=30)  # past the 24 hour target
+        self._complaint('Low', 'Open', age_hours=24 * 40)
+        self._complaint('Low', 'Resolved', age_hours=24 * 40, resolved_after_hours=1)
+
+        report = backlog_report(now=self.now)
+        groups = {row['priority']: row for row in report['groups']}
+        self.assertEqual(groups['Critical']['bins'], [1, 1, 0, 0, 0, 0])
+        self.assertEqual(groups['Critical']['overdue'], 1)
+        self.assertEqual(groups['Low']['bins'], [0, 0, 0, 0, 0, 1])
+        self.assertEqual(report['by_category']['IT_Support']['total'], 3)
+
+    def test_endpoints_are_panel_only(self):
+        panel, _ = Group.objects.get_or_create(name='panel')
+        user = User.objects.create_user(username='p@example.com', email='p@example.com', password='pw')
+        user.groups.add(panel)
+        self._complaint('High', 'Resolved', age_hours=10, resolved_after_hours=5)
+        self.client.login(username='p@example.com', password='pw')
+
+        response = self.client.get(reverse('panel_analytics_resolution'), {'since': '2024-05-01', 'until': '2024-06-01'})
+        self.assertEqual(response.json()['overall']['count'], 1)
+        self.assertEqual(self.client.get(reverse('panel_analytics_backlog')).json()['groups'], [])
+        self.assertEqual(self.client.get(reverse('panel_analytics_backlog'), {'category': 'Parking'}).status_code, 400)
+
+        user.groups.remove(panel)
+        response = self.client.get(reverse('panel_analytics_resolution'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+
+class ComplaintSearchTests(TestCase):
+    def setUp(self):
+        reset_search_index()  # SQLite reuses the ids of rolled-back rows between tests
+        now = timezone.now()
+        rows = [
+            ('Projector broken', 'The projector in room 12 shows no picture.', 'Open'),
+            ('Wifi down', 'No projector needed, but the wifi in the library is down.', 'Open'),
+            ('Projector remote', 'Remote for the projectors is missing.', 'Resolved'),
+            ('Chair', 'A broken chair in room 12.', 'Open'),
+        ]
+        self.complaints = [
+            Complaint.objects.create(student_id=1, title=title, description=description, category='IT_Support',
+                                     status=status, created_at=now - timedelta(hours=i))
+            for i, (title, description, status) in enumerate(rows)
+        ]
+
+    def test_ranking_prefixes_and_filters(self):
+        hits, more = search_complaints('projector')
+        # "projectors" matches as a prefix too; a word in the title outweighs one in the description
+        self.assertEqual({c.title for c in hits[:2]}, {'Projector broken', 'Projector remote'})
+        self.assertEqual(hits[2].title, 'Wifi down')
+        self.assertFalse(more)
+        # every word is required; short words and stopwords are ignored
+        self.assertEqual([c.title for c in search_complaints('the broken room 12')[0]], ['Projector broken', 'Chair'])
+        hits, more = search_complaints('proj', Complaint.objects.filter(status='Open'), limit=1)
+        self.assertEqual((len(hits), more), (1, True))
+        self.assertEqual(search_complaints('a of')[0], [])
+
+    def test_edits_are_reindexed(self):
+        search_complaints('chair')
+        chair = self.complaints[3]
+        chair.description = 'A wobbly stool.'
+        chair.save()
+        self.assertEqual(search_complaints('chair')[0], [chair])  # still in the title
+        self.assertEqual(search_complaints('broken room')[0], [self.complaints[0]])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        text = 'x' * 300 + ' <b>projector</b> fails' + 'y' * 300
+        snippet = highlight(text, ['proj'], max_chars=100)
+        self.assertIn('&lt;b&gt;<mark>projector</mark>&lt;/b&gt;', snippet)
+        self.assertTrue(snippet.startswith('…') and snippet.endswith('…'))
+
+    def test_queries_page_search(self):
+        it_group, _ = Group.objects.get_or_create(name='it')
+        user = User.objects.create_user(username='it@example.com', email='it@example.com', password='pw')
+        user.groups.add(it_group)
+        self.client.login(username='it@example.com', password='pw')
+        response = self.client.get(reverse('dashboard_it_queries'), {'q': 'projector', 'status': 'Open', 'page_size': 1})
+        self.assertEqual([c.title for c in response.context['complaints']], ['Projector broken'])
+        self.assertContains(response, '<mark>Projector</mark> broken')
+        self.assertContains(response, '?cursor=1&amp;q=projector&amp;status=Open')
+
+
+class DuplicateDetectionTests(TestCase):
+    OUTAGE = ('WiFi not working in hostel block B',
+              'The WiFi in hostel block B has been down since morning. Nobody on floor 2 can connect.')
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'duplicate-index.bin')
+        settings_override = override_settings(DUPLICATE_INDEX_PATH=self.path, DUPLICATE_INDEX_SAVE_EVERY=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_duplicate_index()  # SQLite reuses the ids of rolled-back rows between tests
+        self.addCleanup(reset_duplicate_index)
+        DuplicateIndex().save(self.path)  # as rebuild_duplicate_index leaves it at deploy time
+
+    def _complaint(self, title, description, category='IT_Support'):
+        return Complaint.objects.create(student_id=1, title=title, description=description, category=category,
+                                        created_at=timezone.now())
+
+    def test_near_duplicates_are_clustered(self):
+        root = self._complaint(*self.OUTAGE)
+        self.assertIsNone(check_new_complaint(root.pk))
+        # case, punctuation, a typo and a greeting don't hide a duplicate
+        copy = self._complaint('wifi NOT working in hostel block B!!',
+                               'Hi, the WiFi in hostel block B has been down since mornign. Nobody on floor 2 can connect')
+        other = self._complaint('Printer jammed', 'The printer in lab 3 eats every page.')
+        elsewhere = self._complaint(*self.OUTAGE, category='Facilities_Logistics')
+        match = check_new_complaint(copy.pk)
+        self.assertEqual(match[0], root.pk)
+        self.assertGreaterEqual(match[1], 0.5)
+        # caught up together with `copy`: neither is a duplicate (other text, other department)
+        self.assertEqual(list(ComplaintDuplicate.objects.values_list('complaint_id', flat=True)), [copy.pk])
+        self.assertIsNone(check_new_complaint(other.pk))
+        self.assertIsNone(check_new_complaint(elsewhere.pk))
+
+        clusters = duplicate_clusters('IT_Support')
+        self.assertEqual([(c['complaint'], c['reports']) for c in clusters], [(root, 2)])
+        self.assertEqual(duplicate_clusters('Facilities_Logistics'), [])
+        copy.delete()
+        self.assertEqual(duplicate_clusters('IT_Support'), [])
+
+    def test_index_is_persisted_and_reloaded(self):
+        root = self._complaint(*self.OUTAGE)
+        self._complaint('Printer jammed', 'The printer in lab 3 eats every page.')
+        self.assertEqual(rebuild_index(), (2, 2))
+        index = DuplicateIndex()
+        self.assertTrue(index.load(self.path))
+        self.assertEqual((len(index), index.high_water), (2, root.pk + 1))
+        self.assertEqual(index.query('IT_Support', signature(*self.OUTAGE)), (root.pk, 1.0))
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(40)
+        self.assertFalse(index.load(self.path))
+        self.assertEqual(len(index), 0)
+
+    def test_a_late_commit_below_the_high_water_mark_is_checked(self):
+        root = Complaint.objects.create(complaint_id=100, student_id=1, title=self.OUTAGE[0],
+                                        description=self.OUTAGE[1], category='IT_Support', created_at=timezone.now())
+        self.assertIsNone(check_new_complaint(root.pk))
+        # a transaction that took id 50 commits after 100 has been seen
+        late = Complaint.objects.create(complaint_id=50, student_id=1, title=self.OUTAGE[0],
+                                        description=self.OUTAGE[1], category='IT_Support', created_at=timezone.now())
+        self.assertEqual(check_new_complaint(late.pk), (root.pk, 1.0))
+        with self.assertNumQueries(1):  # nothing left to read: one query, no flags written
+            self.assertIsNone(check_new_complaint(late.pk))
+
+    def test_cold_start_leaves_the_window_to_the_rebuild(self):
+        old = Complaint.objects.create(student_id=1, title=self.OUTAGE[0], description=self.OUTAGE[1],
+                                       category='IT_Support', created_at=timezone.now() - timedelta(days=2))
+        new = self._complaint(*self.OUTAGE)
+        os.unlink(self.path)
+        with self.assertLogs('myapp.duplicates', 'WARNING'), self.assertNumQueries(2):
+            self.assertIsNone(check_new_complaint(new.pk))
+        self.assertFalse(ComplaintDuplicate.objects.exists())
+        self.assertEqual(rebuild_index(), (2, 1))
+        self.assertEqual(ComplaintDuplicate.objects.get().cluster_id, old.pk)
+
+    def test_eviction_keeps_buckets_consistent(self):
+        index = DuplicateIndex(max_entries=2)
+        for i, text in enumerate(['alpha beta gamma delta', 'epsilon zeta eta theta', 'iota kappa lambda mu']):
+            index.observe(i + 1, 'IT_Support', text, '')
+        self.assertEqual(list(index.entries), [2, 3])
+        self.assertNotIn(1, {i for ids in index.buckets.values() for i in ids})
+        self.assertIsNone(index.query('IT_Support', signature('alpha beta gamma delta', '')))
+
+    def test_submission_tells_the_student(self):
+        User.objects.create_user(username='s@example.com', email='s@example.com', password='pw')
+        Student.objects.create(student_id=42, name='S', email='s@example.com')
+        root = self._complaint(*self.OUTAGE)
+        self.client.login(username='s@example.com', password='pw')
+        response = self.client.post(reverse('student_new_query'), {
+            'title': self.OUTAGE[0], 'description': self.OUTAGE[1], 'category': 'IT_Support', 'priority': 'High',
+        }, follow=True)
+        notes = [str(m) for m in response.context['messages']]
+        self.assertTrue(any(f'A very similar complaint (#{root.pk})' in note for note in notes), notes)
+        self.assertEqual(ComplaintDuplicate.objects.get().cluster_id, root.pk)
+
+
+@mock.patch('myapp.live.close_old_connections', lambda: None)  # as the test client skips it for requests
+class LiveDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        it_group, _ = Group.objects.get_or_create(name='it')
+        user = User.objects.create_user(username='it@example.com', email='it@example.com', password='pw')
+        user.groups.add(it_group)
+        cls.old = Complaint.objects.create(student_id=1, title='Old', description='d', category='IT_Support',
+                                           status='Open', created_at=timezone.now())
+
+    def setUp(self):
+        self.client.login(username='it@example.com', password='pw')
+        self.cookie = f'sessionid={self.client.cookies["sessionid"].value}'
+        interval, live.broadcaster.interval = live.broadcaster.interval, 0.01
+        self.addCleanup(setattr, live.broadcaster, 'interval', interval)
+
+    def _connect(self, department='it', cookie=None, query_string='', origin=None):
+        return DashboardConnection(live.websocket_application, f'/ws/dashboard/{department}/',
+                                   self.cookie if cookie is None else cookie, query_string,
+                                   headers=[(b'origin', origin)] if origin else ())
+
+    def test_channel_layer_is_bounded(self):
+        async def scenario():
+            layer = InMemoryChannelLayer(capacity=3)
+            slow, fast = layer.new_channel(), layer.new_channel()
+            layer.group_add('g', slow)
+            layer.group_add('g', fast)
+            self.assertEqual(layer.group_send('g', {'n': 1}), 2)
+            self.assertEqual(await layer.receive(fast), {'n': 1})
+            layer.group_send('g', {'n': 2})
+            self.assertEqual(layer.group_send('g', {'n': 3}), 1)  # `slow` is full: it gets the marker instead
+            self.assertEqual([await layer.receive(fast) for _ in range(2)], [{'n': 2}, {'n': 3}])
+            self.assertEqual(layer.group_send('g', {'n': 4}), 1)
+            self.assertEqual([await layer.receive(slow) for _ in range(3)], [{'n': 1}, {'n': 2}, live._OVERFLOW])
+            layer.group_discard('g', slow)
+            self.assertEqual(layer.groups, {'g': {fast}})
+
+        async_to_sync(scenario)()
+
+    def test_stats_changes_are_per_category_deltas(self):
+        old = {('IT_Support', 'Open', 'High'): 2, ('Maintenance', 'Open', 'Low'): 1}
+        new = {('IT_Support', 'Open', 'High'): 1, ('IT_Support', 'Resolved', 'High'): 1,
+               ('Maintenance', 'Open', 'Low'): 1}
+        self.assertEqual(stats_changes(old, new), {
+            'IT_Support': {'total': 0, 'by_status': {'Open': -1, 'Resolved': 1}, 'by_priority': {}},
+        })
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_rejected_without_access(self):
+        async def scenario():
+            for department, cookie, code in [('it', '', live.CLOSE_FORBIDDEN), ('rector', None, live.CLOSE_FORBIDDEN),
+                                             ('nope', None, live.CLOSE_NOT_FOUND)]:
+                connection = self._connect(department, cookie)
+                self.assertEqual(await connection.connect(), {'type': 'websocket.close', 'code': code})
+            # another site's page can't borrow the session cookie
+            connection = self._connect(origin='https://evil.example')
+            self.assertEqual(await connection.connect(), {'type': 'websocket.close', 'code': live.CLOSE_FORBIDDEN})
+
+        async_to_sync(scenario)()
+
+    def test_new_complaints_and_status_changes_are_pushed(self):
+        async def scenario():
+            connection = self._connect(query_string='since=0')
+            self.assertEqual((await connection.connect())['type'], 'websocket.accept')
+            _, hello = await connection.receive()
+            self.assertEqual((hello['type'], hello['total'], hello['by_status']['Open']), ('stats', 1, 1))
+            _, replayed = await connection.receive()
+            self.assertEqual(replayed['complaint']['complaint_id'], self.old.pk)
+
+            new = await sync_to_async(Complaint.objects.create)(
+                student_id=2, title='VPN down', description='d', category='IT_Support', priority='High',
+                status='Open', created_at=timezone.now())
+            await sync_to_async(Complaint.objects.create)(
+                student_id=3, title='Chair', description='d', category='Facilities_Logistics',
+                created_at=timezone.now())
+            messages = [(await connection.receive())[1] for _ in range(2)]
+            self.assertEqual(messages[0]['type'], 'complaint.created')
+            self.assertEqual((messages[0]['complaint']['complaint_id'], messages[0]['complaint']['title']),
+                             (new.pk, 'VPN down'))
+            self.assertEqual(messages[1], {'type': 'stats.changed', 'total': 1,
+                                           'by_status': {'Open': 1}, 'by_priority': {'High': 1}})
+
+            self.old.status = 'Resolved'
+            await sync_to_async(self.old.save)()
+            _, updated = await connection.receive()
+            self.assertEqual(updated, {'type': 'complaint.updated', 'complaint_id': self.old.pk,
+                                       'status': 'Resolved', 'priority': self.old.priority})
+            _, moved = await connection.receive()
+            self.assertEqual(moved['by_status'], {'Open': -1, 'Resolved': 1})
+            # transitions update behind the ORM's signals and log the change themselves
+            await sync_to_async(bulk_transition)([self.old.pk, new.pk], 'Closed')
+            updates = [(await connection.receive())[1] for _ in range(2)]
+            self.assertEqual([(u['type'], u['complaint_id'], u['status']) for u in updates],
+                             [('complaint.updated', self.old.pk, 'Closed'), ('complaint.updated', new.pk, 'Closed')])
+            _, moved = await connection.receive()
+            self.assertEqual(moved['by_status'], {'Resolved': -1, 'Open': -1, 'Closed': 2})
+            await connection.disconnect()
+            self.assertEqual(live.broadcaster.subscribers, 0)
+            self.assertEqual(live.channel_layer.groups, {})
+
+        async_to_sync(scenario)()
+
+    def test_a_late_commit_is_pushed_and_a_replayed_row_is_not_repeated(self):
+        def create(complaint_id, title):
+            return Complaint.objects.create(complaint_id=complaint_id, student_id=2, title=title, description='d',
+                                            category='IT_Support', created_at=timezone.now())
+
+        async def scenario():
+            connection = self._connect(query_string='since=0')
+            await connection.connect()
+            await connection.receive()  # stats
+            _, replayed = await connection.receive()
+            # the broadcaster queues the replayed row as well: the connection drops its copy
+            row = await sync_to_async(lambda: Complaint.objects.values('pk', *live.COMPLAINT_FIELDS).get(pk=self.old.pk))()
+            live.broadcaster.publish([row], live.broadcaster.totals)
+
+            newer = await sync_to_async(create)(self.old.pk + 10, 'Newer')
+            messages = [(await connection.receive())[1] for _ in range(2)]
+            self.assertEqual([m['type'] for m in messages], ['complaint.created', 'stats.changed'])
+            self.assertEqual(messages[0]['complaint']['complaint_id'], newer.pk)
+            # a transaction that took a lower id commits after `newer` was pushed
+            late = await sync_to_async(create)(self.old.pk + 5, 'Late')
+            _, message = await connection.receive()
+            self.assertEqual((message['type'], message['complaint']['title']), ('complaint.created', 'Late'))
+            self.assertEqual(late.pk, message['complaint']['complaint_id'])
+            _, message = await connection.receive()
+            self.assertEqual(message['type'], 'stats.changed')
+            await connection.disconnect()
+
+        async_to_sync(scenario)()
@@ -0,0 +1,152 @@
+"""
+Database-backed queue for AI triage of submitted complaints.
+
+Life cycle of a TriageJob:
+  pending --claim--> running --ok--> done
+                        |--error--> pending (available_at pushed out with exponential backoff)
+                        |--error, attempts exhausted--> failed
+An agent that raises counts as an error like one that returns {'error': ...}.
+A running job whose locked_until has passed (worker died, visibility timeout)
+is claimable again, or failed if it has used up its attempts. Every claim gets
+a fresh lease so a late worker can't overwrite the outcome of the one that
+took over.
+"""
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Complaint, ComplaintTriage, TriageJob
+
+DEFAULT_VISIBILITY_TIMEOUT = timedelta(minutes=2)
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 15 * 60
+DEFAULT_ENQUEUE_WINDOW_DAYS = 7
+
+
+def enqueue_triage(complaint_id):
+    """Queue a complaint for triage; enqueueing the same complaint twice is a no-op."""
+    try:
+        with transaction.atomic():
+            TriageJob.objects.get_or_create(complaint_id=complaint_id)
+    except IntegrityError:
+        pass  # a concurrent enqueue won the race
+
+
+def enqueue_new_complaints(limit=500):
+    """
+    Queue recent complaints that have no TriageJob, whichever path inserted them (imports,
+    manual SQL, other writers). Only the last TRIAGE_ENQUEUE_WINDOW_DAYS are looked at, so a
+    first deploy doesn't send the table's whole history to the LLM; that is backfill_ai_triage's job.
+    """
+    since = timezone.now() - timedelta(days=getattr(settings, 'TRIAGE_ENQUEUE_WINDOW_DAYS', DEFAULT_ENQUEUE_WINDOW_DAYS))
+    ids = list(
+        Complaint.objects.filter(created_at__gte=since)
+        .exclude(complaint_id__in=TriageJob.objects.values('complaint_id'))
+        .order_by('complaint_id')
+        .values_list('complaint_id', flat=True)[:limit]
+    )
+    TriageJob.objects.bulk_create([TriageJob(complaint_id=i) for i in ids], ignore_conflicts=True)
+    return len(ids)
+
+
+def claim_jobs(limit, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Atomically take up to `limit` due jobs, returning (job, lease) pairs. Expired running
+    jobs that have had `max_attempts` claims are marked failed instead of leased again.
+    """
+    now = timezone.now()
+    due = Q(status='pending', available_at__lte=now) | Q(status='running', locked_until__lt=now)
+    claimed = []
+    with transaction.atomic():
+        TriageJob.objects.filter(status='running', locked_until__lt=now, attempts__gte=max_attempts).update(
+            status='failed', locked_until=None, updated_at=now,
+            last_error='the worker running the last attempt died or timed out',
+        )
+        jobs = list(
+            TriageJob.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('available_at')[:limit]
+        )
+        for job in jobs:
+            lease = uuid.uuid4().hex
+            TriageJob.objects.filter(pk=job.pk).update(
+                status='running', lease=lease, attempts=job.attempts + 1,
+                locked_until=now + visibility_timeout, updated_at=now,
+            )
+            job.status, job.lease, job.attempts = 'running', lease, job.attempts + 1
+            claimed.append((job, lease))
+    return claimed
+
+
+def save_triage(complaint_id, result):
+    """Store an agent result for a complaint; saving the same complaint again overwrites it."""
+    routing = result.get('routing') or {}
+    ComplaintTriage.objects.update_or_create(
+        complaint_id=complaint_id,
+        defaults={
+            'is_technical': bool(routing.get('is_technical', False)),
+            'category': routing.get('category') or '',
+            'confidence': routing.get('confidence'),
+            'summary': result.get('summary') or '',
+            'raw': result,
+        },
+    )
+
+
+def complaint_text(complaint):
+    return f"{complaint.title}\n\n{complaint.description}".strip()
+
+
+def _backoff(attempts):
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _finish(owned, **fields):
+    # .update() skips auto_now, so stamp updated_at by hand
+    return owned.update(locked_until=None, updated_at=timezone.now(), **fields)
+
+
+def run_job(job, lease, *, max_attempts=DEFAULT_MAX_ATTEMPTS, agent=None):
+    """Triage one claimed job. Returns the final status written, or None if the lease was lost."""
+    if agent is None:
+        from myapp.ai.response_cache import cached_ai_agent as agent
+
+    owned = TriageJob.objects.filter(pk=job.pk, lease=lease)
+    if ComplaintTriage.objects.filter(complaint_id=job.complaint_id).exists():
+        # already triaged (e.g. a previous run finished but died before marking the job)
+        return 'done' if _finish(owned, status='done', last_error='') else None
+
+    complaint = Complaint.objects.filter(pk=job.complaint_id).first()
+    if complaint is None:
+        error = 'complaint no longer exists'
+        result = None
+    else:
+        try:
+            result = agent(complaint_text(complaint))
+        except Exception as exc:
+            result = {'error': f'{type(exc).__name__}: {exc}'}
+        error = result.get('error') if isinstance(result, dict) else 'agent returned no result'
+
+    if error:
+        if job.attempts >= max_attempts or complaint is None:
+            status = 'failed'
+            updated = _finish(owned, status=status, last_error=str(error))
+        else:
+            status = 'pending'
+            updated = _finish(
+                owned, status=status, last_error=str(error),
+                available_at=timezone.now() + _backoff(job.attempts),
+            )
+        return status if updated else None
+
+    with transaction.atomic():
+        save_triage(job.complaint_id, result)
+        updated = _finish(owned, status='done', last_error='')
+    return 'done' if updated else None
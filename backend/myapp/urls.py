@@ -19,6 +19,8 @@ urlpatterns = [
     path('dashboard/panel/', views.dashboard_panel, name='panel_dashboard'),
     path('dashboard/panel/members/', views.dashboard_panel_members, name='panel_members'),
     path('dashboard/panel/queries/', views.dashboard_panel_queries, name='panel_queries'),
+    path('dashboard/panel/analytics/resolution/', views.panel_analytics_resolution, name='panel_analytics_resolution'),
+    path('dashboard/panel/analytics/backlog/', views.panel_analytics_backlog, name='panel_analytics_backlog'),
     path('dashboard/admin/', views.dashboard_admin, name='dashboard_admin'),
     path('dashboard/admin/members/', views.dashboard_admin_members, name='dashboard_admin_members'),
     path('dashboard/admin/queries/', views.dashboard_admin_queries, name='dashboard_admin_queries'),
@@ -34,5 +36,10 @@ urlpatterns = [
     path('dashboard/it/', views.dashboard_it, name='dashboard_it'),
     path('dashboard/it/members/', views.dashboard_it_members, name='dashboard_it_members'),
     path('dashboard/it/queries/', views.dashboard_it_queries, name='dashboard_it_queries'),
+    path('dashboard/<str:department>/queries/export/', views.dashboard_queries_export, name='dashboard_queries_export'),
+    path('dashboard/<str:department>/queries/status/', views.dashboard_queries_bulk_transition, name='dashboard_queries_bulk_transition'),
+    path('dashboard/<str:department>/queries/<int:complaint_id>/status/', views.dashboard_complaint_transition, name='dashboard_complaint_transition'),
     path("student/ai/analyze/", views.ai_analyze, name="student_ai_analyze"),
+    path("student/ai/analyze/stream/", views.ai_analyze_stream, name="student_ai_analyze_stream"),
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,85 +1,121 @@
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
+from django.conf import settings
 from django.contrib.auth.models import Group, User
-from django.db import connection
+from django.db import connection, transaction
 from django.shortcuts import redirect, render
 from django.utils import timezone
-from .models import Complaint, Student
-from django.http import JsonResponse, HttpResponseBadRequest
+from .complaint_io import EXPORT_COLUMNS, buffered, csv_lines, filter_complaints, iter_complaints, parse_bound
+from .dashboard_stats import get_category_totals, get_daily_trend, get_dashboard_stats
+from .db_routing import read_database
+from .duplicates import check_new_complaint, duplicate_clusters
+from .instrumentation import registry
+from .models import Complaint
+from .pagination import KeysetPage, get_page_size, paginate_complaints
+from .roles import QUERIES_CATEGORY, dashboard_url_name, require_department, require_login
+from .search import annotate_hits, search_complaints
+from .sla_analytics import backlog_report, default_window, resolution_report
+from .stats_rollup import record_created
+from .students import get_student_for_user
+from .triage import enqueue_triage
+from .workflow import StaleComplaint, TransitionError, bulk_transition, transition
+from .xlsx_stream import stream_xlsx
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse,
+)
 from django.views.decorators.http import require_POST
-from myapp.ai.complaint_agent import ai_agent, for_frontend
+from urllib.parse import urlencode
+from myapp.ai.response_cache import cached_ai_agent_async
+import itertools
 import json
+from dataclasses import asdict
 
 # Profile settings views for each department
+@require_department('panel')
 def panel_profile_settings(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='panel').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/panel/panel-profile-settings.html')
 
+@require_department('admin')
 def admin_profile_settings(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/admin/admin-profile-settings.html')
 
+@require_department('warden')
 def warden_profile_settings(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='warden').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/warden/warden-profile-settings.html')
 
+@require_department('rector')
 def rector_profile_settings(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='rector').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/rector/rector-profile-settings.html')
 
+@require_department('maintenance')
 def maintenance_profile_settings(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='maintenance').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/maintenance/maintenance-profile-settings.html')
 
+@require_department('it')
 def it_profile_settings(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='it').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/it/it-profile-settings.html')
 
 # Panel (Data Analyst) Dashboards
+@require_department('panel')
 def dashboard_panel(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='panel').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     complaints = Complaint.objects.filter(category='Finance_Admin').order_by('-created_at')
-    pending_queries = complaints.filter(status='Open').count()
-    in_progress_queries = complaints.filter(status='In Progress').count()
-    resolved_queries = complaints.filter(status='Resolved').count()
-    return render(request, 'dashboards/panel/panel-dashboard.html', {'complaints': complaints, 'pending_queries': pending_queries, 'in_progress_queries': in_progress_queries, 'resolved_queries': resolved_queries})
+    stats = get_dashboard_stats('Finance_Admin')
+    # charts cover every department, read from the stats rollup rather than the complaints table
+    labels = dict(Complaint.CATEGORY_CHOICES)
+    workload = get_category_totals()
+    charts = {
+        'trend': get_daily_trend(days=7),
+        'workload': {'labels': [labels[c] for c in workload], 'counts': list(workload.values())},
+    }
+    return render(request, 'dashboards/panel/panel-dashboard.html', {
+        'complaints': complaints, 'charts': charts, 'duplicate_clusters': duplicate_clusters('Finance_Admin'),
+        **stats.as_context(),
+    })
 
+@require_department('panel')
 def dashboard_panel_members(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='panel').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/panel/panel-members.html')
 
+@require_department('panel')
 def dashboard_panel_queries(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='panel').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     # Panel handles Finance & Admin category
-    complaints = Complaint.objects.filter(category='Finance_Admin').order_by('-created_at')
-    return render(request, 'dashboards/panel/panel-queries.html', {'complaints': complaints})
+    return render(request, 'dashboards/panel/panel-queries.html', _queries_context(request, 'Finance_Admin'))
+
+def _analytics_categories(request):
+    categories = [c for c in request.GET.getlist('category') if c]
+    valid = {value for value, _ in Complaint.CATEGORY_CHOICES}
+    if not set(categories) <= valid:
+        raise ValueError(f"category must be among {', '.join(sorted(valid))}")
+    return categories
+
+@require_department('panel')
+def panel_analytics_resolution(request):
+    # ?since=&until= (ISO date or datetime, default the last 30 days) &category=... (repeatable)
+    since, until = default_window()
+    try:
+        categories = _analytics_categories(request)
+        if request.GET.get('since'):
+            since = parse_bound(request.GET['since'])
+        if request.GET.get('until'):
+            until = parse_bound(request.GET['until'], end=True)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    return JsonResponse(resolution_report(since, until, categories=categories))
+
+@require_department('panel')
+def panel_analytics_backlog(request):
+    try:
+        categories = _analytics_categories(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    return JsonResponse(backlog_report(categories=categories))
+
+
+def metrics(request):
+    """Per-view request histograms (myapp/instrumentation.py) for Prometheus, from METRICS_ALLOWED_IPS only."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 def logout_view(request):
@@ -89,33 +125,22 @@ def logout_view(request):
 
 def login_view(request):
     if request.user.is_authenticated:
-        return redirect_user_dashboard(request.user)
+        return redirect_user_dashboard(request)
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
-            return redirect_user_dashboard(user)
+            return redirect_user_dashboard(request)
         else:
             messages.error(request, 'Invalid username or password.')
     return render(request, 'login.html')
 
 # Helper function to redirect user to the correct dashboard based on group
 
-def redirect_user_dashboard(user):
-    if user.groups.filter(name='it').exists():
-        return redirect('dashboard_it')
-    elif user.groups.filter(name='rector').exists():
-        return redirect('dashboard_rector')
-    elif user.groups.filter(name='maintenance').exists():
-        return redirect('dashboard_maintenance')
-    elif user.groups.filter(name='warden').exists():
-        return redirect('dashboard_warden')
-    elif user.groups.filter(name='panel').exists():
-        return redirect('panel_dashboard')
-    else:
-        return redirect('student_dashboard')
+def redirect_user_dashboard(request):
+    return redirect(dashboard_url_name(request))
 
 def signup_view(request):
     if request.user.is_authenticated:
@@ -137,32 +162,25 @@ def signup_view(request):
         return redirect('student_dashboard')
     return render(request, 'signup.html')
 
+@require_login
 def student_dashboard(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-
     # Fetch student info from MySQL students table using email
-    student_info = None
     complaints = []
-    try:
-        student_info = Student.objects.get(email=request.user.email)
-        complaints = Complaint.objects.filter(student_id=student_info.student_id).order_by('-created_at')
-    except Student.DoesNotExist:
-        student_info = None
+    student_info = get_student_for_user(request.user)
+    if student_info is not None:
+        complaints = paginate_complaints(Complaint.objects.filter(student_id=student_info.student_id), request).items
 
     return render(request, 'student/student-dashboard.html', {
         'student_info': student_info,
         'complaints': complaints
     })
 
+@require_login
 def student_profile_settings(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
     return render(request, 'student/profile-settings.html')
 
+@require_login
 def student_new_query(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
     if request.method == 'POST':
 
         title = request.POST.get('title')
@@ -170,210 +188,352 @@ def student_new_query(request):
         category = request.POST.get('category')
         priority = request.POST.get('priority', 'Medium')
         
-        # Lookup student in external students table by email
-        try:
-            student_info = Student.objects.get(email=request.user.email)
-            student_db_id = student_info.student_id
-        except Student.DoesNotExist:
+        # Lookup student in external students table by email (cached per user)
+        student_info = get_student_for_user(request.user)
+        if student_info is None:
             messages.error(request, 'Student record not found in external students table. Cannot submit complaint.')
             return redirect('student_new_query')
+        student_db_id = student_info.student_id
 
         # Since the complaints table is managed=False, insert using raw SQL with the matched student_id
-        cursor = connection.cursor()
-        cursor.execute("""
-            INSERT INTO complaints (student_id, title, description, category, priority, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, [student_db_id, title, description, category, priority, 'Open', timezone.now()])
+        created_at = timezone.now()
+        with transaction.atomic():
+            cursor = connection.cursor()
+            cursor.execute("""
+                INSERT INTO complaints (student_id, title, description, category, priority, status, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, [student_db_id, title, description, category, priority, 'Open', created_at])
+            # raw SQL bypasses the model signals, so count it in the dashboard rollup here
+            record_created([(category, 'Open', priority, created_at)])
+        # AI triage runs in the background worker (manage.py run_triage_worker), not on this request
+        complaint_id = cursor.lastrowid
+        enqueue_triage(complaint_id)
 
         messages.success(request, 'Complaint submitted successfully!')
+        duplicate = check_new_complaint(complaint_id)
+        if duplicate is not None:
+            messages.info(request, f'A very similar complaint (#{duplicate[0]}) has already been reported; '
+                                   'yours has been linked to it so the department sees them together.')
         return redirect('student_my_queries')
     return render(request, 'student/new-query.html')
 
+@require_login
 def student_my_queries(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    # Lookup student in external students table by email
-    try:
-        student_info = Student.objects.get(email=request.user.email)
-        student_db_id = student_info.student_id
-    except Student.DoesNotExist:
+    # Lookup student in external students table by email (cached per user)
+    student_info = get_student_for_user(request.user)
+    if student_info is None:
         # If student record is not found, show empty list and a message
         messages.info(request, 'No student record found for your account.')
         complaints = []
         return render(request, 'student/my-queries.html', {'complaints': complaints})
+    student_db_id = student_info.student_id
 
-    complaints = Complaint.objects.filter(student_id=student_db_id).order_by('-created_at')
-    return render(request, 'student/my-queries.html', {'complaints': complaints})
+    page = paginate_complaints(Complaint.objects.filter(student_id=student_db_id), request)
+    return render(request, 'student/my-queries.html', {'complaints': page.items, 'page': page})
 
 def admin_index(request):
     return redirect('/admin/')
 
+@require_login
 def admin_users_management(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
     return render(request, 'panel/panel_usersmanagement.html')
 
+@require_login
 def admin_tickets(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
     return render(request, 'panel/panel_tickets.html')
 
+@require_login
 def admin_departments(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
     return render(request, 'panel/panel_departments.html')
 
+@require_department('admin')
 def dashboard_admin(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     # Admin can see all complaints for oversight
     complaints = Complaint.objects.filter(category='Certificates_Documents').order_by('-created_at')
-    return render(request, 'dashboards/admin/admin-dashboard.html', {'complaints': complaints})
+    return render(request, 'dashboards/admin/admin-dashboard.html', {
+        'complaints': complaints, 'duplicate_clusters': duplicate_clusters('Certificates_Documents'),
+    })
 
+@require_department('admin')
 def dashboard_admin_members(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/admin/admin-members.html')
 
+@require_department('admin')
 def dashboard_admin_queries(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     # Admin can see all complaints for oversight
-    complaints = Complaint.objects.filter(category='Certificates_Documents').order_by('-created_at')
-    return render(request, 'dashboards/admin/admin-queries.html', {'complaints': complaints})
+    return render(request, 'dashboards/admin/admin-queries.html', _queries_context(request, 'Certificates_Documents'))
 
+@require_department('warden')
 def dashboard_warden(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='warden').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     complaints = Complaint.objects.filter(category='Certificates_Documents').order_by('-created_at')
-    pending_queries = complaints.filter(status='Open').count()
-    in_progress_queries = complaints.filter(status='In Progress').count()
-    resolved_queries = complaints.filter(status='Resolved').count()
-    return render(request, 'dashboards/warden/warden-dashboard.html', {'complaints': complaints, 'pending_queries': pending_queries, 'in_progress_queries': in_progress_queries, 'resolved_queries': resolved_queries})
+    stats = get_dashboard_stats('Certificates_Documents')
+    return render(request, 'dashboards/warden/warden-dashboard.html', {
+        'complaints': complaints, 'duplicate_clusters': duplicate_clusters('Certificates_Documents'), **stats.as_context(),
+    })
 
+@require_department('warden')
 def dashboard_warden_members(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='warden').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/warden/warden-members.html')
 
+@require_department('warden')
 def dashboard_warden_queries(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='warden').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
-    complaints = Complaint.objects.filter(category='Certificates_Documents').order_by('-created_at')
-    return render(request, 'dashboards/warden/warden-queries.html', {'complaints': complaints})
+    return render(request, 'dashboards/warden/warden-queries.html', _queries_context(request, 'Certificates_Documents'))
 
+@require_department('rector')
 def dashboard_rector(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='rector').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     complaints = Complaint.objects.filter(category='Courses_Training').order_by('-created_at')
-    pending_queries = complaints.filter(status='Open').count()
-    in_progress_queries = complaints.filter(status='In Progress').count()
-    resolved_queries = complaints.filter(status='Resolved').count()
-    return render(request, 'dashboards/rector/rector-dashboard.html', {'complaints': complaints, 'pending_queries': pending_queries, 'in_progress_queries': in_progress_queries, 'resolved_queries': resolved_queries})
+    stats = get_dashboard_stats('Courses_Training')
+    return render(request, 'dashboards/rector/rector-dashboard.html', {
+        'complaints': complaints, 'duplicate_clusters': duplicate_clusters('Courses_Training'), **stats.as_context(),
+    })
 
+@require_department('rector')
 def dashboard_rector_members(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='rector').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/rector/rector-members.html')
 
+@require_department('rector')
 def dashboard_rector_queries(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='rector').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
-    complaints = Complaint.objects.filter(category='Courses_Training').order_by('-created_at')
-    return render(request, 'dashboards/rector/rector-queries.html', {'complaints': complaints})
+    return render(request, 'dashboards/rector/rector-queries.html', _queries_context(request, 'Courses_Training'))
 
+@require_department('maintenance')
 def dashboard_maintenance(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='maintenance').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     complaints = Complaint.objects.filter(category='Facilities_Logistics').order_by('-created_at')
-    pending_queries = complaints.filter(status='Open').count()
-    in_progress_queries = complaints.filter(status='In Progress').count()
-    resolved_queries = complaints.filter(status='Resolved').count()
-    return render(request, 'dashboards/maintenance/maintenance-dashboard.html', {'complaints': complaints, 'pending_queries': pending_queries, 'in_progress_queries': in_progress_queries, 'resolved_queries': resolved_queries})
+    stats = get_dashboard_stats('Facilities_Logistics')
+    return render(request, 'dashboards/maintenance/maintenance-dashboard.html', {
+        'complaints': complaints, 'duplicate_clusters': duplicate_clusters('Facilities_Logistics'), **stats.as_context(),
+    })
 
+@require_department('maintenance')
 def dashboard_maintenance_members(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='maintenance').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/maintenance/maintenance-members.html')
 
+@require_department('maintenance')
 def dashboard_maintenance_queries(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='maintenance').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
-    complaints = Complaint.objects.filter(category='Facilities_Logistics').order_by('-created_at')
-    return render(request, 'dashboards/maintenance/maintenance-queries.html', {'complaints': complaints})
+    return render(request, 'dashboards/maintenance/maintenance-queries.html', _queries_context(request, 'Facilities_Logistics'))
 
+@require_department('it')
 def dashboard_it(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='it').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     complaints = Complaint.objects.filter(category='IT_Support').order_by('-created_at')
-    pending_queries = complaints.filter(status='Open').count()
-    in_progress_queries = complaints.filter(status='In Progress').count()
-    resolved_queries = complaints.filter(status='Resolved').count()
-    return render(request, 'dashboards/it/it-dashboard.html', {'complaints': complaints, 'pending_queries': pending_queries, 'in_progress_queries': in_progress_queries, 'resolved_queries': resolved_queries})
+    stats = get_dashboard_stats('IT_Support')
+    return render(request, 'dashboards/it/it-dashboard.html', {
+        'complaints': complaints, 'duplicate_clusters': duplicate_clusters('IT_Support'), **stats.as_context(),
+    })
 
+@require_department('it')
 def dashboard_it_members(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='it').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
     return render(request, 'dashboards/it/it-members.html')
 
+@require_department('it')
 def dashboard_it_queries(request):
-    if not request.user.is_authenticated:
-        return redirect('login')
-    if not (request.user.groups.filter(name='it').exists() or request.user.groups.filter(name='admin').exists() or request.user.is_superuser):
-        return redirect('login')
-    complaints = Complaint.objects.filter(category='IT_Support').order_by('-created_at')
-    return render(request, 'dashboards/it/it-queries.html', {'complaints': complaints})
+    return render(request, 'dashboards/it/it-queries.html', _queries_context(request, 'IT_Support'))
+
+
+def _queries_context(request, category):
+    """
+    Context for a department's queries page: its category's complaints, narrowed by the
+    search form (?q=&status=&since=&until=). With q, a relevance-ranked page of search hits
+    whose cursor is the result offset; otherwise the usual newest-first keyset pages.
+    """
+    filters = {k: request.GET.get(k, '').strip() for k in ('q', 'status', 'since', 'until')}
+    queryset = Complaint.objects.filter(category=category)
+    try:
+        queryset = filter_complaints(
+            queryset, statuses=[filters['status']] if filters['status'] else None,
+            since=filters['since'], until=filters['until'],
+        )
+    except ValueError as exc:
+        messages.error(request, str(exc))
+    query = urlencode({k: v for k, v in filters.items() if v})
+
+    if not filters['q']:
+        page = paginate_complaints(queryset, request)
+        page.query = query
+        return {'complaints': page.items, 'page': page, 'search': filters}
+
+    page_size = get_page_size(request)
+    try:
+        offset = max(0, int(request.GET.get('cursor') or 0))
+    except ValueError:
+        offset = 0
+    hits, has_more = search_complaints(filters['q'], queryset, limit=page_size, offset=offset)
+    annotate_hits(hits, filters['q'])
+    page = KeysetPage(
+        items=hits, page_size=page_size, query=query,
+        next_cursor=str(offset + page_size) if has_more else None,
+        prev_cursor=str(max(0, offset - page_size)) if offset else None,
+    )
+    return {'complaints': hits, 'page': page, 'search': filters}
+
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def dashboard_queries_export(request, department):
+    category = QUERIES_CATEGORY.get(department)
+    if category is None:
+        raise Http404('unknown department')
+    # the same guard as that department's queries page
+    return require_department(department)(_export_queries)(request, department, category)
+
+
+def _export_queries(request, department, category):
+    # ?format=csv|xlsx&status=Open&status=...&since=YYYY-MM-DD&until=YYYY-MM-DD
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    statuses = [s for s in request.GET.getlist('status') if s]
+    valid_statuses = {value for value, _ in Complaint.STATUS_CHOICES}
+    if not set(statuses) <= valid_statuses:
+        return HttpResponseBadRequest(f"status must be among {', '.join(sorted(valid_statuses))}")
+    try:
+        # pinned: the rows are read while the response streams, after the request's routing has ended
+        queryset = filter_complaints(
+            Complaint.objects.using(read_database()).filter(category=category), statuses=statuses,
+            since=request.GET.get('since'), until=request.GET.get('until'),
+        )
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    # tuples from values_list, fetched a chunk at a time, so memory doesn't grow with the row count
+    rows = iter_complaints(queryset, chunk_size=settings.COMPLAINTS_EXPORT_CHUNK_SIZE, order='-complaint_id')
+    filename = f"{department}-complaints-{timezone.localdate():%Y%m%d}.{fmt}"
+    if fmt == 'csv':
+        # the BOM makes Excel read the file as UTF-8 (Arabic names and descriptions)
+        lines = itertools.chain(['\ufeff'], csv_lines(rows))
+        response = StreamingHttpResponse(buffered(lines), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(
+            stream_xlsx(EXPORT_COLUMNS, rows, sheet_name=f"{department} complaints"),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@require_POST
+def dashboard_complaint_transition(request, department, complaint_id):
+    category = QUERIES_CATEGORY.get(department)
+    if category is None:
+        raise Http404('unknown department')
+    return require_department(department)(_transition_complaint)(request, category, complaint_id)
 
 
 @require_POST
-def ai_analyze(request):
+def dashboard_queries_bulk_transition(request, department):
+    category = QUERIES_CATEGORY.get(department)
+    if category is None:
+        raise Http404('unknown department')
+    return require_department(department)(_bulk_transition_complaints)(request, category)
+
+
+def _posted(request):
+    """The POSTed fields: a JSON object body, or the form (complaint_id may repeat); None for invalid JSON."""
+    if request.META.get("CONTENT_TYPE", "").startswith("application/json"):
+        try:
+            payload = json.loads(request.body.decode("utf-8"))
+        except ValueError:
+            return None
+        return payload if isinstance(payload, dict) else None
+    return {**request.POST.dict(), 'complaint_ids': request.POST.getlist('complaint_id')}
+
+
+def _transition_complaint(request, category, complaint_id):
+    # status=<target>&version=<the version the page was showing>, or JSON {"status": ..., "version": ...}
+    data = _posted(request)
+    if data is None:
+        return HttpResponseBadRequest("invalid JSON")
+    try:
+        version = int(data.get('version'))
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest("version required")
+    try:
+        done = transition(complaint_id, str(data.get('status') or ''), version, category=category)
+    except Complaint.DoesNotExist:
+        raise Http404('unknown complaint')
+    except StaleComplaint as exc:
+        # the current state, so the page can show it and let the user decide again
+        return JsonResponse({'error': str(exc), 'status': exc.status, 'version': exc.version}, status=409)
+    except TransitionError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(asdict(done))
+
+
+def _bulk_transition_complaints(request, category):
+    # status=<target>&complaint_id=...&complaint_id=..., or JSON {"status": ..., "complaint_ids": [...]}
+    data = _posted(request)
+    if data is None:
+        return HttpResponseBadRequest("invalid JSON")
+    try:
+        complaint_ids = [int(i) for i in data.get('complaint_ids') or ()]
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest("complaint_ids must be integers")
+    if not complaint_ids:
+        return HttpResponseBadRequest("complaint_ids required")
+    try:
+        result = bulk_transition(complaint_ids, str(data.get('status') or ''), category=category)
+    except TransitionError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(asdict(result))
+
+
+def _analyze_text(request):
+    """The complaint text of an AI request, or None if the body is not valid JSON."""
     # Accept JSON { "text": "..." } or form-encoded "text=..."
     ct = request.META.get("CONTENT_TYPE", "")
     if ct.startswith("application/json"):
         try:
             payload = json.loads(request.body.decode("utf-8"))
         except Exception:
-            return HttpResponseBadRequest("invalid JSON")
-        text = (payload.get("text") or "").strip()
-    else:
-        text = (request.POST.get("text") or "").strip()
+            return None
+        return (payload.get("text") or "").strip()
+    return (request.POST.get("text") or "").strip()
+
 
+@require_POST
+async def ai_analyze(request):
+    # async so a slow LLM call doesn't pin a worker thread under ASGI (backend/asgi.py);
+    # Django cancels this coroutine, and with it the upstream request, if the client disconnects
+    text = _analyze_text(request)
+    if text is None:
+        return HttpResponseBadRequest("invalid JSON")
     if not text:
         return HttpResponseBadRequest("text required")
 
-    # call the agent directly (no HTTP between services)
-    result = ai_agent(text, model="gpt-4o-mini", temperature=0.0, max_tokens=1200)
+    # imported here, not at module level, so only processes serving the AI endpoint load it
+    from myapp.ai.complaint_agent import for_frontend
+    from myapp.ai.preclassifier import preclassify
+
+    # obviously non-technical complaints get the ticket form straight away, without an LLM call
+    result = preclassify(text)
+    if result is None:
+        # call the agent directly (no HTTP between services); equivalent complaints are served from cache
+        result = await cached_ai_agent_async(text, model="gpt-4o-mini", temperature=0.0, max_tokens=1200)
 
     if isinstance(result, dict) and "error" in result:
-        return JsonResponse({"error": result["error"]}, status=502)
+        return JsonResponse({"error": result["error"]}, status=503 if result.get("busy") else 502)
 
     ui = for_frontend(result)
     return JsonResponse({"ui": ui, "raw": result})
+
+
+@require_POST
+async def ai_analyze_stream(request):
+    # Same input as ai_analyze, answered as server-sent events: routing, summary, step and
+    # verify fragments as the model writes them, then "done" with the full {"ui", "raw"}
+    # (or "error"). Needs ASGI to actually stream; under WSGI it arrives in one piece.
+    text = _analyze_text(request)
+    if text is None:
+        return HttpResponseBadRequest("invalid JSON")
+    if not text:
+        return HttpResponseBadRequest("text required")
+
+    from myapp.ai.streaming import ai_agent_stream, sse
+
+    async def events():
+        async for event, data in ai_agent_stream(text, model="gpt-4o-mini", temperature=0.0, max_tokens=1200):
+            yield sse(event, data)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # stop nginx from buffering the stream
+    return response
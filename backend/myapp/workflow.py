@@ -0,0 +1,171 @@
+"""
+Complaint status transitions.
+
+Staff move a complaint through the states of Complaint.STATUS_CHOICES:
+
+  Open        -> In Progress, Resolved, Closed
+  In Progress -> Open, Resolved, Closed
+  Resolved    -> In Progress (reopened), Closed
+  Closed      -> (final)
+
+resolved_at is set in the same UPDATE: to the time of the change on entering Resolved,
+kept (or set, if missing) on closing, cleared when a complaint is reopened.
+
+`transition()` changes one complaint without locking it. Every transition bumps
+complaints.version, and the caller passes the version it was shown; the UPDATE only
+matches that version, so of two staff members acting on the same page the second gets
+StaleComplaint (with the current state) instead of silently overwriting the first.
+
+`bulk_transition()` moves thousands of selected complaints with one UPDATE per chunk of
+ids, locking that chunk's rows for its short transaction. Neither goes through
+Complaint.save(), so neither fires the signals that maintain the stats rollup and the
+change log of the live dashboards; both record what they changed themselves.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Complaint
+from .stats_rollup import apply_deltas, bucket, log_changes, record_change
+
+TRANSITIONS = {
+    'Open': ('In Progress', 'Resolved', 'Closed'),
+    'In Progress': ('Open', 'Resolved', 'Closed'),
+    'Resolved': ('In Progress', 'Closed'),
+    'Closed': (),
+}
+BULK_CHUNK_SIZE = 1000
+
+
+class TransitionError(Exception):
+    """A status change that can't be made; the message is meant for the user."""
+
+
+class InvalidTransition(TransitionError):
+    def __init__(self, current: str, target: str):
+        super().__init__(f"a complaint can't go from {current} to {target}")
+        self.current = current
+        self.target = target
+
+
+class StaleComplaint(TransitionError):
+    """Someone else changed the complaint since the caller read it; `version`/`status` are its current ones."""
+
+    def __init__(self, complaint_id: int, version: int, status: str):
+        super().__init__(f"complaint {complaint_id} was changed by someone else (now {status})")
+        self.complaint_id = complaint_id
+        self.version = version
+        self.status = status
+
+
+@dataclass(frozen=True)
+class Transitioned:
+    complaint_id: int
+    status: str
+    version: int
+    resolved_at: Optional[datetime]
+
+
+@dataclass
+class BulkTransitioned:
+    updated: int = 0
+    # selected complaints left alone: missing, outside the category, or not allowed to make the move
+    skipped: List[int] = field(default_factory=list)
+
+
+def sources(target: str) -> List[str]:
+    """The statuses a complaint may move to `target` from."""
+    if target not in TRANSITIONS:
+        valid = ', '.join(TRANSITIONS)
+        raise TransitionError(f"status must be one of {valid}")
+    return [status for status, targets in TRANSITIONS.items() if target in targets]
+
+
+def _resolved_at(target: str, current: Optional[datetime], now: datetime) -> Optional[datetime]:
+    if target == 'Resolved':
+        return now
+    if target == 'Closed':
+        return current or now
+    return None
+
+
+def transition(
+    complaint_id: int, target: str, expected_version: int, *,
+    category: Optional[str] = None, now: Optional[datetime] = None,
+) -> Transitioned:
+    """
+    Move one complaint to `target`, if it is still at `expected_version`. Raises
+    Complaint.DoesNotExist (also outside `category`), InvalidTransition or StaleComplaint.
+    """
+    allowed = sources(target)
+    now = now or timezone.now()
+    complaints = Complaint.objects.filter(pk=complaint_id)
+    if category is not None:
+        complaints = complaints.filter(category=category)
+    with transaction.atomic():
+        row = complaints.values_list('category', 'status', 'priority', 'created_at', 'resolved_at', 'version').first()
+        if row is None:
+            raise Complaint.DoesNotExist(f"no complaint {complaint_id}")
+        current_category, status, priority, created_at, resolved_at, version = row
+        if version != expected_version:
+            raise StaleComplaint(complaint_id, version, status)
+        if status not in allowed:
+            raise InvalidTransition(status, target)
+        resolved_at = _resolved_at(target, resolved_at, now)
+        # the version guards against other transitions, status/priority against ORM saves that don't bump it
+        updated = complaints.filter(version=version, status=status, priority=priority).update(
+            status=target, resolved_at=resolved_at, version=F('version') + 1,
+        )
+        if not updated:
+            version, status = complaints.values_list('version', 'status').first() or (version, status)
+            raise StaleComplaint(complaint_id, version, status)
+        record_change(
+            (current_category, status, priority, created_at), (current_category, target, priority, created_at),
+        )
+        log_changes([(complaint_id, current_category, target, priority)])
+    return Transitioned(complaint_id, target, version + 1, resolved_at)
+
+
+def bulk_transition(
+    complaint_ids: Iterable[int], target: str, *,
+    category: Optional[str] = None, now: Optional[datetime] = None, chunk_size: int = BULK_CHUNK_SIZE,
+) -> BulkTransitioned:
+    """
+    Move every selected complaint that may go to `target` there, whatever its version;
+    the others are reported as skipped. One short transaction per `chunk_size` ids.
+    """
+    allowed = sources(target)
+    now = now or timezone.now()
+    resolved_at = {'Resolved': Value(now), 'Closed': Coalesce('resolved_at', Value(now))}.get(target)
+    ids = list(dict.fromkeys(int(i) for i in complaint_ids))
+    result = BulkTransitioned()
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        complaints = Complaint.objects.filter(pk__in=chunk, status__in=allowed)
+        if category is not None:
+            complaints = complaints.filter(category=category)
+        with transaction.atomic():
+            # locked for the length of this chunk only: what the rollup is told is exactly what changed
+            rows = list(complaints.select_for_update().values_list(
+                'complaint_id', 'category', 'status', 'priority', 'created_at'))
+            moved = [row[0] for row in rows]
+            if moved:
+                Complaint.objects.filter(pk__in=moved).update(
+                    status=target, resolved_at=resolved_at, version=F('version') + 1,
+                )
+            deltas: Counter = Counter()
+            for _, row_category, status, priority, created_at in rows:
+                deltas[bucket(row_category, status, priority, created_at)] -= 1
+                deltas[bucket(row_category, target, priority, created_at)] += 1
+            apply_deltas(deltas)
+            log_changes((pk, row_category, target, priority) for pk, row_category, _, priority, _ in rows)
+        result.updated += len(moved)
+        moved_set = set(moved)
+        result.skipped.extend(i for i in chunk if i not in moved_set)
+    return result